@@ -0,0 +1,397 @@
+# armazenamento.py
+# Armazenamento opcional em SQLite (modo WAL) para catálogo e vendas, com a
+# mesma interface de caixa.ArmazenamentoArquivos. Um único banco guarda várias
+# noites (eventos); cada sessão do caixa é um evento. Os índices por instante,
+# forma de pagamento e produto deixam consultas como "vendas por produto entre
+# 20h e 21h" para o SQL, sem carregar as vendas em Python.
+#   python armazenamento.py importar caixa.db vendas_2024-06-15_22-10.json --evento "Festa Junina"
+#   python armazenamento.py produtos caixa.db --evento "Festa Junina" --de 20:00 --ate 21:00
+
+import argparse
+import os
+import sqlite3
+import sys
+from datetime import datetime, time as hora
+
+from caixa import (ARQ_PRODUTOS, FORMAS_PAGAMENTO, Venda, carregar_produtos, dinheiro, instante,
+                   iterar_vendas, nome_produto)
+
+ARQ_BANCO = "caixa.db"
+
+_ESQUEMA = """
+-- O código de cada produto é fixo (ver catalogo.py); o maior já usado fica em meta.
+CREATE TABLE IF NOT EXISTS produtos (
+    nome   TEXT PRIMARY KEY,
+    preco  INTEGER NOT NULL,
+    codigo INTEGER
+);
+-- Saldo de cada produto no início da sessão; produtos fora daqui não têm controle.
+CREATE TABLE IF NOT EXISTS estoque (
+    nome   TEXT PRIMARY KEY,
+    saldo  INTEGER NOT NULL,
+    minimo INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS nomes_produto (
+    id   INTEGER PRIMARY KEY,
+    nome TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS eventos (
+    id     INTEGER PRIMARY KEY,
+    nome   TEXT NOT NULL UNIQUE,
+    criado TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS vendas (
+    evento    INTEGER NOT NULL REFERENCES eventos(id),
+    id        INTEGER NOT NULL,
+    instante  INTEGER NOT NULL,
+    pagamento TEXT NOT NULL,
+    total     INTEGER NOT NULL,
+    recebido  INTEGER NOT NULL,
+    troco     INTEGER NOT NULL,
+    PRIMARY KEY (evento, id)
+) WITHOUT ROWID;
+-- O instante é repetido nos itens para que as consultas por produto e horário
+-- leiam só o índice itens_instante, sem juntar com as vendas.
+CREATE TABLE IF NOT EXISTS itens (
+    evento  INTEGER NOT NULL,
+    venda   INTEGER NOT NULL,
+    instante INTEGER NOT NULL,
+    produto INTEGER NOT NULL REFERENCES nomes_produto(id),
+    qtd     INTEGER NOT NULL,
+    preco   INTEGER NOT NULL
+);
+-- Valores soltos do caixa: o evento em que ele grava ("evento_atual"), o
+-- maior código de produto já dado ("ultimo_codigo") e o maior id de venda já
+-- usado em cada evento ("ultimo_id/<evento>"), que conta também as vendas excluídas.
+CREATE TABLE IF NOT EXISTS meta (
+    chave TEXT PRIMARY KEY,
+    valor
+);
+CREATE INDEX IF NOT EXISTS vendas_instante ON vendas (evento, instante);
+CREATE INDEX IF NOT EXISTS vendas_pagamento ON vendas (evento, pagamento, instante);
+CREATE INDEX IF NOT EXISTS itens_venda ON itens (evento, venda);
+CREATE INDEX IF NOT EXISTS itens_instante ON itens (evento, instante, produto, qtd, preco);
+CREATE INDEX IF NOT EXISTS itens_produto ON itens (produto, evento);
+"""
+
+
+class ArmazenamentoSQLite:
+    """Catálogo e vendas num banco SQLite. `evento` escolhe (ou cria) a noite
+    em que as vendas do caixa são gravadas (ver `usar_evento`); sem ele o banco
+    só serve para consultas e importação."""
+
+    def __init__(self, caminho=ARQ_BANCO, evento=None, arq_produtos=ARQ_PRODUTOS):
+        self.caminho = caminho
+        self.con = sqlite3.connect(caminho)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        # Em WAL, NORMAL só faz fsync no checkpoint: uma queda de energia pode
+        # perder as últimas vendas, mas nunca corrompe o banco.
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        self.con.executescript(_ESQUEMA)
+        if "codigo" not in [c[1] for c in self.con.execute("PRAGMA table_info(produtos)")]:
+            # Banco de antes dos códigos fixos: cada produto fica com o código que tinha (a posição).
+            with self.con:
+                self.con.execute("ALTER TABLE produtos ADD COLUMN codigo INTEGER")
+                self._numerar()
+        self._ids_nome = {nome: i for i, nome in self.con.execute("SELECT id, nome FROM nomes_produto")}
+        self._versao_dados = None
+        if self.con.execute("SELECT 1 FROM produtos LIMIT 1").fetchone() is None:
+            # Primeiro uso: traz o catálogo do produtos.json.
+            self.importar_produtos(carregar_produtos(arq_produtos))
+        self.evento = None
+        if evento: self.usar_evento(evento)
+
+    # Eventos
+
+    def abrir_evento(self, nome):
+        """Id do evento `nome`, criando-o se não existir."""
+        linha = self.con.execute("SELECT id FROM eventos WHERE nome = ?", (nome,)).fetchone()
+        if linha is not None: return linha[0]
+        with self.con:
+            cur = self.con.execute("INSERT INTO eventos (nome, criado) VALUES (?, ?)",
+                                   (nome, datetime.now().isoformat(timespec="seconds")))
+        return cur.lastrowid
+
+    def usar_evento(self, nome):
+        """Passa a gravar as vendas do caixa no evento `nome` e o guarda como o
+        atual, para o caixa voltar a ele ao reabrir."""
+        self.evento = self.abrir_evento(nome)
+        with self.con:
+            self.con.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES ('evento_atual', ?)", (self.evento,))
+
+    def evento_atual(self):
+        """Nome do último evento em que o caixa gravou; None se nunca houve um."""
+        linha = self.con.execute("SELECT e.nome FROM meta m JOIN eventos e ON e.id = m.valor"
+                                 " WHERE m.chave = 'evento_atual'").fetchone()
+        return linha[0] if linha else None
+
+    def eventos(self):
+        """[(id, nome, nº de vendas, total em centavos)] de todos os eventos."""
+        return self.con.execute(
+            "SELECT e.id, e.nome, COUNT(v.id), COALESCE(SUM(v.total), 0) FROM eventos e"
+            " LEFT JOIN vendas v ON v.evento = e.id GROUP BY e.id ORDER BY e.id").fetchall()
+
+    def _id_nome(self, nome):
+        pid = self._ids_nome.get(nome)
+        if pid is None:
+            self.con.execute("INSERT OR IGNORE INTO nomes_produto (nome) VALUES (?)", (nome,))
+            pid = self._ids_nome[nome] = self.con.execute(
+                "SELECT id FROM nomes_produto WHERE nome = ?", (nome,)).fetchone()[0]
+        return pid
+
+    # Catálogo
+
+    def _anotar_maximo(self, chave, valor):
+        self.con.execute("INSERT INTO meta (chave, valor) VALUES (?, ?)"
+                         " ON CONFLICT(chave) DO UPDATE SET valor = MAX(valor, excluded.valor)", (chave, valor))
+
+    def _ultimo_codigo(self):
+        linha = self.con.execute("SELECT valor FROM meta WHERE chave = 'ultimo_codigo'").fetchone()
+        maior = self.con.execute("SELECT MAX(codigo) FROM produtos").fetchone()[0]
+        return max(linha[0] if linha else 0, maior or 0)
+
+    def _numerar(self):
+        # Dá código aos produtos que não têm (inseridos sem um), na ordem de cadastro.
+        ultimo = self._ultimo_codigo()
+        for (rowid,) in self.con.execute("SELECT rowid FROM produtos WHERE codigo IS NULL ORDER BY rowid").fetchall():
+            ultimo += 1
+            self.con.execute("UPDATE produtos SET codigo = ? WHERE rowid = ?", (ultimo, rowid))
+        self._anotar_maximo("ultimo_codigo", ultimo)
+
+    def carregar_produtos(self):
+        self._versao_dados = self.con.execute("PRAGMA data_version").fetchone()[0]
+        return dict(self.con.execute("SELECT nome, preco FROM produtos ORDER BY codigo"))
+
+    def codigos_produtos(self):
+        """({nome: código}, maior código já usado)."""
+        return dict(self.con.execute("SELECT nome, codigo FROM produtos")), self._ultimo_codigo()
+
+    def produtos_alterados(self):
+        """Catálogo relido se outra conexão (outro caixa no mesmo banco) gravou
+        algo desde a última leitura; senão None. O data_version do SQLite só muda
+        com gravações de outras conexões, então a verificação é barata."""
+        if self.con.execute("PRAGMA data_version").fetchone()[0] == self._versao_dados: return None
+        return self.carregar_produtos()
+
+    def salvar_produtos(self, produtos, alterados=(), removidos=(), renomeados=(), codigos=None, ultimo_codigo=0):
+        # Só as linhas que mudaram; sem indicação, grava o catálogo inteiro.
+        with self.con:
+            if not alterados and not removidos and not renomeados:
+                self.con.execute("DELETE FROM produtos")
+                alterados = produtos
+            self.con.executemany("DELETE FROM produtos WHERE nome = ?", ((n,) for n in removidos))
+            # Renomear é um UPDATE: a linha, e com ela o código, continua a mesma.
+            # Um produto que já tinha o nome novo é substituído, como no catálogo em memória.
+            for nome, novo_nome in renomeados:
+                self.con.execute("DELETE FROM produtos WHERE nome = ?", (novo_nome,))
+                self.con.execute("UPDATE produtos SET nome = ? WHERE nome = ?", (novo_nome, nome))
+            # Upsert mantém a linha; sem código dado, o produto mantém o que tinha.
+            codigos = codigos or {}
+            self.con.executemany("INSERT INTO produtos (nome, preco, codigo) VALUES (?, ?, ?)"
+                                 " ON CONFLICT(nome) DO UPDATE SET preco = excluded.preco,"
+                                 " codigo = COALESCE(excluded.codigo, codigo)",
+                                 ((n, produtos[n], codigos.get(n)) for n in alterados))
+            self._anotar_maximo("ultimo_codigo", ultimo_codigo)
+            self._numerar()
+
+    def carregar_estoque(self):
+        return {nome: (saldo, minimo) for nome, saldo, minimo in self.con.execute("SELECT nome, saldo, minimo FROM estoque")}
+
+    def salvar_estoque(self, niveis):
+        with self.con:
+            self.con.execute("DELETE FROM estoque")
+            self.con.executemany("INSERT INTO estoque (nome, saldo, minimo) VALUES (?, ?, ?)",
+                                 ((nome, saldo, minimo) for nome, (saldo, minimo) in niveis.items()))
+
+    def importar_produtos(self, produtos):
+        with self.con:
+            self.con.executemany("INSERT OR REPLACE INTO produtos (nome, preco) VALUES (?, ?)", produtos.items())
+            self._numerar()
+
+    # Vendas
+
+    def _inserir(self, evento, vendas):
+        for v in vendas:
+            self.con.execute("INSERT INTO vendas VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (evento, v.id, v.instante, v.pagamento, v.total, v.recebido, v.troco))
+            self.con.executemany("INSERT INTO itens VALUES (?, ?, ?, ?, ?, ?)",
+                                 ((evento, v.id, v.instante, self._id_nome(nome_produto(pid)), qtd, preco)
+                                  for pid, qtd, preco in v.itens_por_id()))
+
+    def registrar_venda(self, venda):
+        with self.con:
+            self._inserir(self.evento, (venda,))
+
+    def excluir_venda(self, venda_id):
+        with self.con:
+            self.con.execute("DELETE FROM itens WHERE evento = ? AND venda = ?", (self.evento, venda_id))
+            self.con.execute("DELETE FROM vendas WHERE evento = ? AND id = ?", (self.evento, venda_id))
+            # A linha some: o id fica anotado para não ser reaproveitado ao reabrir o evento.
+            self._anotar_maximo(f"ultimo_id/{self.evento}", venda_id)
+
+    def ultimo_id(self):
+        """Maior id de venda já usado no evento atual, inclusive em vendas excluídas."""
+        linha = self.con.execute("SELECT valor FROM meta WHERE chave = ?", (f"ultimo_id/{self.evento}",)).fetchone()
+        maior = self.con.execute("SELECT MAX(id) FROM vendas WHERE evento = ?", (self.evento,)).fetchone()[0]
+        return max(linha[0] if linha else 0, maior or 0)
+
+    def iterar_vendas(self, evento=None):
+        """Vendas de um evento (o atual por padrão), em ordem de id, montadas aos poucos."""
+        evento = self.evento if evento is None else evento
+        itens = self.con.execute(
+            "SELECT i.venda, n.nome, i.qtd, i.preco FROM itens i JOIN nomes_produto n ON n.id = i.produto"
+            " WHERE i.evento = ? ORDER BY i.venda, i.rowid", (evento,))
+        item = next(itens, None)
+        for vid, inst, pag, total, rec, troco in self.con.execute(
+                "SELECT id, instante, pagamento, total, recebido, troco FROM vendas"
+                " WHERE evento = ? ORDER BY id", (evento,)):
+            lista = []
+            while item is not None and item[0] <= vid:
+                if item[0] == vid: lista.append(item[1:])
+                item = next(itens, None)
+            yield Venda(lista, pag, total, rec, troco, inst, vid)
+
+    def carregar_vendas(self):
+        return self.iterar_vendas()
+
+    def importar_vendas(self, caminho, evento=None):
+        """Importa um vendas_*.json/.ndjson para o evento `evento` (nome; padrão:
+        o nome do arquivo). Vendas com id já gravado no evento são ignoradas; nos
+        arquivos antigos, sem id, é ignorada a venda cujo conteúdo (instante,
+        valores e itens) o evento já tem tantas vezes quanto o arquivo o repete."""
+        evento = self.abrir_evento(evento or os.path.splitext(os.path.basename(caminho))[0])
+        proximo = (self.con.execute("SELECT MAX(id) FROM vendas WHERE evento = ?", (evento,)).fetchone()[0] or 0) + 1
+        no_banco, no_arquivo = {}, {}   # conteúdo -> nº de vendas iguais
+        n = 0
+        with self.con:
+            for v in iterar_vendas(caminho):
+                if v.id is None:
+                    chave = (v.instante, v.pagamento, v.total, v.recebido, v.troco, tuple(v.itens))
+                    if chave not in no_banco: no_banco[chave] = self._contar_iguais(evento, chave)
+                    no_arquivo[chave] = no_arquivo.get(chave, 0) + 1
+                    if no_arquivo[chave] <= no_banco[chave]: continue
+                    v.id, proximo = proximo, proximo + 1
+                elif self.con.execute("SELECT 1 FROM vendas WHERE evento = ? AND id = ?", (evento, v.id)).fetchone():
+                    continue
+                self._inserir(evento, (v,))
+                n += 1
+        return n
+
+    def _contar_iguais(self, evento, chave):
+        # Vendas do evento com o mesmo conteúdo; o índice vendas_instante limita os candidatos.
+        instante, pagamento, total, recebido, troco, itens = chave
+        n = 0
+        for (vid,) in self.con.execute(
+                "SELECT id FROM vendas WHERE evento = ? AND instante = ? AND pagamento = ? AND total = ?"
+                " AND recebido = ? AND troco = ?", (evento, instante, pagamento, total, recebido, troco)).fetchall():
+            gravados = self.con.execute(
+                "SELECT n.nome, i.qtd, i.preco FROM itens i JOIN nomes_produto n ON n.id = i.produto"
+                " WHERE i.evento = ? AND i.venda = ? ORDER BY i.rowid", (evento, vid)).fetchall()
+            if tuple(gravados) == itens: n += 1
+        return n
+
+    # Só o JSON precisa de compactação; aqui cada venda já é uma transação.
+    precisa_compactar = False
+
+    def compactar(self, vendas):
+        pass
+
+    def nova_sessao(self):
+        self.usar_evento(datetime.now().isoformat(sep=" ", timespec="seconds"))
+
+    def sincronizar(self):
+        pass
+
+    def fechar(self):
+        self.con.close()
+
+    # Consultas
+
+    def _filtro(self, tabela, evento, inicio, fim):
+        # Monta o WHERE sobre `tabela` (vendas ou itens); evento "*" consulta todos os eventos.
+        # Limites do tipo datetime.time filtram pela hora do dia, em qualquer data.
+        cond, args = [], []
+        if evento != "*":
+            cond.append(f"{tabela}.evento = ?")
+            args.append(self.evento if evento is None else evento)
+        for limite, op in ((inicio, ">="), (fim, "<")):
+            if limite is None: continue
+            if isinstance(limite, hora):
+                cond.append(f"{tabela}.instante % 86400 {op} ?")
+                args.append(limite.hour * 3600 + limite.minute * 60 + limite.second)
+            else:
+                cond.append(f"{tabela}.instante {op} ?")
+                args.append(instante(limite))
+        return (" WHERE " + " AND ".join(cond)) if cond else "", args
+
+    def por_produto(self, inicio=None, fim=None, evento=None):
+        """[(produto, quantidade, total em centavos)] entre `inicio` e `fim`
+        (datetime/ISO, ou datetime.time para um horário em todas as datas)."""
+        where, args = self._filtro("itens", evento, inicio, fim)
+        return self.con.execute(
+            "SELECT n.nome, SUM(itens.qtd), SUM(itens.qtd * itens.preco) FROM itens"
+            " JOIN nomes_produto n ON n.id = itens.produto" + where +
+            " GROUP BY itens.produto ORDER BY 2 DESC", args).fetchall()
+
+    def por_pagamento(self, inicio=None, fim=None, evento=None):
+        """{forma de pagamento: total em centavos}."""
+        where, args = self._filtro("vendas", evento, inicio, fim)
+        tot = dict.fromkeys(FORMAS_PAGAMENTO, 0)
+        tot.update(self.con.execute("SELECT pagamento, SUM(total) FROM vendas" + where +
+                                    " GROUP BY pagamento", args))
+        return tot
+
+    def por_intervalo(self, largura, inicio=None, fim=None, evento=None):
+        """{início do intervalo (s): (nº de vendas, total em centavos)} em janelas de `largura` segundos."""
+        where, args = self._filtro("vendas", evento, inicio, fim)
+        return {k: (n, soma) for k, n, soma in self.con.execute(
+            "SELECT instante / ? * ?, COUNT(*), SUM(total) FROM vendas" + where +
+            " GROUP BY 1 ORDER BY 1", [largura, largura] + args)}
+
+
+def _limite(texto):
+    if texto is None: return None
+    return hora.fromisoformat(texto) if len(texto) <= 8 else texto
+
+
+def _evento_id(banco, nome):
+    if nome == "*": return "*"
+    if nome is None: return None
+    linha = banco.con.execute("SELECT id FROM eventos WHERE nome = ?", (nome,)).fetchone()
+    if linha is None: raise SystemExit(f"Evento não encontrado: {nome}")
+    return linha[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="armazenamento.py", description="Arquivo de vendas em SQLite.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("importar", help="importa vendas_*.json / .ndjson para o banco")
+    p.add_argument("banco")
+    p.add_argument("vendas", nargs="+")
+    p.add_argument("--evento", help="nome do evento (padrão: nome de cada arquivo)")
+    p = sub.add_parser("eventos", help="lista os eventos do banco")
+    p.add_argument("banco")
+    p = sub.add_parser("produtos", help="vendas por produto num horário")
+    p.add_argument("banco")
+    p.add_argument("--evento", help="nome do evento (padrão: todos)")
+    p.add_argument("--de", help="hora inicial (HH:MM) ou data/hora ISO")
+    p.add_argument("--ate", help="hora final (HH:MM) ou data/hora ISO")
+    args = parser.parse_args(argv)
+
+    banco = ArmazenamentoSQLite(args.banco)
+    if args.comando == "importar":
+        for caminho in args.vendas:
+            print(f"{caminho}: {banco.importar_vendas(caminho, args.evento)} vendas importadas")
+    elif args.comando == "eventos":
+        for eid, nome, n, total in banco.eventos():
+            print(f"{eid:>4}  {nome:<30} {n:>7} vendas  {dinheiro(total)}")
+    elif args.comando == "produtos":
+        for nome, qtd, total in banco.por_produto(_limite(args.de), _limite(args.ate),
+                                                  _evento_id(banco, args.evento or "*")):
+            print(f"{nome:<30} {qtd:>6}  {dinheiro(total)}")
+    banco.fechar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
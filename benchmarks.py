@@ -0,0 +1,548 @@
+# benchmarks.py
+# Medições simples de desempenho do caixa, sem abrir janela.
+# Uso: python benchmarks.py [nome_do_benchmark ...] [--vendas N] [--registro ARQ]
+# O "pico_tk" e o "inicio" abrem o App de verdade; sem monitor, rode com xvfb-run.
+
+import argparse
+import inspect
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import colunar
+from catalogo import IndiceCatalogo
+import importacao
+from armazenamento import ArmazenamentoSQLite
+from caixa import (FORMAS_PAGAMENTO, LIMITE_DESFAZER, ArmazenamentoArquivos, CaixaSessao, MotorCaixa, Venda,
+                   carregar_produtos, gerar_txt, reais, salvar_produtos, salvar_vendas, texto_painel,
+                   texto_resumo)
+from diario import DiarioVendas
+from impressao import DestinoTCP, FilaImpressao, servidor_impressora
+
+
+def venda_sintetica(produtos, rnd, datahora=None):
+    nomes = list(produtos)
+    itens = []
+    for nome in rnd.sample(nomes, rnd.randint(1, min(4, len(nomes)))):
+        itens.append((nome, rnd.randint(1, 3), produtos[nome]))
+    total = sum(q * p for _, q, p in itens)
+    forma = rnd.choice(FORMAS_PAGAMENTO)
+    recebido = total if forma == "Dinheiro" else 0
+    return Venda(itens, forma, total, recebido, 0, datahora or datetime.now().isoformat(timespec="seconds"))
+
+
+class GeradorCarrinhos:
+    """Carrinhos de uma noite cheia a partir do catálogo: poucos produtos
+    concentram a maior parte das vendas, a maioria dos carrinhos tem 1-2 itens
+    de 1 unidade, Pix e dinheiro predominam e o dinheiro vem em notas redondas."""
+
+    PESOS_PAGAMENTO = {"Pix": 40, "Dinheiro": 30, "Débito": 15, "Crédito": 15}
+    NOTAS = (500, 1000, 2000, 5000, 10000)
+
+    def __init__(self, produtos, semente=1):
+        self.rnd = random.Random(semente)
+        self.produtos = produtos
+        self.nomes = sorted(produtos)
+        self.rnd.shuffle(self.nomes)
+        self.pesos = [1 / (i + 1) for i in range(len(self.nomes))]
+        self.formas = [f for f in FORMAS_PAGAMENTO if f in self.PESOS_PAGAMENTO]
+
+    def carrinho(self):
+        """[(nome, qtd)] sem produtos repetidos."""
+        n = min(len(self.nomes), self.rnd.choices((1, 2, 3, 4, 5), (45, 30, 15, 7, 3))[0])
+        escolhidos = []
+        while len(escolhidos) < n:
+            nome = self.rnd.choices(self.nomes, self.pesos)[0]
+            if nome not in escolhidos: escolhidos.append(nome)
+        return [(nome, self.rnd.choices((1, 2, 3), (75, 20, 5))[0]) for nome in escolhidos]
+
+    def pagamento(self, total):
+        """(forma, recebido em centavos)."""
+        forma = self.rnd.choices(self.formas, [self.PESOS_PAGAMENTO[f] for f in self.formas])[0]
+        if forma != "Dinheiro": return forma, 0
+        nota = next((n for n in self.NOTAS if n >= total), None)
+        return forma, nota if nota is not None and self.rnd.random() < 0.7 else total
+
+
+class Latencias:
+    """Amostras de tempo por operação e seus percentis (em ms)."""
+
+    def __init__(self):
+        self.amostras = {}
+
+    def medir(self, nome, func, *args):
+        inicio = time.perf_counter()
+        resultado = func(*args)
+        self.amostras.setdefault(nome, []).append(time.perf_counter() - inicio)
+        return resultado
+
+    def percentis(self):
+        res = {}
+        for nome, tempos in self.amostras.items():
+            t = sorted(tempos)
+            p = lambda q: t[min(len(t) - 1, int(q * len(t)))] * 1000
+            res[nome] = {"n": len(t), "p50": p(0.50), "p95": p(0.95), "p99": p(0.99), "max": t[-1] * 1000}
+        return res
+
+    def imprimir(self):
+        print("operação                    n      p50 (ms)   p95 (ms)   p99 (ms)   máx (ms)")
+        for nome, r in self.percentis().items():
+            print(f"{nome:<22} {r['n']:>7} {r['p50']:10.3f} {r['p95']:10.3f} {r['p99']:10.3f} {r['max']:10.3f}")
+
+
+def _cronometrar(func, repeticoes):
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        func()
+    return (time.perf_counter() - inicio) / repeticoes
+
+
+def bench_agregados(tamanhos=(100, 1000, 3000, 10000), repeticoes=200):
+    """Custo de ler os totais do resumo (como `_atualiza_total`) conforme a sessão cresce."""
+    produtos = carregar_produtos()
+    rnd = random.Random(42)
+    sessao = CaixaSessao()
+    print("vendas      leitura dos totais (µs)")
+    for n in tamanhos:
+        while sessao.numero_vendas < n:
+            sessao.adicionar_venda(venda_sintetica(produtos, rnd))
+
+        def leitura():
+            sessao.numero_vendas, sessao.total_geral, sessao.ticket_medio
+            sessao.total_por_produto, sessao.total_por_pagamento
+
+        print(f"{n:>6}      {_cronometrar(leitura, repeticoes) * 1e6:10.2f}")
+    assert sessao.verificar_consistencia()
+
+
+def bench_recuperacao(n=5000, snapshot_a_cada=1000):
+    """Tempo para reconstruir uma sessão longa a partir do diário + snapshot."""
+    produtos = carregar_produtos()
+    rnd = random.Random(7)
+    vendas = [venda_sintetica(produtos, rnd) for _ in range(n)]
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "diario.ndjson")
+        diario = DiarioVendas(caminho, snapshot_a_cada=snapshot_a_cada)
+        motor = MotorCaixa(produtos=produtos, armazenamento=ArmazenamentoArquivos(diario=diario))
+        pior = 0.0
+        inicio = time.perf_counter()
+        for v in vendas:
+            t = time.perf_counter()
+            motor.reproduzir((v,))
+            pior = max(pior, time.perf_counter() - t)
+        motor.armazenamento.fechar()
+        gravacao = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        recuperado = MotorCaixa(produtos=produtos, armazenamento=ArmazenamentoArquivos(diario=DiarioVendas(caminho)))
+        recuperado.recuperar_sessao()
+        recuperacao = time.perf_counter() - inicio
+    assert recuperado.sessao.numero_vendas == n
+    assert recuperado.sessao.total_geral == motor.sessao.total_geral
+    print(f"{n} vendas: gravação {gravacao * 1e6 / n:.1f} µs/venda (pior venda {pior * 1000:.1f} ms,"
+          f" com compactação a cada {snapshot_a_cada}) | recuperação {recuperacao * 1000:.1f} ms")
+
+
+def bench_motor(n=20000):
+    """Vazão do fluxo completo do caixa (carrinho → fechamento) sem interface,
+    com controle de estoque em todos os produtos."""
+    produtos = carregar_produtos()
+    rnd = random.Random(3)
+    vendas = [venda_sintetica(produtos, rnd) for _ in range(n)]
+    motor = MotorCaixa(produtos=dict(produtos))
+    for nome in produtos:
+        motor.estoque.ajustar(nome, 10 ** 9)
+    inicio = time.perf_counter()
+    motor.reproduzir(vendas)
+    dt = time.perf_counter() - inicio
+    print(f"{n} vendas em {dt:.3f} s ({n / dt:.0f} vendas/s)")
+    assert motor.sessao.verificar_consistencia()
+    # Exclusões aleatórias desfeitas em blocos do tamanho da pilha de desfazer.
+    ids = rnd.sample(range(1, n + 1), min(n, 20 * LIMITE_DESFAZER))
+    inicio = time.perf_counter()
+    for i in range(0, len(ids), LIMITE_DESFAZER):
+        bloco = ids[i:i + LIMITE_DESFAZER]
+        for vid in bloco:
+            motor.excluir_venda(vid)
+        for _ in bloco:
+            motor.desfazer()
+    dt = time.perf_counter() - inicio
+    print(f"{len(ids)} exclusões + desfazer em {dt * 1000:.1f} ms ({dt / (2 * len(ids)) * 1e6:.1f} µs cada)")
+    assert motor.sessao.numero_vendas == n and motor.sessao.verificar_consistencia()
+    vendido = motor.sessao.total_por_produto
+    assert all(motor.estoque.saldo(nome) == 10 ** 9 - vendido.get(nome, 0) for nome in produtos)
+
+
+def _venda_em_dict(venda):
+    # Formato antigo (antes dos registros Venda): dict com floats e nomes repetidos.
+    return {"itens": [("%s" % nome.encode().decode(), qtd, reais(preco)) for nome, qtd, preco in venda.itens],
+            "pagamento": venda.pagamento, "total": reais(venda.total), "recebido": reais(venda.recebido),
+            "troco": reais(venda.troco), "datahora": venda.datahora.encode().decode()}
+
+
+def bench_memoria(tamanhos=(10_000, 100_000)):
+    """Bytes por venda: dict com floats (formato antigo) x registro Venda em centavos."""
+    produtos = carregar_produtos()
+    print("vendas      dict/float (B/venda)   Venda (B/venda)")
+    for n in tamanhos:
+        rnd = random.Random(11)
+        modelo = [venda_sintetica(produtos, rnd) for _ in range(n)]
+        resultado = []
+        for construir in (lambda: [_venda_em_dict(v) for v in modelo],
+                          lambda: [Venda(v.itens, v.pagamento, v.total, v.recebido, v.troco, v.datahora) for v in modelo]):
+            tracemalloc.start()
+            dados = construir()
+            usado, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            resultado.append(usado / n)
+            del dados
+        print(f"{n:>7}      {resultado[0]:18.0f}   {resultado[1]:15.0f}")
+
+
+def bench_colunar(itens=1_000_000):
+    """Agregações completas e por janela de 15 min: varredura de objetos x colunas."""
+    produtos = carregar_produtos()
+    rnd = random.Random(5)
+    lista, colunas = CaixaSessao(), CaixaSessao(colunar=True)
+    inicio_noite = datetime(2024, 6, 15, 18, 0)
+    n_itens = i = 0
+    while n_itens < itens:
+        venda = venda_sintetica(produtos, rnd, (inicio_noite + timedelta(seconds=i // 20)).isoformat())
+        lista.adicionar_venda(venda)
+        colunas.adicionar_venda(Venda(venda.itens, venda.pagamento, venda.total, venda.recebido, 0, venda.datahora))
+        n_itens += len(venda.itens)
+        i += 1
+    print(f"{lista.numero_vendas} vendas, {n_itens} itens | NumPy: {'sim' if colunar.np is not None else 'não'}")
+    janela = (datetime(2024, 6, 15, 20, 0), datetime(2024, 6, 15, 21, 0))
+
+    def intervalo_objetos(largura=900):
+        res = {}
+        for v in lista.vendas:
+            k = v.instante // largura * largura
+            n, soma = res.get(k, (0, 0))
+            res[k] = (n + 1, soma + v.total)
+        return res
+
+    casos = [
+        ("recalcular tudo", lista.recalcular, lambda: (colunas.colunas.por_produto(), colunas.colunas.por_pagamento(),
+                                                         colunas.colunas.total_geral())),
+        ("20h-21h", lambda: lista.agregados(*janela), lambda: colunas.agregados(*janela)),
+        ("por 15 min", intervalo_objetos, lambda: colunas.colunas.por_intervalo(900)),
+    ]
+    print("consulta            objetos (ms)   colunas (ms)")
+    for nome, objetos, colunas_f in casos:
+        print(f"{nome:<18} {_cronometrar(objetos, 3) * 1000:13.1f} {_cronometrar(colunas_f, 3) * 1000:14.1f}")
+    assert lista.agregados(*janela) == colunas.agregados(*janela)
+    assert intervalo_objetos() == colunas.colunas.por_intervalo(900)
+
+
+def bench_sqlite(itens=1_000_000):
+    """Vendas por produto entre 20h e 21h: SQL com índice x varredura dos objetos."""
+    produtos = carregar_produtos()
+    rnd = random.Random(5)
+    sessao = CaixaSessao()
+    inicio_noite = datetime(2024, 6, 15, 18, 0)
+    n_itens = i = 0
+    while n_itens < itens:
+        venda = sessao.adicionar_venda(venda_sintetica(produtos, rnd, (inicio_noite + timedelta(seconds=i // 20)).isoformat()))
+        n_itens += len(venda.itens)
+        i += 1
+    janela = (datetime(2024, 6, 15, 20, 0), datetime(2024, 6, 15, 21, 0))
+    with tempfile.TemporaryDirectory() as pasta:
+        banco = ArmazenamentoSQLite(os.path.join(pasta, "caixa.db"), evento="bench")
+        inicio = time.perf_counter()
+        with banco.con:
+            banco._inserir(banco.evento, sessao.vendas)
+        carga = time.perf_counter() - inicio
+        print(f"{sessao.numero_vendas} vendas, {n_itens} itens | carga {carga:.1f} s")
+        sql = lambda: banco.por_produto(*janela)
+        print(f"20h-21h  objetos {_cronometrar(lambda: sessao.agregados(*janela), 3) * 1000:.1f} ms"
+              f" | SQL {_cronometrar(sql, 3) * 1000:.1f} ms")
+        assert {nome: qtd for nome, qtd, _ in sql()} == sessao.agregados(*janela)[0]
+        banco.fechar()
+
+
+def bench_importacao(arquivos=120, vendas_por_arquivo=2000, repetidas=200):
+    """Mescla de muitos vendas_*.json: leitura serial x pool de processos.
+    Cada arquivo repete `repetidas` vendas do anterior (sessão salva duas vezes)."""
+    produtos = carregar_produtos()
+    rnd = random.Random(13)
+    inicio_noite = datetime(2024, 6, 15, 18, 0)
+    with tempfile.TemporaryDirectory() as pasta:
+        caminhos, anteriores = [], []
+        for a in range(arquivos):
+            dia = inicio_noite + timedelta(days=a)
+            vendas = anteriores[-repetidas:] + [venda_sintetica(produtos, rnd, (dia + timedelta(seconds=i * 7)).isoformat())
+                                                for i in range(vendas_por_arquivo - min(repetidas, len(anteriores)))]
+            caminho = os.path.join(pasta, f"vendas_{a:03d}.json")
+            salvar_vendas(vendas, caminho)
+            caminhos.append(caminho)
+            anteriores = vendas
+        esperado = arquivos * vendas_por_arquivo - (arquivos - 1) * repetidas
+        print(f"{arquivos} arquivos, {arquivos * vendas_por_arquivo} vendas | núcleos: {os.cpu_count()}")
+        resultados = []
+        for processos in (1, max(2, os.cpu_count() or 1)):
+            inicio = time.perf_counter()
+            res = importacao.mesclar_arquivos(caminhos, processos)
+            dt = time.perf_counter() - inicio
+            assert res.sessao.numero_vendas == esperado and not res.erros, res.resumo()
+            resultados.append(res.sessao.total_por_produto)
+            print(f"{'serial' if processos == 1 else 'pool':<8} {dt:6.2f} s  ({res.duplicadas} duplicadas)")
+        assert resultados[0] == resultados[1]
+
+
+def _medir_relatorios(lat, sessao, pasta):
+    lat.medir("resumo", lambda: texto_resumo(sessao.modelo_relatorio()))
+    modelo = lat.medir("modelo detalhado", sessao.modelo_relatorio, True)
+    lat.medir("relatório TXT", gerar_txt, modelo, os.path.join(pasta, "relatorio.txt"))
+
+
+def bench_pico(n=10000, checkpoint=1000):
+    """Noite de pico sem interface: carrinho → fechamento pelo MotorCaixa, com
+    diário em disco; resumo e relatório medidos a cada `checkpoint` vendas."""
+    gerador = GeradorCarrinhos(carregar_produtos())
+    lat = Latencias()
+    with tempfile.TemporaryDirectory() as pasta:
+        diario = DiarioVendas(os.path.join(pasta, "diario.ndjson"))
+        motor = MotorCaixa(produtos=dict(gerador.produtos), armazenamento=ArmazenamentoArquivos(diario=diario))
+        for i in range(1, n + 1):
+            for nome, qtd in gerador.carrinho():
+                lat.medir("adicionar item", motor.adicionar_item, nome, qtd)
+            lat.medir("finalizar venda", motor.finalizar_venda, *gerador.pagamento(motor.carrinho.total))
+            if i % checkpoint == 0: _medir_relatorios(lat, motor.sessao, pasta)
+        motor.armazenamento.fechar()
+    assert motor.sessao.verificar_consistencia()
+    lat.imprimir()
+    return {"vendas": n, "operacoes": lat.percentis()}
+
+
+def bench_impressao(n=2000, atraso=0.02):
+    """Fechamento sem impressão x com a fila mandando comanda e cupom para uma
+    impressora lenta (servidor TCP local, `atraso` s por lote): a latência do
+    fechamento não deve mudar; a fila esvazia depois, em segundo plano."""
+    gerador = GeradorCarrinhos(carregar_produtos())
+    lat = Latencias()
+    with tempfile.TemporaryDirectory() as pasta:
+        servidor = servidor_impressora("127.0.0.1", 0, os.path.join(pasta, "impressos.txt"), atraso)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        fila = FilaImpressao(DestinoTCP("127.0.0.1", servidor.server_address[1]), cupom=True, limite=4 * n,
+                             arq_pendentes=os.path.join(pasta, "pendentes.ndjson"))
+        for rotulo, replicas in (("sem impressão", []), ("com impressão", [fila])):
+            motor = MotorCaixa(produtos=dict(gerador.produtos))
+            motor.replicas += replicas
+            for _ in range(n):
+                for nome, qtd in gerador.carrinho():
+                    motor.adicionar_item(nome, qtd)
+                lat.medir(f"fechar {rotulo}", motor.finalizar_venda, *gerador.pagamento(motor.carrinho.total))
+        inicio = time.perf_counter()
+        ok = fila.sincronizar(timeout=120)
+        dt = time.perf_counter() - inicio
+        fila.fechar()
+        servidor.shutdown()
+        servidor.server_close()
+    lat.imprimir()
+    print(f"{fila.impressos} impressos, {fila.falhas} falha(s); fila vazia {dt:.2f} s depois da última venda")
+    assert ok and fila.impressos == 2 * n and not fila.descartados
+    return {"vendas": n, "operacoes": lat.percentis()}
+
+
+def bench_pico_tk(n=3000, checkpoint=500):
+    """Noite de pico pelo App de verdade (adicionar_item_venda → finalizar_venda
+    → redesenho), com os redesenhos completos medidos a cada `checkpoint` vendas."""
+    import tkinter as tk
+    import main
+    gerador = GeradorCarrinhos(carregar_produtos())
+    lat = Latencias()
+    with tempfile.TemporaryDirectory() as pasta:
+        arq_produtos = os.path.join(pasta, "produtos.json")
+        salvar_produtos(gerador.produtos, arq_produtos)
+        armazenamento = ArmazenamentoArquivos(arq_produtos, DiarioVendas(os.path.join(pasta, "diario.ndjson")))
+        try:
+            app = main.App(armazenamento)
+        except tk.TclError as e:
+            print(f"Sem display para o Tk ({e}). Rode com: xvfb-run python benchmarks.py pico_tk")
+            return None
+        # A confirmação modal de cada venda travaria o laço.
+        main.messagebox.showinfo = lambda *a, **k: None
+        app._construir_aba(app.aba_relatorio)
+        app.update()
+        inicio = time.perf_counter()
+        try:
+            for i in range(1, n + 1):
+                for nome, qtd in gerador.carrinho():
+                    app.tree_sel_prod.selection_set(nome)
+                    app.ent_qtd.delete(0, tk.END)
+                    app.ent_qtd.insert(0, str(qtd))
+                    lat.medir("adicionar_item_venda", app.adicionar_item_venda)
+                forma, recebido = gerador.pagamento(app.venda_atual.total)
+                app.forma_var.set(forma)
+                app.ent_recebido.delete(0, tk.END)
+                app.ent_recebido.insert(0, main.formatar_centavos(recebido))
+                lat.medir("finalizar_venda", app.finalizar_venda)
+                lat.medir("redesenho", app.update)
+                if i % checkpoint == 0:
+                    lat.medir("_atualiza_total", app._atualiza_total)
+                    # Histórico redesenhado inteiro: invalida e passa pelo mesmo _aplicar_historico do redesenho.
+                    app._invalidar_historico()
+                    lat.medir("_aplicar_historico", app._aplicar_historico)
+                    lat.medir("_atualizar_resumo", app._atualizar_resumo)
+                    _medir_relatorios(lat, app.sessao, pasta)
+            assert app.sessao.numero_vendas == n
+            duracao = time.perf_counter() - inicio
+        finally:
+            app.armazenamento.fechar()
+            app.destroy()
+    lat.imprimir()
+    # Teto do caixa: vendas/min que a interface aguenta sem o tempo do operador.
+    print(f"{n / duracao * 60:.0f} vendas/min")
+    return {"vendas": n, "vendas_por_minuto": n / duracao * 60, "operacoes": lat.percentis()}
+
+
+def registrar_resultado(caminho, nome, resultado, tolerancia=1.25):
+    """Acrescenta o resultado ao arquivo de registro (NDJSON) e compara o p95 e
+    o máximo de cada operação com a última execução do mesmo benchmark e tamanho.
+    O máximo pega as pausas raras (ex.: uma venda que espera uma gravação longa)
+    que os percentis escondem."""
+    anterior = None
+    if os.path.exists(caminho):
+        with open(caminho, "r", encoding="utf-8") as f:
+            for linha in f:
+                try: reg = json.loads(linha)
+                except ValueError: continue
+                if reg.get("benchmark") == nome and reg.get("vendas") == resultado["vendas"]: anterior = reg
+    registro = dict(resultado, benchmark=nome, data=datetime.now().isoformat(timespec="seconds"),
+                    python=platform.python_version(), maquina=platform.node())
+    with open(caminho, "a", encoding="utf-8") as f:
+        f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+    if anterior is None: return
+    for op, r in resultado["operacoes"].items():
+        antes = anterior["operacoes"].get(op)
+        # Abaixo de 0,05 ms a variação é ruído de medição.
+        if not antes: continue
+        for medida, piso in (("p95", 0.05), ("max", 5.0)):
+            if r[medida] > antes[medida] * tolerancia and r[medida] > piso:
+                print(f"REGRESSÃO? {op}: {medida} {antes[medida]:.3f} → {r[medida]:.3f} ms (execução de {anterior['data']})")
+
+
+def bench_catalogo(n=250, repeticoes=2000):
+    """Índice do catálogo: busca sem acento, inclusão e remoção com `n` produtos."""
+    rnd = random.Random(17)
+    silabas = ["pa", "pão", "que", "ijo", "ca", "fé", "ço", "ma", "ça", "mi", "lho", "bo", "lo", "ár", "ua"]
+    nomes = list(dict.fromkeys(" ".join("".join(rnd.sample(silabas, 3)) for _ in range(2)).title() for _ in range(n * 2)))[:n]
+    indice = IndiceCatalogo(nomes)
+    consultas = ["pao", "ca", "ÁGUA", "lho", "17", "que ijo"]
+    busca = _cronometrar(lambda: [indice.buscar(c) for c in consultas], repeticoes // 10) / len(consultas)
+    extra = "Produto Novo Teste"
+    incluir_remover = _cronometrar(lambda: (indice.adicionar(extra), indice.remover(extra)), repeticoes)
+    print(f"{len(indice)} produtos | busca {busca * 1e6:.1f} µs | inclusão + remoção {incluir_remover * 1e6:.1f} µs")
+
+
+def bench_serie(tamanhos=(1_000, 10_000, 100_000)):
+    """Custo por venda da série por intervalo (SerieVendas) e do painel de ritmo,
+    em sessões de tamanhos diferentes: deve ficar constante."""
+    produtos = carregar_produtos()
+    rnd = random.Random(23)
+    base = datetime.now().replace(microsecond=0) - timedelta(hours=6)
+    print(f"{'vendas':>8}  {'registrar (µs)':>14}  {'painel (ms)':>11}")
+    for n in tamanhos:
+        passo = 6 * 3600 / n
+        vendas = [venda_sintetica(produtos, rnd, (base + timedelta(seconds=int(i * passo))).isoformat()) for i in range(n)]
+        sessao = CaixaSessao()
+        inicio = time.perf_counter()
+        for v in vendas:
+            sessao.serie.registrar(v)
+        por_venda = (time.perf_counter() - inicio) / n
+        painel = _cronometrar(lambda: texto_painel(sessao.serie), 50)
+        print(f"{n:>8}  {por_venda * 1e6:>14.2f}  {painel * 1000:>11.3f}")
+
+
+# Roda num interpretador novo: mede o import do main e o App até o primeiro quadro.
+_SCRIPT_INICIO = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+res = {"tempos": {"import main": t1 - t0}, "modulos": [m for m in ("numpy", "reportlab") if m in sys.modules]}
+try:
+    app = main.App(main.ArmazenamentoArquivos(sys.argv[1], main.DiarioVendas(sys.argv[2])))
+    app.update()
+    res["tempos"]["App até o 1º quadro"] = time.perf_counter() - t1
+    app.armazenamento.fechar()
+    app.destroy()
+except main.tk.TclError as e:
+    res["erro"] = str(e)
+print(json.dumps(res))
+"""
+
+
+def bench_inicio(n=2000, repeticoes=5):
+    """Abertura a frio do caixa: import do main e App até o primeiro quadro
+    interativo (com `n` vendas a recuperar do diário), cada vez num processo novo."""
+    import subprocess
+    gerador = GeradorCarrinhos(carregar_produtos())
+    lat = Latencias()
+    with tempfile.TemporaryDirectory() as pasta:
+        arq_produtos = os.path.join(pasta, "produtos.json")
+        arq_diario = os.path.join(pasta, "diario.ndjson")
+        salvar_produtos(gerador.produtos, arq_produtos)
+        motor = MotorCaixa(produtos=dict(gerador.produtos),
+                           armazenamento=ArmazenamentoArquivos(arq_produtos, DiarioVendas(arq_diario)))
+        for _ in range(n):
+            for nome, qtd in gerador.carrinho():
+                motor.adicionar_item(nome, qtd)
+            motor.finalizar_venda(*gerador.pagamento(motor.carrinho.total))
+        motor.armazenamento.fechar()
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            saida = subprocess.run([sys.executable, "-c", _SCRIPT_INICIO, arq_produtos, arq_diario], check=True,
+                                   capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+            lat.amostras.setdefault("processo completo", []).append(time.perf_counter() - inicio)
+            res = json.loads(saida.stdout.strip().splitlines()[-1])
+            for nome, segundos in res["tempos"].items():
+                lat.amostras.setdefault(nome, []).append(segundos)
+    lat.imprimir()
+    print("Módulos opcionais carregados na abertura: " + (", ".join(res["modulos"]) or "nenhum"))
+    if "erro" in res:
+        print(f"Sem display para o Tk ({res['erro']}): só o import foi medido. Rode com: xvfb-run python benchmarks.py inicio")
+    return {"vendas": n, "operacoes": lat.percentis()}
+
+
+BENCHMARKS = {
+    "agregados": bench_agregados,
+    "recuperacao": bench_recuperacao,
+    "motor": bench_motor,
+    "memoria": bench_memoria,
+    "colunar": bench_colunar,
+    "sqlite": bench_sqlite,
+    "importacao": bench_importacao,
+    "catalogo": bench_catalogo,
+    "inicio": bench_inicio,
+    "serie": bench_serie,
+    "pico": bench_pico,
+    "impressao": bench_impressao,
+    "pico_tk": bench_pico_tk,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks do caixa.")
+    parser.add_argument("nomes", nargs="*", help="padrão: todos (" + ", ".join(BENCHMARKS) + ")")
+    parser.add_argument("--vendas", type=int, help="nº de vendas dos benchmarks que aceitam `n`")
+    parser.add_argument("--registro", default="benchmarks_resultados.ndjson",
+                        help="arquivo onde os resultados de pico/pico_tk são acumulados")
+    args = parser.parse_args()
+    desconhecidos = [n for n in args.nomes if n not in BENCHMARKS]
+    if desconhecidos: parser.error("benchmark desconhecido: " + ", ".join(desconhecidos))
+    for nome in args.nomes or list(BENCHMARKS):
+        print(f"== {nome} ==")
+        func = BENCHMARKS[nome]
+        kwargs = {"n": args.vendas} if args.vendas and "n" in inspect.signature(func).parameters else {}
+        resultado = func(**kwargs)
+        if resultado is not None: registrar_resultado(args.registro, nome, resultado)
@@ -0,0 +1,1336 @@
+# caixa.py
+# Motor do caixa sem interface: catálogo, carrinho, fechamento da venda,
+# sessão e relatórios. O App Tkinter (main.py) é só uma vista sobre ele, e o
+# mesmo motor pode ser usado em testes, simulações e pela linha de comando:
+#   python caixa.py resumo vendas_2024-06-15_22-10.json
+#   python caixa.py relatorio vendas_2024-06-15_22-10.json relatorio.txt
+#   python caixa.py simular vendas_2024-06-15_22-10.json --repeticoes 10
+
+import abc
+import argparse
+import importlib.util
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from catalogo import IndiceCatalogo
+from estoque import Estoque
+from serie import LARGURA_PADRAO, RETENCAO_PADRAO, SerieVendas
+
+# O reportlab é opcional e pesado para importar: aqui só verificamos se está
+# instalado; gerar_pdf o importa na primeira vez que um PDF é pedido. Sem
+# ele, o app permite salvar TXT.
+REPORTLAB_OK = importlib.util.find_spec("reportlab") is not None
+
+FORMAS_PAGAMENTO = ["Dinheiro", "Débito", "Crédito", "Pix"]
+LIMITE_DESFAZER = 100
+
+ARQ_PRODUTOS = "produtos.json"
+ARQ_ESTOQUE = "estoque.json"
+
+# -----------------------
+# Dinheiro
+# -----------------------
+# Todos os valores do caixa são inteiros em centavos, para que os totais da
+# noite não acumulem erro de arredondamento. Os arquivos JSON continuam em
+# reais (float) para manter a compatibilidade com os vendas_*.json antigos.
+
+def centavos(valor) -> int:
+    try:
+        return int(round(float(valor) * 100))
+    except (TypeError, ValueError):
+        return 0
+
+def reais(valor_centavos: int) -> float:
+    return valor_centavos / 100
+
+def formatar_centavos(valor_centavos: int) -> str:
+    sinal = "-" if valor_centavos < 0 else ""
+    inteiro, resto = divmod(abs(int(valor_centavos)), 100)
+    return f"{sinal}{inteiro},{resto:02d}"
+
+def dinheiro(valor_centavos):
+    try:
+        return "R$ " + formatar_centavos(valor_centavos)
+    except:
+        return "R$ 0,00"
+
+def parse_valor(texto: str) -> int:
+    if texto is None:
+        return 0
+    txt = texto.strip().upper().replace("R$", "").strip()
+    txt = txt.replace(".", "").replace(",", ".") if txt.count(",") == 1 and txt.count(".") == 0 else txt
+    txt = txt.replace(" ", "")
+    return centavos(txt)
+
+
+# -----------------------
+# Registros de venda
+# -----------------------
+# Nomes de produto são internados numa tabela única: cada venda guarda só o id
+# inteiro do produto, não uma cópia do nome.
+_ids_produto = {}
+_nomes_produto = []
+
+def id_produto(nome: str) -> int:
+    pid = _ids_produto.get(nome)
+    if pid is None:
+        pid = _ids_produto[nome] = len(_nomes_produto)
+        _nomes_produto.append(sys.intern(nome))
+    return pid
+
+def nome_produto(pid: int) -> str:
+    return _nomes_produto[pid]
+
+
+_EPOCA = datetime(2000, 1, 1)
+
+def _segundos(datahora) -> int:
+    try: return int((datetime.fromisoformat(datahora) - _EPOCA).total_seconds())
+    except (TypeError, ValueError): return 0
+
+def instante(quando) -> int:
+    """Converte datetime/ISO para segundos desde 2000-01-01 (o `instante` das vendas)."""
+    if isinstance(quando, datetime): return int((quando - _EPOCA).total_seconds())
+    if isinstance(quando, str): return _segundos(quando)
+    return quando
+
+
+class Venda:
+    """Venda finalizada. Valores em centavos, hora em segundos desde 2000-01-01
+    e itens numa tupla plana (id_produto, qtd, preco, id_produto, qtd, preco, ...)."""
+
+    __slots__ = ("id", "_itens", "pagamento", "total", "recebido", "troco", "instante")
+
+    def __init__(self, itens, pagamento, total, recebido=0, troco=0, datahora=None, id=None):
+        plano = []
+        for nome, qtd, preco in itens:
+            plano += (id_produto(nome), qtd, preco)
+        self._itens = tuple(plano)
+        self.pagamento = FORMAS_PAGAMENTO[FORMAS_PAGAMENTO.index(pagamento)] if pagamento in FORMAS_PAGAMENTO else sys.intern(pagamento)
+        self.total = total
+        self.recebido = recebido
+        self.troco = troco
+        self.instante = instante(datahora or datetime.now().isoformat(timespec="seconds"))
+        self.id = id
+
+    @property
+    def itens(self):
+        """Lista de (nome, qtd, preco_centavos)."""
+        it = self._itens
+        return [(_nomes_produto[it[i]], it[i + 1], it[i + 2]) for i in range(0, len(it), 3)]
+
+    def itens_por_id(self):
+        it = self._itens
+        return zip(it[0::3], it[1::3], it[2::3])
+
+    @property
+    def datahora(self) -> str:
+        return (_EPOCA + timedelta(seconds=self.instante)).isoformat(timespec="seconds")
+
+    def para_dict(self):
+        """Formato dos arquivos vendas_*.json (valores em reais)."""
+        return {"id": self.id, "itens": [[nome, qtd, reais(preco)] for nome, qtd, preco in self.itens],
+                "pagamento": self.pagamento, "total": reais(self.total), "recebido": reais(self.recebido),
+                "troco": reais(self.troco), "datahora": self.datahora}
+
+    @classmethod
+    def de_dict(cls, d):
+        itens = [(str(nome), int(qtd), centavos(preco)) for nome, qtd, preco in d["itens"]]
+        return cls(itens, d["pagamento"], centavos(d["total"]), centavos(d.get("recebido", 0)),
+                   centavos(d.get("troco", 0)), d.get("datahora"), d.get("id"))
+
+
+# -----------------------
+# Camada de dados
+# -----------------------
+def _preco_catalogo(nome, valor):
+    # Mesma regra do cadastro (preço maior que zero); um preço ilegível não vira R$ 0,00.
+    if isinstance(valor, (int, float, str)) and not isinstance(valor, bool):
+        try: preco = int(round(float(valor) * 100))
+        except ValueError: preco = 0
+        if preco > 0: return preco
+    raise ValueError(f"preço inválido para '{nome}': {valor!r}")
+
+def _codigo_catalogo(valor):
+    # Código ilegível (null, texto, zero) conta como sem código: o índice dá um novo.
+    return valor if isinstance(valor, int) and not isinstance(valor, bool) and valor > 0 else None
+
+def ler_catalogo(caminho=ARQ_PRODUTOS, ignorados=None):
+    """(produtos, {nome: código}, maior código já usado) do arquivo; levanta
+    OSError/ValueError se não der para ler ou se algum produto for inválido
+    (o arquivo inteiro é recusado). Com uma lista em `ignorados`, os produtos
+    inválidos são pulados e o motivo de cada um vai para ela. Os formatos
+    antigos (lista ou {nome: preço}) não têm códigos: o índice numera na
+    ordem do arquivo."""
+    with open(caminho, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    ultimo = 0
+    if isinstance(data, dict) and isinstance(data.get("produtos"), list):
+        ultimo = _codigo_catalogo(data.get("ultimo_codigo")) or 0
+        data = data["produtos"]
+    if isinstance(data, list): itens = data
+    elif isinstance(data, dict): itens = [{"nome": str(k), "preco": v} for k, v in data.items()]
+    else: raise ValueError("formato de catálogo desconhecido")
+    produtos, codigos = {}, {}
+    for p in itens:
+        try:
+            if not isinstance(p, dict) or not isinstance(p.get("nome"), str) or not p["nome"].strip():
+                raise ValueError(f"produto inválido: {p!r}")
+            produtos[p["nome"]] = _preco_catalogo(p["nome"], p.get("preco"))
+        except ValueError as e:
+            if ignorados is None: raise
+            ignorados.append(str(e))
+            continue
+        codigo = _codigo_catalogo(p.get("codigo"))
+        if codigo is not None and codigo not in codigos.values(): codigos[p["nome"]] = codigo
+    return produtos, codigos, ultimo
+
+def ler_produtos(caminho=ARQ_PRODUTOS):
+    """Catálogo do arquivo; levanta OSError/ValueError se não der para ler."""
+    return ler_catalogo(caminho)[0]
+
+def carregar_produtos(caminho=ARQ_PRODUTOS):
+    if os.path.exists(caminho):
+        try:
+            return ler_catalogo(caminho, ignorados=[])[0]
+        except Exception:
+            pass
+    return {
+        "Pastel": 1000,
+        "Refrigerante": 600,
+        "Cerveja": 1200
+    }
+
+def salvar_produtos(produtos: dict, caminho=ARQ_PRODUTOS, codigos=None, ultimo_codigo=0):
+    # Grava num temporário e troca: quem lê o arquivo (outro caixa) nunca o vê pela metade.
+    codigos = codigos or {}
+    lista = []
+    for nome, preco in produtos.items():
+        p = {"nome": nome, "preco": reais(preco)}
+        if nome in codigos: p["codigo"] = codigos[nome]
+        lista.append(p)
+    tmp = caminho + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"ultimo_codigo": max(ultimo_codigo, *codigos.values(), 0), "produtos": lista},
+                  f, ensure_ascii=False, indent=2)
+    os.replace(tmp, caminho)
+
+def carregar_estoque(caminho=ARQ_ESTOQUE):
+    """{nome: (saldo, mínimo)}; sem arquivo (ou ilegível), nenhum produto tem controle de estoque."""
+    try:
+        with open(caminho, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return {str(nome): (int(n["saldo"]), int(n.get("minimo", 0))) for nome, n in data.items()}
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return {}
+
+def salvar_estoque(niveis: dict, caminho=ARQ_ESTOQUE):
+    tmp = caminho + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({nome: {"saldo": saldo, "minimo": minimo} for nome, (saldo, minimo) in niveis.items()},
+                  f, ensure_ascii=False, indent=2)
+    os.replace(tmp, caminho)
+
+
+def _formato_vendas(caminho):
+    return "ndjson" if caminho.lower().endswith((".ndjson", ".jsonl")) else "json"
+
+
+def _linhas_vendas(vendas, formato):
+    # Gera o arquivo aos pedaços: uma venda por linha, em JSON compacto.
+    compacto = lambda v: json.dumps(v.para_dict(), ensure_ascii=False, separators=(",", ":"))
+    if formato == "ndjson":
+        for v in vendas:
+            yield compacto(v) + "\n"
+        return
+    yield "["
+    separador = "\n"
+    for v in vendas:
+        yield separador + compacto(v)
+        separador = ",\n"
+    yield "\n]\n"
+
+
+def salvar_vendas(vendas, caminho, formato=None, progresso=None, lote=500):
+    """Exporta vendas em JSON (lista) ou NDJSON (uma por linha), escrevendo em
+    lotes num arquivo temporário que só substitui o destino ao final."""
+    formato = formato or _formato_vendas(caminho)
+    tmp = caminho + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            pedaco = []
+            for i, linha in enumerate(_linhas_vendas(vendas, formato), start=1):
+                pedaco.append(linha)
+                if len(pedaco) >= lote:
+                    f.write("".join(pedaco))
+                    pedaco.clear()
+                    if progresso is not None: progresso(i)
+            f.write("".join(pedaco))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, caminho)
+    except BaseException:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+
+
+def iterar_vendas(caminho, tamanho_bloco=1 << 16):
+    """Lê um vendas_*.json (lista JSON, inclusive os antigos com indent) ou
+    .ndjson venda a venda, sem carregar o arquivo inteiro na memória."""
+    for obj in iterar_dicts(caminho, tamanho_bloco):
+        yield Venda.de_dict(obj)
+
+
+def iterar_dicts(caminho, tamanho_bloco=1 << 16):
+    """Como `iterar_vendas`, mas devolve os dicts do arquivo sem converter."""
+    decoder = json.JSONDecoder()
+    with open(caminho, "r", encoding="utf-8") as f:
+        buf, pos, fim_arquivo = "", 0, False
+        while True:
+            # Pula espaços, vírgulas e os colchetes da lista.
+            while pos < len(buf) and buf[pos] in " \t\r\n,[]":
+                pos += 1
+            if pos >= len(buf):
+                if fim_arquivo: return
+                buf, pos = f.read(tamanho_bloco), 0
+                fim_arquivo = not buf
+                continue
+            try:
+                obj, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                mais = f.read(tamanho_bloco)
+                if not mais: raise
+                buf, pos = buf[pos:] + mais, 0
+                continue
+            yield obj
+
+
+def carregar_vendas(caminho):
+    return list(iterar_vendas(caminho))
+
+
+class ArmazenamentoArquivos:
+    """Armazenamento padrão: catálogo em produtos.json e vendas da sessão no
+    diário (se houver). Mesma interface de armazenamento.ArmazenamentoSQLite:
+
+      carregar_produtos() / codigos_produtos() / produtos_alterados()
+      salvar_produtos(produtos, alterados, removidos, renomeados, codigos, ultimo_codigo)
+      carregar_estoque() / salvar_estoque(niveis)
+      carregar_vendas() / registrar_venda(venda) / excluir_venda(id) / ultimo_id()
+      precisa_compactar / compactar(vendas) / nova_sessao() / sincronizar() / fechar()
+
+    O catálogo é gravado em segundo tempo: salvar_produtos só anota o que
+    mudou, e sincronizar() (chamado a cada segundo pelo App) regrava o
+    produtos.json de uma vez. Vários caixas podem dividir o mesmo arquivo:
+    produtos_alterados() percebe (por data de modificação e tamanho) quando
+    outro caixa o regravou. Os códigos dos produtos (ver catalogo.py) vão no
+    mesmo arquivo; codigos_produtos() devolve os da última leitura.
+
+    O estoque (saldo do início da sessão e mínimo de cada produto) fica em
+    estoque.json, gravado na hora: só muda em ajustes e na troca de sessão.
+    """
+
+    def __init__(self, arq_produtos=ARQ_PRODUTOS, diario=None, arq_estoque=ARQ_ESTOQUE):
+        self.arq_produtos = arq_produtos
+        self.arq_estoque = arq_estoque
+        self.diario = diario
+        self._assinatura = None     # (mtime_ns, tamanho) do produtos.json lido ou gravado por último
+        self._produtos = None       # catálogo com gravação pendente
+        self._alterados = set()
+        self._removidos = set()
+        self._renomeados = []       # [(nome antigo, nome novo)], na ordem em que aconteceram
+        self._codigos = {}          # {nome: código} com gravação pendente
+        self._ultimo_codigo = 0
+        self._lidos = ({}, 0)       # (códigos, maior código) da última leitura
+        self.erro_catalogo = None   # por que o produtos.json mudado foi recusado; None se foi aceito
+
+    def _ler_assinatura(self):
+        try: st = os.stat(self.arq_produtos)
+        except OSError: return None
+        return st.st_mtime_ns, st.st_size
+
+    def carregar_produtos(self):
+        self._assinatura = self._ler_assinatura()
+        # Na abertura, um produto inválido é pulado (e avisado) em vez de trocar o catálogo pelo de exemplo.
+        ignorados = []
+        try: produtos, *self._lidos = ler_catalogo(self.arq_produtos, ignorados)
+        except Exception: return carregar_produtos(self.arq_produtos)
+        self.erro_catalogo = "; ".join(ignorados) or None
+        return produtos
+
+    def codigos_produtos(self):
+        """({nome: código}, maior código já usado) da última leitura do catálogo."""
+        return self._lidos
+
+    def salvar_produtos(self, produtos, alterados=(), removidos=(), renomeados=(), codigos=None, ultimo_codigo=0):
+        self._produtos = produtos
+        self._codigos = codigos or {}
+        self._ultimo_codigo = ultimo_codigo
+        self._renomeados.extend(renomeados)
+        self._alterados.difference_update(removidos)
+        self._removidos.update(removidos)
+        self._removidos.difference_update(alterados)
+        self._alterados.update(alterados)
+
+    def _por_cima(self, produtos, codigos, ultimo):
+        # Aplica as alterações locais ainda não gravadas sobre um catálogo relido.
+        # Uma renomeação troca o nome no lugar, sem mudar a posição nem o código.
+        for nome, novo_nome in self._renomeados:
+            if nome not in produtos: continue
+            itens = [(novo_nome if n == nome else n, p) for n, p in produtos.items() if n != novo_nome]
+            produtos.clear()
+            produtos.update(itens)
+            codigos.pop(novo_nome, None)
+            if nome in codigos: codigos[novo_nome] = codigos.pop(nome)
+        for nome in self._removidos:
+            produtos.pop(nome, None)
+            codigos.pop(nome, None)
+        ultimo = max(ultimo, self._ultimo_codigo, *codigos.values(), 0)
+        usados = set(codigos.values())
+        for nome in self._alterados:
+            if nome not in self._produtos: continue
+            produtos[nome] = self._produtos[nome]
+            if nome in codigos: continue
+            # Produto novo: se outro caixa cadastrou um com o mesmo código, este ganha outro.
+            codigo = self._codigos.get(nome)
+            if codigo is None or codigo in usados:
+                codigo = ultimo = ultimo + 1
+            codigos[nome] = codigo
+            usados.add(codigo)
+        return produtos, codigos, ultimo
+
+    def produtos_alterados(self):
+        """Catálogo relido se o produtos.json mudou por fora desde a última
+        leitura/gravação (com as alterações locais pendentes por cima); senão None."""
+        assinatura = self._ler_assinatura()
+        if assinatura is None or assinatura == self._assinatura: return None
+        try: lido = ler_catalogo(self.arq_produtos)
+        except OSError: return None     # arquivo sendo trocado: tenta no próximo ciclo
+        except ValueError as e:
+            # Editado à mão com erro: fica o catálogo atual até o arquivo ser corrigido.
+            self.erro_catalogo = str(e)
+            return None
+        self.erro_catalogo = None
+        self._assinatura = assinatura
+        produtos, *self._lidos = self._por_cima(*lido) if self._produtos is not None else lido
+        return produtos
+
+    def _gravar_produtos(self):
+        if self._produtos is None: return
+        catalogo = self._produtos, self._codigos, self._ultimo_codigo
+        externo = self._ler_assinatura() not in (None, self._assinatura)
+        if externo:
+            # Outro caixa gravou depois da nossa última leitura: mantém o que ele
+            # mudou e põe por cima só o que foi alterado aqui.
+            try: catalogo = self._por_cima(*ler_catalogo(self.arq_produtos))
+            except (OSError, ValueError): pass
+        salvar_produtos(catalogo[0], self.arq_produtos, *catalogo[1:])
+        # Depois de mesclar, deixa a próxima verificação reler o arquivo e
+        # trazer as mudanças do outro caixa para a tela.
+        self._assinatura = None if externo else self._ler_assinatura()
+        self._produtos = None
+        self._codigos = {}
+        self._alterados.clear()
+        self._removidos.clear()
+        self._renomeados.clear()
+
+    def carregar_estoque(self):
+        return carregar_estoque(self.arq_estoque)
+
+    def salvar_estoque(self, niveis):
+        salvar_estoque(niveis, self.arq_estoque)
+
+    def carregar_vendas(self):
+        if self.diario is None: return []
+        return [Venda.de_dict(v) for v in self.diario.recuperar()]
+
+    def registrar_venda(self, venda):
+        if self.diario is not None: self.diario.registrar_venda(venda.para_dict())
+
+    def ultimo_id(self):
+        """Maior id de venda já usado na sessão (inclusive excluídas), visto no último carregar_vendas."""
+        return 0 if self.diario is None else self.diario.maior_id
+
+    def excluir_venda(self, venda_id):
+        if self.diario is not None: self.diario.registrar_exclusao(venda_id)
+
+    @property
+    def precisa_compactar(self):
+        return self.diario is not None and self.diario.precisa_compactar
+
+    def compactar(self, vendas):
+        # Cópia da lista no estado de agora; o snapshot é montado e gravado em outra thread.
+        self.diario.compactar(list(vendas), Venda.para_dict)
+
+    def nova_sessao(self):
+        if self.diario is not None: self.diario.limpar()
+
+    def sincronizar(self):
+        self._gravar_produtos()
+        if self.diario is not None: self.diario.sincronizar()
+
+    def fechar(self):
+        self._gravar_produtos()
+        if self.diario is not None: self.diario.fechar()
+
+
+# Lógica de vendas
+
+class CaixaSessao:
+    # Mantém acumuladores por produto, por pagamento e total geral, atualizados
+    # a cada venda adicionada/removida, para que o resumo não precise varrer
+    # todas as vendas a cada clique. Valores em centavos.
+    # Com colunar=True as vendas também alimentam um ColunasVendas, usado por
+    # `agregados` (recortes por horário, janelas de tempo) sem varrer objetos.
+    # As vendas ficam em ordem de id, com um índice id -> posição. Excluir só
+    # troca a venda por uma lápide (None) e desconta dos acumuladores; as
+    # lápides saem todas de uma vez na próxima leitura de `vendas`.
+    # `serie` (SerieVendas) guarda os contadores por intervalo de tempo do painel de ritmo.
+    def __init__(self, colunar=False, largura_serie=LARGURA_PADRAO, retencao_serie=RETENCAO_PADRAO):
+        self._registros = []
+        self._posicao = {}      # id -> posição em _registros
+        self._lapides = {}      # id excluído -> posição que ocupava (até a próxima compactação)
+        self.colunas = None
+        if colunar:
+            # Importado só aqui: o colunar puxa o NumPy, que o caixa comum não usa.
+            from colunar import ColunasVendas
+            self.colunas = ColunasVendas()
+        self.serie = SerieVendas(largura_serie, retencao_serie)
+        self._tot_produto = {}
+        self._tot_pagamento = dict.fromkeys(FORMAS_PAGAMENTO, 0)
+        self._total_geral = 0
+        self._proximo_id = 1
+        self.versao = 0
+        self._modelo = None
+
+    def _acumular(self, venda, sinal):
+        for pid, qtd, _ in venda.itens_por_id():
+            novo = self._tot_produto.get(pid, 0) + sinal * qtd
+            if novo: self._tot_produto[pid] = novo
+            else: self._tot_produto.pop(pid, None)
+        forma = venda.pagamento
+        self._tot_pagamento[forma] = self._tot_pagamento.get(forma, 0) + sinal * venda.total
+        self._total_geral += sinal * venda.total
+        self.serie.registrar(venda, sinal)
+
+    @property
+    def vendas(self):
+        """Vendas da sessão em ordem de id (sem as excluídas)."""
+        if self._lapides: self._compactar()
+        return self._registros
+
+    def _compactar(self):
+        regs = self._registros
+        primeira = min(self._lapides.values())
+        regs[primeira:] = [v for v in regs[primeira:] if v is not None]
+        for i in range(primeira, len(regs)):
+            self._posicao[regs[i].id] = i
+        self._lapides.clear()
+
+    def reservar_ids(self, ultimo_id):
+        """Garante que as próximas vendas recebam ids acima de `ultimo_id`
+        (ex.: o de uma venda excluída antes de reabrir a sessão)."""
+        self._proximo_id = max(self._proximo_id, ultimo_id + 1)
+
+    def adicionar_venda(self, venda):
+        """Acrescenta `venda`; sem id, recebe o próximo. Uma venda com id antigo
+        (ex.: exclusão desfeita) volta para o seu lugar na ordem dos ids."""
+        if venda.id is None:
+            venda.id = self._proximo_id
+        elif venda.id in self._posicao:
+            raise ValueError(f"venda {venda.id} já está na sessão")
+        vid = venda.id
+        if vid >= self._proximo_id:
+            self._posicao[vid] = len(self._registros)
+            self._registros.append(venda)
+            self._proximo_id = vid + 1
+        elif vid in self._lapides:
+            pos = self._posicao[vid] = self._lapides.pop(vid)
+            self._registros[pos] = venda
+        else:
+            regs = self.vendas
+            lo, hi = 0, len(regs)
+            while lo < hi:
+                meio = (lo + hi) // 2
+                if regs[meio].id < vid: lo = meio + 1
+                else: hi = meio
+            regs.insert(lo, venda)
+            for i in range(lo, len(regs)):
+                self._posicao[regs[i].id] = i
+        self.versao += 1
+        self._acumular(venda, 1)
+        if self.colunas is not None: self.colunas.adicionar(venda)
+        return venda
+
+    def obter_venda(self, venda_id):
+        pos = self._posicao.get(venda_id)
+        if pos is None: raise ValueError(f"venda {venda_id} não encontrada")
+        return self._registros[pos]
+
+    def indice_venda(self, venda_id):
+        """Posição de `venda_id` em `vendas`."""
+        if self._lapides: self._compactar()
+        pos = self._posicao.get(venda_id)
+        if pos is None: raise ValueError(f"venda {venda_id} não encontrada")
+        return pos
+
+    def remover_venda(self, venda_id):
+        pos = self._posicao.pop(venda_id, None)
+        if pos is None: raise ValueError(f"venda {venda_id} não encontrada")
+        venda = self._registros[pos]
+        self._registros[pos] = None
+        self._lapides[venda_id] = pos
+        self.versao += 1
+        self._acumular(venda, -1)
+        if self.colunas is not None: self.colunas.remover(venda_id)
+        return venda
+
+    @property
+    def total_por_produto(self):
+        return {_nomes_produto[pid]: qtd for pid, qtd in self._tot_produto.items()}
+
+    @property
+    def total_por_pagamento(self):
+        return dict(self._tot_pagamento)
+
+    @property
+    def total_geral(self):
+        return self._total_geral
+
+    @property
+    def numero_vendas(self):
+        return len(self._posicao)
+
+    @property
+    def ticket_medio(self):
+        return (self.total_geral // self.numero_vendas) if self.numero_vendas > 0 else 0
+
+    def recalcular(self):
+        """Recalcula os totais varrendo todas as vendas (referência para os acumuladores)."""
+        tpp, tpg = {}, dict.fromkeys(FORMAS_PAGAMENTO, 0)
+        for v in self.vendas:
+            for pid, qtd, _ in v.itens_por_id():
+                tpp[pid] = tpp.get(pid, 0) + qtd
+            tpg[v.pagamento] = tpg.get(v.pagamento, 0) + v.total
+        return tpp, tpg, sum(v.total for v in self.vendas)
+
+    def modelo_relatorio(self, detalhado=False):
+        """ModeloRelatorio da versão atual; chamadas repetidas sem vendas novas reaproveitam o mesmo."""
+        m = self._modelo
+        if m is None or m.versao != self.versao or (detalhado and m.vendas is None):
+            m = self._modelo = ModeloRelatorio(self, detalhado)
+        return m
+
+    def agregados(self, inicio=None, fim=None):
+        """(por produto, por pagamento, total) das vendas com inicio <= datahora < fim.
+
+        Sem limites, devolve os acumuladores. Com limites, usa as colunas quando
+        a sessão é colunar e o NumPy está disponível; senão percorre as vendas.
+        """
+        if inicio is None and fim is None:
+            return self.total_por_produto, self.total_por_pagamento, self.total_geral
+        inicio, fim = instante(inicio), instante(fim)
+        if self.colunas is not None and self.colunas.vetorizado:
+            tpg = dict.fromkeys(FORMAS_PAGAMENTO, 0)
+            tpg.update(self.colunas.por_pagamento(inicio, fim))
+            tpp = {_nomes_produto[pid]: qtd for pid, qtd in self.colunas.por_produto(inicio, fim).items()}
+            return tpp, tpg, self.colunas.total_geral(inicio, fim)
+        tpp, tpg, total = {}, dict.fromkeys(FORMAS_PAGAMENTO, 0), 0
+        for v in self.vendas:
+            if (inicio is not None and v.instante < inicio) or (fim is not None and v.instante >= fim): continue
+            for pid, qtd, _ in v.itens_por_id():
+                tpp[pid] = tpp.get(pid, 0) + qtd
+            tpg[v.pagamento] = tpg.get(v.pagamento, 0) + v.total
+            total += v.total
+        return {_nomes_produto[pid]: qtd for pid, qtd in tpp.items() if qtd}, tpg, total
+
+    def verificar_consistencia(self):
+        """Confere os acumuladores (e as colunas, se houver) contra um recálculo completo."""
+        tpp, tpg, total = self.recalcular()
+        tpp = {k: v for k, v in tpp.items() if v}
+        if self.colunas is not None:
+            col_tpg = dict.fromkeys(FORMAS_PAGAMENTO, 0)
+            col_tpg.update(self.colunas.por_pagamento())
+            if (self.colunas.por_produto() != tpp or col_tpg != tpg
+                    or self.colunas.total_geral() != total):
+                return False
+        return tpp == self._tot_produto and tpg == self._tot_pagamento and total == self._total_geral
+
+
+class ErroVenda(ValueError):
+    """Entrada inválida no caixa; a mensagem é a que o operador vê."""
+
+
+class ErroGravacao(OSError):
+    """Mais de um destino falhou ao gravar a mesma venda; `falhas` = [(destino, erro)]."""
+
+    def __init__(self, falhas):
+        super().__init__("; ".join(f"{type(d).__name__}: {e}" for d, e in falhas))
+        self.falhas = falhas
+
+
+class Carrinho:
+    # Uma linha por produto e preço: chave (nome, preco_centavos) -> qtd, na
+    # ordem em que entraram. Adicionar um produto que já está no carrinho soma
+    # na mesma linha. O total é mantido a cada mudança, e as linhas mexidas
+    # desde o último `alteracoes()` ficam anotadas para a tela redesenhar só elas.
+    def __init__(self):
+        self._linhas = {}
+        self._total = 0
+        self._alteradas = {}    # chaves mexidas, em ordem (dict como conjunto ordenado)
+        self._limpou = False
+
+    def _anotar(self, chave):
+        self._alteradas[chave] = None
+
+    def adicionar(self, nome, qtd, preco):
+        chave = (nome, preco)
+        self._linhas[chave] = self._linhas.get(chave, 0) + qtd
+        self._total += qtd * preco
+        self._anotar(chave)
+        return chave
+
+    def alterar(self, chave, delta):
+        """Soma `delta` à quantidade da linha; em zero ou menos, a linha sai. Devolve a nova quantidade."""
+        qtd = self._linhas[chave]
+        nova = max(0, qtd + delta)
+        self._total += (nova - qtd) * chave[1]
+        if nova: self._linhas[chave] = nova
+        else: del self._linhas[chave]
+        self._anotar(chave)
+        return nova
+
+    def remover(self, chave):
+        qtd = self._linhas.pop(chave)
+        self._total -= qtd * chave[1]
+        self._anotar(chave)
+        return chave[0], qtd, chave[1]
+
+    def renomear(self, nome, novo_nome):
+        """Troca o nome nas linhas de `nome`, no mesmo lugar; soma numa linha de `novo_nome` com o mesmo preço."""
+        if not any(n == nome for n, _ in self._linhas): return
+        linhas = {}
+        for (n, preco), qtd in self._linhas.items():
+            if n == nome:
+                self._anotar((n, preco))
+                n = novo_nome
+            linhas[(n, preco)] = linhas.get((n, preco), 0) + qtd
+            if n == novo_nome: self._anotar((n, preco))
+        self._linhas = linhas
+
+    def limpar(self):
+        self._linhas.clear()
+        self._total = 0
+        self._alteradas.clear()
+        self._limpou = True
+
+    def quantidade(self, chave):
+        return self._linhas.get(chave, 0)
+
+    def quantidade_de(self, nome):
+        """Quantidade de `nome` somando as linhas (uma por preço)."""
+        return sum(qtd for (n, _), qtd in self._linhas.items() if n == nome)
+
+    def alteracoes(self):
+        """(limpou, chaves alteradas) desde a última chamada."""
+        res = self._limpou, list(self._alteradas)
+        self._alteradas.clear()
+        self._limpou = False
+        return res
+
+    @property
+    def itens(self):
+        return list(self)
+
+    @property
+    def total(self):
+        return self._total
+
+    def __iter__(self):
+        return ((nome, qtd, preco) for (nome, preco), qtd in self._linhas.items())
+
+    def __len__(self):
+        return len(self._linhas)
+
+    def __contains__(self, chave):
+        return chave in self._linhas
+
+
+class MotorCaixa:
+    """Regras do caixa sem depender de Tk: catálogo, carrinho, fechamento e sessão.
+
+    Catálogo e vendas são gravados pelo `armazenamento` (ArmazenamentoArquivos
+    por padrão, ou armazenamento.ArmazenamentoSQLite). Falhas ao gravar uma
+    venda vão para `ao_falhar_gravacao(erro)` quando definido; sem callback, a
+    exceção é propagada (a venda já está na sessão). Cada objeto em `replicas`
+    (ex.: rede.EnvioTerminal) também recebe `registrar_venda`/`excluir_venda`;
+    todos são tentados, e as falhas de mais de um destino chegam juntas num
+    ErroGravacao.
+
+    Vendas finalizadas e exclusões entram numa pilha de desfazer (as últimas
+    LIMITE_DESFAZER); desfazer/refazer grava a operação inversa como qualquer
+    outra, mantendo o id original da venda.
+
+    `largura_serie`/`retencao_serie` (segundos / nº de intervalos) configuram a
+    série por intervalo de tempo de cada sessão (CaixaSessao.serie).
+
+    Produtos com estoque cadastrado (`estoque`, carregado do armazenamento junto
+    com o catálogo) são reservados ao entrar no carrinho, baixados ao finalizar
+    e devolvidos ao sair do carrinho ou numa exclusão; não entra no carrinho
+    mais do que há disponível.
+    """
+
+    def __init__(self, produtos=None, armazenamento=None, colunar=False,
+                 largura_serie=LARGURA_PADRAO, retencao_serie=RETENCAO_PADRAO):
+        self.armazenamento = ArmazenamentoArquivos() if armazenamento is None else armazenamento
+        self.produtos = self.armazenamento.carregar_produtos() if produtos is None else produtos
+        codigos, ultimo = self.armazenamento.codigos_produtos() if produtos is None else (None, 0)
+        self.indice = IndiceCatalogo(self.produtos, codigos, ultimo)
+        # Com um catálogo dado (simulações, testes), começa sem controle de estoque.
+        self.estoque = Estoque(self.armazenamento.carregar_estoque() if produtos is None else None)
+        self.colunar = colunar
+        self.largura_serie = largura_serie
+        self.retencao_serie = retencao_serie
+        self.sessao = self._sessao_vazia()
+        self.carrinho = Carrinho()
+        self.ao_falhar_gravacao = None
+        self.replicas = []
+        self._desfazer = deque(maxlen=LIMITE_DESFAZER)   # ("venda" | "exclusao", venda)
+        self._refazer = []
+
+    # Catálogo
+
+    def salvar_produtos(self, alterados=(), removidos=(), renomeados=()):
+        self.armazenamento.salvar_produtos(self.produtos, alterados, removidos, renomeados,
+                                           self.indice.codigos, self.indice.ultimo_codigo)
+
+    def adicionar_produto(self, nome, preco):
+        nome = nome.strip()
+        if not nome or preco <= 0:
+            raise ErroVenda("Informe um nome e um preço válido.")
+        self.produtos[nome] = preco
+        self.indice.adicionar(nome)
+        self.salvar_produtos(alterados=(nome,))
+
+    def editar_produto(self, nome, novo_nome, novo_preco):
+        if novo_preco <= 0:
+            raise ErroVenda("Preço inválido.")
+        renomeados = ()
+        if novo_nome != nome:
+            # Renomeia no lugar: o produto mantém a posição e o código no cadastro.
+            itens = [(novo_nome if n == nome else n, p) for n, p in self.produtos.items() if n != novo_nome]
+            self.produtos.clear()
+            self.produtos.update(itens)
+            self.indice.renomear(nome, novo_nome)
+            renomeados = ((nome, novo_nome),)
+        self.produtos[novo_nome] = novo_preco
+        self.salvar_produtos(alterados=(novo_nome,), renomeados=renomeados)
+        if novo_nome != nome:
+            # O que já está no carrinho passa a ser do nome novo, com a reserva de estoque.
+            self.carrinho.renomear(nome, novo_nome)
+            if self.estoque.renomear(nome, novo_nome): self.salvar_estoque()
+
+    def remover_produto(self, nome):
+        if self.produtos.pop(nome, None) is not None: self.indice.remover(nome)
+        self.salvar_produtos(removidos=(nome,))
+        if self.estoque.remover(nome): self.salvar_estoque()
+
+    def recarregar_produtos(self):
+        """Traz para o catálogo as mudanças gravadas por fora (outro caixa no
+        mesmo produtos.json ou banco). Devolve None se nada mudou, ou
+        (removidos, gravados, recodificado): removidos e gravados (novos ou
+        com preço novo) são nomes; recodificado indica que algum código mudou
+        (ex.: dois caixas cadastraram produtos ao mesmo tempo) e as listas
+        precisam ser refeitas."""
+        novo = self.armazenamento.produtos_alterados()
+        if novo is None: return None
+        codigos, ultimo = self.armazenamento.codigos_produtos()
+        # Preço inválido vindo de fora (ex.: texto gravado direto no banco): o
+        # produto fica como está aqui, em vez de sumir ou passar a custar zero.
+        for nome, preco in list(novo.items()):
+            if isinstance(preco, int) and not isinstance(preco, bool) and preco > 0: continue
+            if nome in self.produtos: novo[nome] = self.produtos[nome]
+            else: del novo[nome]
+        removidos = [n for n in self.produtos if n not in novo]
+        estoque_mudou = False
+        for nome in removidos:
+            del self.produtos[nome]
+            self.indice.remover(nome)
+            # O estoque do removido sai junto, como em remover_produto.
+            if self.estoque.remover(nome): estoque_mudou = True
+        if estoque_mudou: self.salvar_estoque()
+        gravados = [n for n, preco in novo.items() if self.produtos.get(n) != preco]
+        for nome in gravados:
+            if nome not in self.produtos: self.indice.adicionar(nome, codigos.get(nome))
+            self.produtos[nome] = novo[nome]
+        recodificado = any(self.indice.codigo(n) != c for n, c in codigos.items() if n in novo)
+        if recodificado:
+            self.produtos.clear()
+            self.produtos.update(novo)
+            self.indice = IndiceCatalogo(self.produtos, codigos, ultimo)
+        self.indice.ultimo_codigo = max(self.indice.ultimo_codigo, ultimo)
+        if not (removidos or gravados or recodificado): return None
+        return removidos, gravados, recodificado
+
+    # Estoque
+
+    def salvar_estoque(self):
+        self.armazenamento.salvar_estoque(self.estoque.niveis())
+
+    def ajustar_estoque(self, nome, saldo, minimo=0):
+        """Define quanto há de `nome` agora e o nível de alerta; saldo None tira o controle."""
+        if nome not in self.produtos:
+            raise ErroVenda(f"Produto '{nome}' não está no catálogo.")
+        if saldo is not None and (not isinstance(saldo, int) or saldo < 0):
+            raise ErroVenda("Estoque deve ser um número inteiro, zero ou mais.")
+        if not isinstance(minimo, int) or minimo < 0:
+            raise ErroVenda("Estoque mínimo deve ser um número inteiro, zero ou mais.")
+        self.estoque.ajustar(nome, saldo, minimo, reservado=self.carrinho.quantidade_de(nome))
+        self.salvar_estoque()
+
+    def _conferir_estoque(self, nome, qtd):
+        disp = self.estoque.disponivel(nome)
+        if disp is not None and qtd > disp:
+            raise ErroVenda(f"Estoque insuficiente de '{nome}': restam {disp}." if disp > 0
+                            else f"'{nome}' esgotado.")
+
+    def buscar_produtos(self, texto):
+        return self.indice.buscar(texto)
+
+    def adicionar_por_codigo(self, codigo, qtd=1):
+        """Adiciona ao carrinho o produto de código `codigo`; devolve o nome."""
+        nome = self.indice.por_codigo(codigo)
+        if nome is None:
+            raise ErroVenda(f"Nenhum produto com o código {codigo}.")
+        self.adicionar_item(nome, qtd)
+        return nome
+
+    # Carrinho e fechamento
+
+    def adicionar_item(self, nome, qtd, preco=None):
+        if not isinstance(qtd, int) or qtd <= 0:
+            raise ErroVenda("Quantidade deve ser um número inteiro maior que zero.")
+        if preco is None:
+            if nome not in self.produtos:
+                raise ErroVenda(f"Produto '{nome}' não está no catálogo.")
+            preco = self.produtos[nome]
+        self._conferir_estoque(nome, qtd)
+        chave = self.carrinho.adicionar(nome, qtd, preco)
+        self.estoque.reservar(nome, qtd)
+        return chave
+
+    def alterar_quantidade(self, chave, delta):
+        """+/− na linha `chave` do carrinho; devolve a nova quantidade (0 = linha removida)."""
+        if not isinstance(delta, int):
+            raise ErroVenda("Quantidade deve ser um número inteiro.")
+        if chave not in self.carrinho:
+            raise ErroVenda("Item não está na venda atual.")
+        nome = chave[0]
+        if delta > 0: self._conferir_estoque(nome, delta)
+        qtd = self.carrinho.quantidade(chave)
+        nova = self.carrinho.alterar(chave, delta)
+        self.estoque.reservar(nome, nova - qtd)
+        return nova
+
+    def remover_item(self, chave):
+        nome, qtd, preco = self.carrinho.remover(chave)
+        self.estoque.liberar(nome, qtd)
+        return nome, qtd, preco
+
+    def limpar_carrinho(self):
+        self.carrinho.limpar()
+        self.estoque.liberar_tudo()
+
+    def calcular_troco(self, forma, recebido):
+        if forma != "Dinheiro":
+            return 0
+        return max(0, recebido - self.carrinho.total)
+
+    def finalizar_venda(self, forma, recebido=0, datahora=None):
+        if not len(self.carrinho):
+            raise ErroVenda("Nenhum item na venda.")
+        if forma not in FORMAS_PAGAMENTO:
+            raise ErroVenda(f"Forma de pagamento inválida: {forma}.")
+        total = self.carrinho.total
+        troco = 0
+        if forma == "Dinheiro":
+            if recebido < total:
+                raise ErroVenda("Valor recebido menor que o total.")
+            troco = recebido - total
+        else:
+            recebido = 0
+        venda = Venda(self.carrinho, forma, total, recebido, troco, datahora)
+        self.sessao.adicionar_venda(venda)
+        self.estoque.confirmar(self.carrinho)
+        # O carrinho fica vazio: qualquer reserva que sobrar não é de ninguém.
+        self.estoque.liberar_tudo()
+        self.carrinho.limpar()
+        self._gravar(venda)
+        self._operacao("venda", venda)
+        return venda
+
+    def excluir_venda(self, venda_id):
+        venda = self.sessao.remover_venda(venda_id)
+        self.estoque.vender(venda.itens, -1)
+        self._gravar(venda, excluida=True)
+        self._operacao("exclusao", venda)
+        return venda
+
+    # Desfazer / refazer
+
+    def _operacao(self, tipo, venda):
+        self._desfazer.append((tipo, venda))
+        self._refazer.clear()
+
+    @property
+    def a_desfazer(self):
+        """(tipo, venda) que `desfazer` desfaria, ou None."""
+        return self._desfazer[-1] if self._desfazer else None
+
+    @property
+    def a_refazer(self):
+        return self._refazer[-1] if self._refazer else None
+
+    def _inverter(self, tipo, venda, desfazendo):
+        # Desfazer uma venda (ou refazer uma exclusão) tira a venda da sessão;
+        # o contrário a devolve com o mesmo id.
+        if (tipo == "venda") == desfazendo:
+            self.sessao.remover_venda(venda.id)
+            self.estoque.vender(venda.itens, -1)
+            self._gravar(venda, excluida=True)
+        else:
+            self.sessao.adicionar_venda(venda)
+            self.estoque.vender(venda.itens)
+            self._gravar(venda)
+
+    def desfazer(self):
+        """Desfaz a última venda finalizada ou exclusão. Devolve (tipo, venda) ou None."""
+        if not self._desfazer: return None
+        tipo, venda = self._desfazer.pop()
+        self._inverter(tipo, venda, desfazendo=True)
+        self._refazer.append((tipo, venda))
+        return tipo, venda
+
+    def refazer(self):
+        if not self._refazer: return None
+        tipo, venda = self._refazer.pop()
+        self._inverter(tipo, venda, desfazendo=False)
+        self._desfazer.append((tipo, venda))
+        return tipo, venda
+
+    # Sessão e armazenamento
+
+    def _sessao_vazia(self):
+        return CaixaSessao(self.colunar, self.largura_serie, self.retencao_serie)
+
+    def _gravar(self, venda, excluida=False):
+        # Cada destino é tentado mesmo que um anterior falhe: um disco cheio
+        # não pode impedir o envio ao agregador nem a impressão.
+        falhas = []
+        for destino in [self.armazenamento] + self.replicas:
+            try:
+                if excluida: destino.excluir_venda(venda.id)
+                else: destino.registrar_venda(venda)
+            except (OSError, sqlite3.Error) as e:
+                falhas.append((destino, e))
+        try:
+            if self.armazenamento.precisa_compactar: self.armazenamento.compactar(self.sessao.vendas)
+        except (OSError, sqlite3.Error) as e:
+            falhas.append((self.armazenamento, e))
+        if not falhas: return
+        erro = falhas[0][1] if len(falhas) == 1 else ErroGravacao(falhas)
+        if self.ao_falhar_gravacao is None: raise erro
+        self.ao_falhar_gravacao(erro)
+
+    def recuperar_sessao(self):
+        """Reconstrói a sessão a partir do armazenamento. Retorna o nº de vendas recuperadas."""
+        for venda in self.armazenamento.carregar_vendas():
+            self.sessao.adicionar_venda(venda)
+        # Um id de venda excluída não volta a ser usado, nem depois de reabrir.
+        self.sessao.reservar_ids(self.armazenamento.ultimo_id())
+        # O vendido sai dos totais por produto que a sessão já acumulou.
+        self.estoque.reconstruir(self.sessao.total_por_produto)
+        if self.armazenamento.precisa_compactar: self.armazenamento.compactar(self.sessao.vendas)
+        return self.sessao.numero_vendas
+
+    def nova_sessao(self):
+        # O estoque é gravado antes de o diário ser limpo: uma queda no meio
+        # conta as vendas duas vezes (estoque a menos), nunca a mais.
+        self.estoque.nova_sessao()
+        if len(self.estoque): self.salvar_estoque()
+        self.armazenamento.nova_sessao()
+        self.sessao = self._sessao_vazia()
+        self.carrinho.limpar()
+        self._desfazer.clear()
+        self._refazer.clear()
+
+    def carregar_sessao(self, vendas):
+        """Coloca na sessão vendas já registradas (ex.: de um vendas_*.json)."""
+        for venda in vendas:
+            self.sessao.adicionar_venda(venda)
+        self.estoque.reconstruir(self.sessao.total_por_produto)
+
+    def reproduzir(self, vendas):
+        """Refaz vendas gravadas pelo fluxo completo do caixa (carrinho → fechamento)."""
+        for v in vendas:
+            for nome, qtd, preco in v.itens:
+                self.adicionar_item(nome, qtd, preco)
+            self.finalizar_venda(v.pagamento, v.recebido, v.datahora)
+
+
+# Relatórios
+# Os três formatos (resumo na tela, TXT e PDF) são desenhados a partir do
+# mesmo ModeloRelatorio, montado uma vez por versão da sessão. Um formato novo
+# só precisa percorrer o modelo, sem recalcular nada.
+
+class ModeloRelatorio:
+    """Números da sessão prontos para exibição, congelados numa versão.
+
+    Com `detalhado=True` guarda também a tupla das vendas, para os relatórios
+    em arquivo (inclusive quando gerados em outra thread).
+    """
+
+    __slots__ = ("versao", "numero_vendas", "total_geral", "ticket_medio", "por_produto", "por_pagamento", "vendas")
+
+    def __init__(self, sessao, detalhado=False):
+        self.versao = sessao.versao
+        self.numero_vendas = sessao.numero_vendas
+        self.total_geral = sessao.total_geral
+        self.ticket_medio = sessao.ticket_medio
+        self.por_produto = tuple(sorted(sessao.total_por_produto.items()))
+        tpg = sessao.total_por_pagamento
+        extras = [forma for forma, total in tpg.items() if forma not in FORMAS_PAGAMENTO and total]
+        self.por_pagamento = tuple((forma, tpg.get(forma, 0)) for forma in FORMAS_PAGAMENTO + extras)
+        self.vendas = tuple(sessao.vendas) if detalhado else None
+
+
+def _linhas_resumo(modelo, vazio):
+    """(texto, é_título_de_seção) das linhas de resumo comuns a todos os formatos."""
+    yield f"Vendas: {modelo.numero_vendas}", False
+    yield f"Total arrecadado: {dinheiro(modelo.total_geral)}", False
+    yield f"Ticket médio: {dinheiro(modelo.ticket_medio)}", False
+    yield "Vendido por produto:", True
+    if not modelo.por_produto:
+        yield vazio, False
+    for nome, qtd in modelo.por_produto:
+        yield f"  - {nome}: {qtd} un.", False
+    yield "Por forma de pagamento:", True
+    for forma, total in modelo.por_pagamento:
+        yield f"  - {forma}: {dinheiro(total)}", False
+
+
+def _linhas_venda(v):
+    yield f"Venda #{v.id} - {v.datahora} - {v.pagamento} - Total {dinheiro(v.total)}", True
+    for nome, qtd, preco in v.itens:
+        yield f"   • {nome} x{qtd} @ {dinheiro(preco)} = {dinheiro(qtd*preco)}", False
+    if v.pagamento == "Dinheiro":
+        yield f"     Recebido: {dinheiro(v.recebido)} | Troco: {dinheiro(v.troco)}", False
+
+
+def texto_resumo(modelo):
+    linhas = []
+    for texto, secao in _linhas_resumo(modelo, "  (nenhuma venda ainda)"):
+        if secao: linhas.append("")
+        linhas.append(texto)
+    return "\n".join(linhas)
+
+
+def texto_painel(serie, agora=None, linhas=8):
+    """Painel de ritmo: o intervalo atual da `serie` (vendas/min, faturamento
+    por hora, mais vendidos) e os `linhas` intervalos mais recentes."""
+    if serie.ultimo is None: return "(nenhuma venda ainda)"
+    agora = instante(agora or datetime.now())
+    # Vendas de outro dia (fora da retenção): o painel mostra o fim delas, não o relógio.
+    ao_vivo = serie.ultimo <= agora < serie.ultimo + serie.retencao * serie.largura
+    ate = agora if ao_vivo else serie.ultimo
+    baldes = serie.baldes(ate, linhas)
+    inicio, vendas, total, _ = baldes[0]
+    decorrido = max(60, min(serie.largura, ate - inicio)) if ao_vivo else serie.largura
+    hora = lambda t: (_EPOCA + timedelta(seconds=t)).strftime("%H:%M")
+    nomes = lambda pares: ", ".join(f"{nome_produto(pid)} {qtd}" for pid, qtd in pares) or "-"
+    res = [f"Intervalo {hora(inicio)}–{hora(inicio + serie.largura)}: {vendas} vendas "
+           f"({vendas * 60 / decorrido:.1f}/min) | {dinheiro(total)} ({dinheiro(total * 3600 // decorrido)}/h)",
+           f"Mais vendidos: {nomes(serie.mais_vendidos(baldes[:1]))}",
+           f"Na última hora: {nomes(serie.mais_vendidos(baldes[:max(1, 3600 // serie.largura)]))}",
+           "",
+           f"{'Início':<7}{'Vendas':>7}{'Total':>14}  Mais vendidos"]
+    for balde in baldes:
+        inicio, vendas, total, _ = balde
+        res.append(f"{hora(inicio):<7}{vendas:>7}{dinheiro(total):>14}  {nomes(serie.mais_vendidos([balde], 2))}")
+    return "\n".join(res)
+
+
+def gerar_pdf(modelo, caminho_pdf: str, progresso=None):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+    from reportlab.pdfgen import canvas
+
+    c = canvas.Canvas(caminho_pdf, pagesize=A4)
+    _, altura = A4
+    x_margin = 2 * cm
+    y = altura - 2 * cm
+
+    def linha(txt, bold=False, jump=14):
+        nonlocal y
+        c.setFont("Helvetica-Bold" if bold else "Helvetica", 11)
+        c.drawString(x_margin, y, txt)
+        y -= jump
+
+    linha("Relatório de Vendas - Quermesse", bold=True, jump=18)
+    linha("Gerado em: " + datetime.now().strftime("%d/%m/%Y %H:%M"))
+    for texto, secao in _linhas_resumo(modelo, "  (nenhuma venda)"):
+        if secao:
+            y -= 8
+            linha(texto, bold=True, jump=16)
+        else:
+            linha(texto)
+    y -= 8
+
+    linha("Vendas detalhadas:", bold=True, jump=16)
+    if not modelo.vendas:
+        linha("  (nenhuma venda)")
+    else:
+        for i, v in enumerate(modelo.vendas, start=1):
+            if progresso is not None and i % 200 == 0: progresso(i)
+            if y < 4 * cm:
+                c.showPage()
+                y = altura - 2 * cm
+            for texto, titulo in _linhas_venda(v):
+                if y < 3 * cm:
+                    c.showPage()
+                    y = altura - 2 * cm
+                linha(texto, bold=titulo)
+            y -= 6
+    c.save()
+
+
+def gerar_txt(modelo, caminho_txt: str, progresso=None):
+    with open(caminho_txt, "w", encoding="utf-8") as f:
+        f.write("Relatório de Vendas - Quermesse\n")
+        f.write(f"Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}\n")
+        for texto, secao in _linhas_resumo(modelo, "  (nenhuma venda)"):
+            f.write(f"\n{texto}\n" if secao else f"{texto}\n")
+        f.write("\nVendas detalhadas:\n")
+        if not modelo.vendas:
+            f.write("  (nenhuma venda)\n")
+        else:
+            for i, v in enumerate(modelo.vendas, start=1):
+                if progresso is not None and i % 200 == 0: progresso(i)
+                for texto, _ in _linhas_venda(v):
+                    f.write(texto + "\n")
+                f.write("\n")
+
+
+class TarefaSegundoPlano(abc.ABC):
+    """Trabalho de arquivo (relatório, exportação) feito numa thread separada.
+
+    Thread e não processo: os nomes de produto das vendas vivem na tabela de
+    ids deste processo. A interface acompanha `feito`/`total` e `concluida`
+    por polling; `erro` guarda a exceção, se houver. Subclasses implementam
+    `_trabalho`.
+    """
+
+    def __init__(self, caminho, total):
+        self.caminho = caminho
+        self.total = total
+        self.feito = 0
+        self.erro = None
+        self.concluida = False
+        self.duracao = None
+        self._thread = threading.Thread(target=self._executar, name=type(self).__name__, daemon=True)
+
+    def iniciar(self):
+        self._thread.start()
+        return self
+
+    def _progresso(self, feito):
+        self.feito = feito
+
+    @abc.abstractmethod
+    def _trabalho(self):
+        """Gera o arquivo, chamando `_progresso` pelo caminho."""
+
+    def _executar(self):
+        inicio = time.perf_counter()
+        try:
+            self._trabalho()
+            self.feito = self.total
+        except Exception as e:
+            self.erro = e
+        finally:
+            self.duracao = time.perf_counter() - inicio
+            self.concluida = True
+
+
+class TarefaRelatorio(TarefaSegundoPlano):
+    """Relatório PDF/TXT a partir de um ModeloRelatorio detalhado (imutável) da sessão."""
+
+    def __init__(self, sessao, caminho, pdf=False):
+        self.modelo = sessao.modelo_relatorio(detalhado=True)
+        self.pdf = pdf
+        super().__init__(caminho, self.modelo.numero_vendas)
+
+    def _trabalho(self):
+        (gerar_pdf if self.pdf else gerar_txt)(self.modelo, self.caminho, self._progresso)
+
+
+class TarefaExportacao(TarefaSegundoPlano):
+    """Exportação das vendas da sessão (JSON/NDJSON) a partir de uma cópia da lista."""
+
+    def __init__(self, sessao, caminho):
+        self.vendas = tuple(sessao.vendas)
+        super().__init__(caminho, len(self.vendas))
+
+    def _trabalho(self):
+        salvar_vendas(self.vendas, self.caminho, progresso=self._progresso)
+
+
+# Linha de comando
+
+def _sessao_de_arquivo(caminho):
+    motor = MotorCaixa(produtos={})
+    motor.carregar_sessao(iterar_vendas(caminho))
+    return motor.sessao
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="caixa.py", description="Caixa de quermesse sem interface gráfica.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("resumo", help="mostra o resumo de um arquivo de vendas")
+    p.add_argument("vendas")
+    p = sub.add_parser("relatorio", help="gera relatório PDF/TXT de um arquivo de vendas")
+    p.add_argument("vendas")
+    p.add_argument("saida")
+    p = sub.add_parser("simular", help="refaz as vendas de um arquivo pelo fluxo do caixa e mede a vazão")
+    p.add_argument("vendas")
+    p.add_argument("--repeticoes", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if args.comando == "resumo":
+        print(texto_resumo(_sessao_de_arquivo(args.vendas).modelo_relatorio()))
+    elif args.comando == "relatorio":
+        modelo = _sessao_de_arquivo(args.vendas).modelo_relatorio(detalhado=True)
+        if REPORTLAB_OK and args.saida.lower().endswith(".pdf"): gerar_pdf(modelo, args.saida)
+        else: gerar_txt(modelo, args.saida)
+        print(f"Relatório salvo em: {args.saida}")
+    elif args.comando == "simular":
+        vendas = carregar_vendas(args.vendas)
+        motor = MotorCaixa(produtos={})
+        inicio = time.perf_counter()
+        for _ in range(args.repeticoes):
+            motor.reproduzir(vendas)
+        dt = time.perf_counter() - inicio
+        n = motor.sessao.numero_vendas
+        print(f"{n} vendas em {dt:.3f} s ({n / dt if dt else 0:.0f} vendas/s)")
+        print(texto_resumo(motor.sessao.modelo_relatorio()))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
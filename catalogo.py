@@ -0,0 +1,109 @@
+# catalogo.py
+# Índice do catálogo de produtos: ordem alfabética mantida por inserção
+# binária, busca por prefixo/trecho sem diferenciar acentos e maiúsculas, e
+# códigos curtos para digitar no caixa. O código é dado no cadastro (o maior
+# já usado + 1) e fica com o produto: não muda quando outro é removido e não é
+# reaproveitado. O armazenamento guarda os códigos junto com o catálogo.
+
+import bisect
+import unicodedata
+
+
+def normalizar(texto):
+    """'Pão de Queijo' -> 'pao de queijo' (sem acentos, sem maiúsculas)."""
+    decomposto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).casefold()
+
+
+class IndiceCatalogo:
+    """`codigos` ({nome: código}) e `ultimo_codigo` vêm do armazenamento; nomes
+    sem código (catálogo antigo) recebem os próximos, na ordem de `nomes`."""
+
+    def __init__(self, nomes=(), codigos=None, ultimo_codigo=0):
+        self._ordenados = []    # [(nome normalizado, nome)] em ordem alfabética
+        self._chave = {}        # nome -> (nome normalizado, nome)
+        self._por_codigo = {}   # código -> nome
+        self._codigos = {}      # nome -> código
+        codigos = codigos or {}
+        self.ultimo_codigo = max(ultimo_codigo, *codigos.values(), 0)   # maior código já usado
+        for nome in nomes:
+            self.adicionar(nome, codigos.get(nome))
+
+    def __len__(self):
+        return len(self._ordenados)
+
+    def __iter__(self):
+        """Nomes em ordem alfabética."""
+        return (nome for _, nome in self._ordenados)
+
+    def __contains__(self, nome):
+        return nome in self._chave
+
+    # Alterações (devolvem a posição do produto na ordem alfabética)
+
+    def adicionar(self, nome, codigo=None):
+        """Sem `codigo` (ou com um já em uso), o produto recebe um código novo."""
+        if nome in self._chave: return self.posicao(nome)
+        chave = self._chave[nome] = (normalizar(nome), nome)
+        pos = bisect.bisect_left(self._ordenados, chave)
+        self._ordenados.insert(pos, chave)
+        if codigo is None or codigo in self._por_codigo: codigo = self.ultimo_codigo + 1
+        self.ultimo_codigo = max(self.ultimo_codigo, codigo)
+        self._por_codigo[codigo] = nome
+        self._codigos[nome] = codigo
+        return pos
+
+    def remover(self, nome):
+        pos = self.posicao(nome)
+        del self._ordenados[pos]
+        del self._chave[nome]
+        del self._por_codigo[self._codigos.pop(nome)]
+        return pos
+
+    def renomear(self, nome, novo_nome):
+        """Troca o nome mantendo o código. Se `novo_nome` já existia, ele some."""
+        if novo_nome == nome: return self.posicao(nome)
+        if novo_nome in self._chave: self.remover(novo_nome)
+        codigo = self._codigos[nome]
+        del self._ordenados[self.posicao(nome)]
+        del self._chave[nome]
+        del self._codigos[nome]
+        chave = self._chave[novo_nome] = (normalizar(novo_nome), novo_nome)
+        pos = bisect.bisect_left(self._ordenados, chave)
+        self._ordenados.insert(pos, chave)
+        self._por_codigo[codigo] = novo_nome
+        self._codigos[novo_nome] = codigo
+        return pos
+
+    # Consultas
+
+    def posicao(self, nome):
+        return bisect.bisect_left(self._ordenados, self._chave[nome])
+
+    def codigo(self, nome):
+        return self._codigos.get(nome)
+
+    def por_codigo(self, codigo):
+        return self._por_codigo.get(codigo)
+
+    @property
+    def codigos(self):
+        """{nome: código} de todos os produtos (o que o armazenamento grava)."""
+        return self._codigos
+
+    def buscar(self, texto):
+        """Nomes que combinam com `texto`: o produto de código igual (se for um
+        número), depois os que começam com o texto e por fim os que o contêm."""
+        t = normalizar(texto.strip())
+        if not t: return list(self)
+        res = []
+        if t.isdigit():
+            nome = self.por_codigo(int(t))
+            if nome is not None: res.append(nome)
+        i = bisect.bisect_left(self._ordenados, (t,))
+        while i < len(self._ordenados) and self._ordenados[i][0].startswith(t):
+            if self._ordenados[i][1] not in res: res.append(self._ordenados[i][1])
+            i += 1
+        vistos = set(res)
+        res += [nome for chave, nome in self._ordenados if t in chave and nome not in vistos]
+        return res
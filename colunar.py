@@ -0,0 +1,162 @@
+# colunar.py
+# Armazenamento colunar opcional das vendas da sessão. Em vez de percorrer
+# objetos Venda um a um, os relatórios trabalham sobre colunas paralelas
+# (array / NumPy): uma linha por venda e uma tabela achatada de itens.
+# Com NumPy instalado as agregações viram reduções vetorizadas; sem ele,
+# o mesmo código roda em Python puro sobre os arrays.
+
+from array import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _vetor(coluna, dtype):
+    # np.frombuffer não aceita buffer vazio em versões antigas do NumPy.
+    return np.frombuffer(coluna, dtype=dtype) if len(coluna) else np.zeros(0, dtype=dtype)
+
+
+class ColunasVendas:
+    """Colunas de vendas (instante, pagamento, total, recebido, ativa) e de
+    itens (venda, produto, qtd, preço). Vendas excluídas só são marcadas como
+    inativas, então as linhas nunca mudam de posição."""
+
+    def __init__(self):
+        self.instante = array("q")
+        self.pagamento = array("b")
+        self.total = array("q")
+        self.recebido = array("q")
+        self.ativa = array("b")
+        self.item_venda = array("q")
+        self.item_produto = array("q")
+        self.item_qtd = array("q")
+        self.item_preco = array("q")
+        self.formas = []
+        self._codigos = {}
+        self._linha = {}
+
+    def __len__(self):
+        return len(self._linha)
+
+    @property
+    def vetorizado(self):
+        return np is not None
+
+    def _codigo(self, forma):
+        codigo = self._codigos.get(forma)
+        if codigo is None:
+            codigo = self._codigos[forma] = len(self.formas)
+            self.formas.append(forma)
+        return codigo
+
+    def adicionar(self, venda):
+        linha = len(self.total)
+        self._linha[venda.id] = linha
+        self.instante.append(venda.instante)
+        self.pagamento.append(self._codigo(venda.pagamento))
+        self.total.append(venda.total)
+        self.recebido.append(venda.recebido)
+        self.ativa.append(1)
+        for pid, qtd, preco in venda.itens_por_id():
+            self.item_venda.append(linha)
+            self.item_produto.append(pid)
+            self.item_qtd.append(qtd)
+            self.item_preco.append(preco)
+
+    def remover(self, venda_id):
+        self.ativa[self._linha.pop(venda_id)] = 0
+
+    # Seleção
+
+    def _selecao(self, inicio, fim):
+        """Linhas ativas com inicio <= instante < fim (limites opcionais, em segundos)."""
+        if np is not None:
+            instante = _vetor(self.instante, np.int64)
+            sel = _vetor(self.ativa, np.int8) == 1
+            if inicio is not None: sel &= instante >= inicio
+            if fim is not None: sel &= instante < fim
+            return sel
+        return array("b", (a and (inicio is None or t >= inicio) and (fim is None or t < fim)
+                           for a, t in zip(self.ativa, self.instante)))
+
+    # Agregações
+
+    def por_produto(self, inicio=None, fim=None):
+        """{id_produto: quantidade vendida}."""
+        if not len(self.total): return {}
+        sel = self._selecao(inicio, fim)
+        if np is not None:
+            venda = _vetor(self.item_venda, np.int64)
+            m = sel[venda]
+            pid = _vetor(self.item_produto, np.int64)[m]
+            qtd = _vetor(self.item_qtd, np.int64)[m]
+            soma = np.bincount(pid, weights=qtd)
+            return {int(p): int(soma[p]) for p in np.flatnonzero(soma)}
+        tot = {}
+        for v, p, q in zip(self.item_venda, self.item_produto, self.item_qtd):
+            if sel[v]: tot[p] = tot.get(p, 0) + q
+        return {p: q for p, q in tot.items() if q}
+
+    def por_pagamento(self, inicio=None, fim=None):
+        """{forma de pagamento: total em centavos}."""
+        tot = dict.fromkeys(self.formas, 0)
+        if not len(self.total): return tot
+        sel = self._selecao(inicio, fim)
+        if np is not None:
+            cod = _vetor(self.pagamento, np.int8)[sel]
+            valor = _vetor(self.total, np.int64)[sel]
+            soma = np.bincount(cod, weights=valor, minlength=len(self.formas))
+            return {forma: int(soma[i]) for i, forma in enumerate(self.formas)}
+        for s, c, v in zip(sel, self.pagamento, self.total):
+            if s: tot[self.formas[c]] += v
+        return tot
+
+    def total_geral(self, inicio=None, fim=None):
+        if not len(self.total): return 0
+        sel = self._selecao(inicio, fim)
+        if np is not None:
+            return int(_vetor(self.total, np.int64)[sel].sum())
+        return sum(v for s, v in zip(sel, self.total) if s)
+
+    def por_intervalo(self, largura, inicio=None, fim=None):
+        """{início do intervalo (s): (nº de vendas, total em centavos)} em janelas de `largura` segundos."""
+        if not len(self.total): return {}
+        sel = self._selecao(inicio, fim)
+        if np is not None:
+            balde = _vetor(self.instante, np.int64)[sel] // largura
+            valor = _vetor(self.total, np.int64)[sel]
+            chaves, inverso = np.unique(balde, return_inverse=True)
+            n = np.bincount(inverso, minlength=len(chaves))
+            soma = np.bincount(inverso, weights=valor, minlength=len(chaves))
+            return {int(k) * largura: (int(n[i]), int(soma[i])) for i, k in enumerate(chaves)}
+        res = {}
+        for s, t, v in zip(sel, self.instante, self.total):
+            if not s: continue
+            k = t // largura * largura
+            n, soma = res.get(k, (0, 0))
+            res[k] = (n + 1, soma + v)
+        return dict(sorted(res.items()))
+
+    def por_produto_intervalo(self, largura, inicio=None, fim=None):
+        """{(início do intervalo, id_produto): quantidade} em janelas de `largura` segundos."""
+        if not len(self.total): return {}
+        sel = self._selecao(inicio, fim)
+        if np is not None:
+            venda = _vetor(self.item_venda, np.int64)
+            m = sel[venda]
+            balde = _vetor(self.instante, np.int64)[venda[m]] // largura
+            pid = _vetor(self.item_produto, np.int64)[m]
+            qtd = _vetor(self.item_qtd, np.int64)[m]
+            n_prod = int(pid.max()) + 1 if len(pid) else 1
+            chave = balde * n_prod + pid
+            chaves, inverso = np.unique(chave, return_inverse=True)
+            soma = np.bincount(inverso, weights=qtd, minlength=len(chaves))
+            return {(int(k // n_prod) * largura, int(k % n_prod)): int(soma[i]) for i, k in enumerate(chaves)}
+        res = {}
+        for v, p, q in zip(self.item_venda, self.item_produto, self.item_qtd):
+            if not sel[v]: continue
+            k = (self.instante[v] // largura * largura, p)
+            res[k] = res.get(k, 0) + q
+        return dict(sorted(res.items()))
@@ -0,0 +1,179 @@
+# diario.py
+# Diário de vendas (write-ahead log) da sessão: cada venda finalizada ou
+# excluída vira uma linha JSON compacta, gravada antes de qualquer outra coisa.
+# Se o programa cair, a sessão é reconstruída ao abrir de novo a partir do
+# último snapshot + as linhas gravadas depois dele.
+# A compactação não para o caixa: o diário atual vira um segmento (".seg") e
+# um diário novo é aberto na hora; o snapshot é gravado numa thread a partir
+# de uma cópia da lista de vendas, e só então o segmento é apagado. Até lá a
+# recuperação lê snapshot + segmento + diário.
+
+import json
+import os
+import shutil
+import threading
+import time
+
+ARQ_DIARIO = "sessao_diario.ndjson"
+
+
+class DiarioVendas:
+    def __init__(self, caminho=ARQ_DIARIO, lote=20, intervalo=1.0, snapshot_a_cada=500):
+        self.caminho = caminho
+        self.caminho_snapshot = caminho + ".snap"
+        self.caminho_segmento = caminho + ".seg"
+        self.lote = lote
+        self.intervalo = intervalo
+        self.snapshot_a_cada = snapshot_a_cada
+        self._pendentes = 0
+        self._ultimo_sync = time.monotonic()
+        self.registros_desde_snapshot = 0
+        # Maior id de venda já usado, contando as excluídas: vai no snapshot,
+        # para que um id nunca seja reaproveitado depois de reabrir a sessão.
+        self.maior_id = 0
+        self._arq = None
+        self._compactacao = None    # thread gravando o snapshot
+        self.erro_compactacao = None
+
+    # Gravação
+
+    def _abrir(self):
+        if self._arq is None:
+            self._arq = open(self.caminho, "ab")
+        return self._arq
+
+    def _gravar(self, registro):
+        linha = json.dumps(registro, ensure_ascii=False, separators=(",", ":")) + "\n"
+        self._abrir().write(linha.encode("utf-8"))
+        self._pendentes += 1
+        self.registros_desde_snapshot += 1
+        if self._pendentes >= self.lote or time.monotonic() - self._ultimo_sync >= self.intervalo:
+            self.sincronizar()
+
+    def registrar_venda(self, venda):
+        self.maior_id = max(self.maior_id, venda["id"])
+        self._gravar({"op": "+", "venda": venda})
+
+    def registrar_exclusao(self, venda_id):
+        self.maior_id = max(self.maior_id, venda_id)
+        self._gravar({"op": "-", "id": venda_id})
+
+    def sincronizar(self):
+        """Descarrega as linhas pendentes e faz fsync (chamado em lote ou pelo timer da UI)."""
+        if self._arq is not None and self._pendentes:
+            self._arq.flush()
+            os.fsync(self._arq.fileno())
+        self._pendentes = 0
+        self._ultimo_sync = time.monotonic()
+
+    @property
+    def compactando(self):
+        return self._compactacao is not None and self._compactacao.is_alive()
+
+    @property
+    def precisa_compactar(self):
+        return self.registros_desde_snapshot >= self.snapshot_a_cada and not self.compactando
+
+    def _girar(self):
+        # O diário atual vira o segmento; se sobrou um segmento de uma
+        # compactação que falhou, as linhas novas vão para o fim dele.
+        self.fechar()
+        if not os.path.exists(self.caminho): return
+        if os.path.exists(self.caminho_segmento):
+            with open(self.caminho, "rb") as origem, open(self.caminho_segmento, "ab") as destino:
+                shutil.copyfileobj(origem, destino)
+                destino.flush()
+                os.fsync(destino.fileno())
+            os.remove(self.caminho)
+        else:
+            os.replace(self.caminho, self.caminho_segmento)
+
+    def compactar(self, vendas, converter=None, esperar=False):
+        """Grava um snapshot atômico com `vendas` (a lista já copiada, no estado
+        atual da sessão) e descarta o diário coberto por ele. O snapshot é
+        gravado numa thread; `converter` transforma cada venda no dict gravado."""
+        self.esperar_compactacao()
+        self._girar()
+        self.registros_desde_snapshot = 0
+        self._compactacao = threading.Thread(target=self._gravar_snapshot, args=(vendas, converter, self.maior_id),
+                                             daemon=True)
+        self._compactacao.start()
+        if esperar: self.esperar_compactacao()
+
+    def _gravar_snapshot(self, vendas, converter, maior_id):
+        try:
+            dados = [converter(v) for v in vendas] if converter is not None else list(vendas)
+            tmp = self.caminho_snapshot + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"versao": 1, "maior_id": maior_id, "vendas": dados}, f, ensure_ascii=False, separators=(",", ":"))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.caminho_snapshot)
+            os.remove(self.caminho_segmento)
+            self.erro_compactacao = None
+        except OSError as e:
+            # O segmento fica: a recuperação continua completa e a próxima compactação tenta de novo.
+            self.erro_compactacao = e
+
+    def esperar_compactacao(self):
+        if self._compactacao is not None: self._compactacao.join()
+        self._compactacao = None
+
+    def limpar(self):
+        """Descarta diário e snapshot (início de uma nova sessão)."""
+        self.esperar_compactacao()
+        self.fechar()
+        for caminho in (self.caminho, self.caminho_segmento, self.caminho_snapshot):
+            if os.path.exists(caminho):
+                os.remove(caminho)
+        self.registros_desde_snapshot = 0
+        self.maior_id = 0
+
+    def fechar(self):
+        self.esperar_compactacao()
+        if self._arq is not None:
+            self.sincronizar()
+            self._arq.close()
+            self._arq = None
+
+    # Recuperação
+
+    def recuperar(self):
+        """Devolve as vendas da sessão (snapshot + diário), na ordem em que foram feitas.
+
+        A reaplicação é idempotente por id, então um snapshot gravado sem que o
+        diário tenha sido zerado não duplica vendas. Uma última linha truncada
+        (queda no meio da escrita) é ignorada. Depois, `maior_id` é o maior id
+        que a sessão já usou, inclusive em vendas excluídas.
+        """
+        vendas = {}
+        maior = 0
+        if os.path.exists(self.caminho_snapshot):
+            try:
+                with open(self.caminho_snapshot, "r", encoding="utf-8") as f:
+                    snapshot = json.load(f)
+                maior = snapshot.get("maior_id", 0)
+                for v in snapshot.get("vendas", []):
+                    vendas[v["id"]] = v
+                    maior = max(maior, v["id"])
+            except Exception:
+                pass
+        n = 0
+        for caminho in (self.caminho_segmento, self.caminho):
+            if not os.path.exists(caminho): continue
+            with open(caminho, "rb") as f:
+                for linha in f:
+                    try:
+                        reg = json.loads(linha)
+                    except ValueError:
+                        continue
+                    n += 1
+                    if reg.get("op") == "+":
+                        vendas.setdefault(reg["venda"]["id"], reg["venda"])
+                        maior = max(maior, reg["venda"]["id"])
+                    elif reg.get("op") == "-":
+                        vendas.pop(reg["id"], None)
+                        maior = max(maior, reg["id"])
+        self.registros_desde_snapshot = n
+        self.maior_id = maior
+        return list(vendas.values())
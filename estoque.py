@@ -0,0 +1,154 @@
+# estoque.py
+# Estoque por produto, com contadores separados: saldo no início da sessão
+# (mais os ajustes feitos nela), quanto saiu em vendas da sessão e quanto está
+# reservado na venda em andamento. Cada operação mexe só nos contadores do
+# produto, sem varrer vendas. Produtos sem saldo cadastrado não têm controle.
+# O que se grava (estoque.json ou a tabela estoque do banco) é o saldo do
+# início da sessão: as vendas dela já estão no diário/banco, e ao recuperar a
+# sessão o "vendido" é refeito a partir dos totais por produto da CaixaSessao.
+
+
+class Estoque:
+    def __init__(self, niveis=None):
+        self._inicial = {}      # nome -> saldo no início da sessão (com ajustes)
+        self._minimo = {}       # nome -> avisa quando o disponível chega a este nível
+        self._vendido = {}      # nome -> qtd vendida na sessão
+        self._reservado = {}    # nome -> qtd na venda em andamento
+        self._alterados = {}    # nomes com disponível mudado (dict como conjunto ordenado)
+        self.ao_baixar = None   # ao_baixar(nome, disponível) quando cruza o mínimo ou esgota
+        for nome, (saldo, minimo) in (niveis or {}).items():
+            self._inicial[nome] = saldo
+            self._minimo[nome] = minimo
+
+    def __len__(self):
+        return len(self._inicial)
+
+    def __contains__(self, nome):
+        return nome in self._inicial
+
+    # Consultas
+
+    def saldo(self, nome):
+        """Quantidade na prateleira (inclui o que está reservado); None sem controle."""
+        if nome not in self._inicial: return None
+        return self._inicial[nome] - self._vendido.get(nome, 0)
+
+    def disponivel(self, nome):
+        """Quanto ainda pode entrar numa venda; None sem controle."""
+        if nome not in self._inicial: return None
+        return self._inicial[nome] - self._vendido.get(nome, 0) - self._reservado.get(nome, 0)
+
+    def minimo(self, nome):
+        return self._minimo.get(nome)
+
+    def baixo(self, nome):
+        disp = self.disponivel(nome)
+        return disp is not None and disp <= self._minimo[nome]
+
+    def baixos(self):
+        """[(nome, disponível)] dos produtos no mínimo ou abaixo, do mais crítico ao menos."""
+        res = [(nome, self.disponivel(nome)) for nome in self._inicial if self.baixo(nome)]
+        return sorted(res, key=lambda nd: nd[1])
+
+    def niveis(self):
+        """{nome: (saldo no início da sessão, mínimo)}: o que o armazenamento grava."""
+        return {nome: (saldo, self._minimo[nome]) for nome, saldo in self._inicial.items()}
+
+    def alteracoes(self):
+        """Nomes com disponível alterado desde a última chamada."""
+        res = list(self._alterados)
+        self._alterados.clear()
+        return res
+
+    # Movimentos
+
+    def _somar(self, contador, nome, qtd):
+        if nome not in self._inicial:
+            # Sem controle: só o vendido é acompanhado, para um saldo cadastrado depois.
+            if contador is self._vendido: contador[nome] = contador.get(nome, 0) + qtd
+            return
+        antes = self.disponivel(nome)
+        novo = contador.get(nome, 0) + qtd
+        if novo: contador[nome] = novo
+        else: contador.pop(nome, None)
+        depois = self.disponivel(nome)
+        self._alterados[nome] = None
+        minimo = self._minimo[nome]
+        if self.ao_baixar is not None and (antes > minimo >= depois or antes > 0 >= depois):
+            self.ao_baixar(nome, depois)
+
+    def reservar(self, nome, qtd):
+        self._somar(self._reservado, nome, qtd)
+
+    def liberar(self, nome, qtd):
+        self._somar(self._reservado, nome, -qtd)
+
+    def liberar_tudo(self):
+        for nome in self._reservado:
+            if nome in self._inicial: self._alterados[nome] = None
+        self._reservado.clear()
+
+    def confirmar(self, itens):
+        """A venda em andamento foi finalizada: o reservado de `itens` (nome, qtd, ...) vira vendido."""
+        for nome, qtd, *_ in itens:
+            if nome in self._inicial:
+                # O disponível não muda: só troca de contador. Nunca abaixo de
+                # zero: um reservado negativo aumentaria o disponível de graça.
+                antes = self._reservado.get(nome, 0)
+                reservado = max(0, antes - qtd)
+                if reservado: self._reservado[nome] = reservado
+                else: self._reservado.pop(nome, None)
+                if antes < qtd: self._alterados[nome] = None
+            self._vendido[nome] = self._vendido.get(nome, 0) + qtd
+
+    def vender(self, itens, sinal=1):
+        """Conta (sinal=1) ou devolve (sinal=-1) as quantidades de uma venda já registrada."""
+        for nome, qtd, *_ in itens:
+            self._somar(self._vendido, nome, sinal * qtd)
+
+    def reconstruir(self, vendidos):
+        """Refaz o vendido a partir de {nome: qtd vendida na sessão}."""
+        self._vendido = {nome: qtd for nome, qtd in vendidos.items() if qtd}
+        self._alterados.update(dict.fromkeys(self._inicial))
+
+    # Cadastro
+
+    def ajustar(self, nome, saldo, minimo=0, reservado=None):
+        """Define o saldo atual (na prateleira) e o mínimo de `nome`; saldo None tira o controle.
+        `reservado` é quanto de `nome` já está na venda em andamento: um produto
+        que passa a ter controle com itens no carrinho já começa com eles reservados."""
+        self._alterados[nome] = None
+        if saldo is None:
+            # Sem controle não há reserva: uma que ficasse aqui voltaria junto com o controle.
+            self._inicial.pop(nome, None)
+            self._minimo.pop(nome, None)
+            self._reservado.pop(nome, None)
+            return
+        self._inicial[nome] = saldo + self._vendido.get(nome, 0)
+        self._minimo[nome] = minimo
+        if reservado is not None:
+            if reservado > 0: self._reservado[nome] = reservado
+            else: self._reservado.pop(nome, None)
+
+    def renomear(self, nome, novo_nome):
+        """Passa o saldo, o mínimo e o reservado na venda em andamento para `novo_nome`
+        (o carrinho também troca o nome das linhas)."""
+        if nome not in self._inicial: return False
+        saldo, minimo = self.saldo(nome), self._minimo[nome]
+        reservado = self._reservado.pop(nome, 0)
+        self.ajustar(nome, None)
+        self.ajustar(novo_nome, saldo, minimo)
+        if reservado: self._reservado[novo_nome] = self._reservado.get(novo_nome, 0) + reservado
+        return True
+
+    def remover(self, nome):
+        if nome not in self._inicial: return False
+        self.ajustar(nome, None)
+        return True
+
+    def nova_sessao(self):
+        """Fecha a sessão: o saldo atual passa a ser o do início da próxima."""
+        for nome in self._inicial:
+            self._inicial[nome] -= self._vendido.get(nome, 0)
+        self._vendido.clear()
+        self.liberar_tudo()
@@ -0,0 +1,127 @@
+# importacao.py
+# Importa e mescla vários vendas_*.json / .ndjson de sessões passadas numa
+# única CaixaSessao, para comparar festas de anos diferentes. A leitura e a
+# normalização dos arquivos rodam num pool de processos (um arquivo por
+# tarefa); a mescla e a detecção de vendas repetidas ficam no processo principal.
+#   python importacao.py vendas_*.json
+#   python importacao.py "arquivo/2023/vendas_*.json" --saida mesclado.ndjson --relatorio mesclado.txt
+
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from caixa import (REPORTLAB_OK, CaixaSessao, Venda, centavos, gerar_pdf, gerar_txt, iterar_dicts, salvar_vendas,
+                   texto_resumo)
+
+
+def ler_arquivo(caminho):
+    """Lê um arquivo de vendas e devolve (caminho, vendas, erro). Cada venda vem
+    como tupla normalizada (itens, pagamento, total, recebido, troco, datahora,
+    id, terminal), em centavos, que serve de chave de duplicidade; os seis
+    primeiros campos são os argumentos para Venda(...). id e terminal ficam None
+    quando o arquivo não os traz. Roda dentro do pool, então só devolve tipos simples."""
+    vendas = []
+    try:
+        for d in iterar_dicts(caminho):
+            itens = tuple((str(nome), int(qtd), centavos(preco)) for nome, qtd, preco in d["itens"])
+            vendas.append((itens, d["pagamento"], centavos(d["total"]), centavos(d.get("recebido", 0)),
+                           centavos(d.get("troco", 0)), d.get("datahora"), d.get("id"), d.get("terminal")))
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        return caminho, vendas, f"{type(e).__name__}: {e}"
+    return caminho, vendas, None
+
+
+class Mescla:
+    """Resultado de `mesclar_arquivos`: a sessão mesclada e as contagens da importação."""
+
+    def __init__(self):
+        self.sessao = CaixaSessao()
+        self.arquivos = 0
+        self.lidas = 0
+        self.duplicadas = 0
+        self.erros = {}
+
+    def resumo(self):
+        return (f"{self.arquivos} arquivo(s), {self.lidas} vendas lidas, {self.duplicadas} duplicada(s) ignorada(s), "
+                f"{self.sessao.numero_vendas} na sessão mesclada" + (f", {len(self.erros)} com erro" if self.erros else ""))
+
+
+def mesclar_arquivos(caminhos, processos=None):
+    """Lê `caminhos` em paralelo e mescla as vendas numa CaixaSessao, em ordem de data/hora.
+
+    Uma venda é duplicada quando outra com o mesmo id, terminal e conteúdo
+    (itens, pagamento, valores e data/hora) já veio de outro arquivo, caso comum
+    quando a mesma sessão foi salva mais de uma vez; duas vendas iguais com ids
+    diferentes são vendas distintas. Arquivos antigos, sem id, comparam só o
+    conteúdo. Vendas idênticas dentro de um mesmo arquivo são mantidas: cada
+    chave entra tantas vezes quanto no arquivo que mais a repete.
+    """
+    caminhos = list(caminhos)
+    n = processos or os.cpu_count() or 1
+    if n == 1 or len(caminhos) < 2:
+        return _mesclar(map(ler_arquivo, caminhos))
+    with ProcessPoolExecutor(max_workers=n) as pool:
+        return _mesclar(pool.map(ler_arquivo, caminhos, chunksize=max(1, len(caminhos) // (4 * n))))
+
+
+def _mesclar(resultados):
+    res = Mescla()
+    mescladas = {}   # (conteúdo, id, terminal) -> quantas vezes já entrou
+    unicas = []
+    for caminho, vendas, erro in resultados:
+        res.arquivos += 1
+        res.lidas += len(vendas)
+        if erro is not None: res.erros[caminho] = erro
+        neste = {}
+        for v in vendas:
+            n = neste[v] = neste.get(v, 0) + 1
+            if n > mescladas.get(v, 0):
+                mescladas[v] = n
+                unicas.append(v)
+            else:
+                res.duplicadas += 1
+    unicas.sort(key=lambda v: v[5] or "")
+    for v in unicas:
+        res.sessao.adicionar_venda(Venda(*v[:6]))
+    return res
+
+
+def expandir(padroes):
+    """Expande curingas (o shell do Windows não faz isso) e remove repetidos."""
+    caminhos = []
+    for padrao in padroes:
+        caminhos += sorted(glob.glob(padrao)) or [padrao]
+    return list(dict.fromkeys(os.path.normpath(c) for c in caminhos))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="importacao.py", description="Mescla arquivos de vendas de sessões passadas.")
+    parser.add_argument("vendas", nargs="+", help="arquivos ou padrões (ex.: vendas_*.json)")
+    parser.add_argument("--processos", type=int, help="nº de processos (padrão: nº de núcleos; 1 = sem pool)")
+    parser.add_argument("--saida", help="grava as vendas mescladas (.json ou .ndjson)")
+    parser.add_argument("--relatorio", help="gera relatório detalhado da mescla (.pdf ou .txt)")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    res = mesclar_arquivos(expandir(args.vendas), args.processos)
+    dt = time.perf_counter() - inicio
+    for caminho, erro in res.erros.items():
+        print(f"Erro em {caminho}: {erro}", file=sys.stderr)
+    print(f"{res.resumo()} ({dt:.2f} s)\n")
+    print(texto_resumo(res.sessao.modelo_relatorio()))
+    if args.saida:
+        salvar_vendas(res.sessao.vendas, args.saida)
+        print(f"Vendas mescladas salvas em: {args.saida}")
+    if args.relatorio:
+        modelo = res.sessao.modelo_relatorio(detalhado=True)
+        if REPORTLAB_OK and args.relatorio.lower().endswith(".pdf"): gerar_pdf(modelo, args.relatorio)
+        else: gerar_txt(modelo, args.relatorio)
+        print(f"Relatório salvo em: {args.relatorio}")
+    return 1 if res.erros else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,380 @@
+# impressao.py
+# Fila de impressão em segundo plano: cada venda registrada vira uma comanda
+# para a cozinha (e, se pedido, um cupom para o cliente); uma venda excluída
+# vira um aviso de cancelamento. `registrar_venda` só põe a venda na fila, então
+# o fechamento não espera a impressora. Uma thread monta os textos, junta
+# vários num lote e manda para o destino, tentando de novo com espera
+# crescente enquanto ele falha. Nada se perde com a fila cheia ou ao fechar o
+# programa: o excesso e o que sobrou esperam em impressao_pendente.ndjson.
+# Destinos: uma pasta (um .txt por comanda, para um programa que imprime o que
+# chega nela) ou uma impressora térmica na rede (TCP, porta 9100).
+#   python main.py --impressora tcp://192.168.0.50:9100 --cupom
+#   python main.py --impressora comandas
+#   python impressao.py impressora --porta 9100 --atraso 0.5    (impressora de mentira, para testes)
+
+import argparse
+import itertools
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from caixa import dinheiro
+
+COLUNAS = 40
+PORTA = 9100
+ARQ_PENDENTES = "impressao_pendente.ndjson"
+
+
+# -----------------------
+# Textos
+# -----------------------
+def _linha(esquerda, direita, colunas=COLUNAS):
+    return esquerda[:colunas - len(direita) - 1].ljust(colunas - len(direita)) + direita
+
+
+def texto_comanda(venda, colunas=COLUNAS):
+    """Comanda da cozinha: nº do pedido, hora e quantidades, sem preços."""
+    quantidades = {}
+    for nome, qtd, _ in venda.itens:
+        quantidades[nome] = quantidades.get(nome, 0) + qtd
+    linhas = ["=" * colunas, f"PEDIDO #{venda.id}".center(colunas), venda.datahora[11:16].center(colunas), "-" * colunas]
+    linhas += [f"{qtd:>3} x {nome}"[:colunas] for nome, qtd in quantidades.items()]
+    linhas.append("=" * colunas)
+    return "\n".join(linhas) + "\n"
+
+
+def texto_cupom(venda, colunas=COLUNAS):
+    """Cupom do cliente (não fiscal): itens com preço, total, pagamento e troco."""
+    linhas = ["Caixa de Quermesse".center(colunas),
+              _linha(f"Venda #{venda.id}", venda.datahora.replace("T", " ")[:16], colunas), "-" * colunas]
+    for nome, qtd, preco in venda.itens:
+        linhas.append(_linha(f"{qtd} x {nome}", dinheiro(qtd * preco), colunas))
+    linhas += ["-" * colunas, _linha("TOTAL", dinheiro(venda.total), colunas),
+               _linha(venda.pagamento, dinheiro(venda.recebido or venda.total), colunas)]
+    if venda.troco: linhas.append(_linha("Troco", dinheiro(venda.troco), colunas))
+    linhas.append("Obrigado e volte sempre!".center(colunas))
+    return "\n".join(linhas) + "\n"
+
+
+def texto_cancelamento(venda_id, colunas=COLUNAS):
+    return "\n".join(["*" * colunas, "CANCELADO".center(colunas), f"PEDIDO #{venda_id}".center(colunas), "*" * colunas]) + "\n"
+
+
+_TEXTOS = {"comanda": texto_comanda, "cupom": texto_cupom, "cancelamento": texto_cancelamento}
+
+
+# -----------------------
+# Destinos
+# -----------------------
+# Um destino recebe um lote [(nome, texto)] em `enviar` e levanta OSError se
+# não conseguir; o lote inteiro é tentado de novo depois.
+
+class DestinoPasta:
+    """Um arquivo por impresso em `pasta`. Cada arquivo é gravado num
+    temporário e renomeado: quem vigia a pasta nunca pega um pela metade, e
+    reenviar um lote só regrava os mesmos arquivos."""
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+        os.makedirs(pasta, exist_ok=True)
+
+    def __str__(self):
+        return self.pasta
+
+    def enviar(self, impressos):
+        for nome, texto in impressos:
+            caminho = os.path.join(self.pasta, nome + ".txt")
+            with open(caminho + ".tmp", "w", encoding="utf-8") as f:
+                f.write(texto)
+            os.replace(caminho + ".tmp", caminho)
+
+
+class DestinoTCP:
+    """Impressora térmica na rede (porta 9100, texto puro): uma conexão por
+    lote, com o comando de corte do papel (ESC/POS) depois de cada impresso."""
+
+    CORTE = b"\n\n\n\x1dV\x01"
+
+    def __init__(self, host, porta=PORTA, codificacao="cp850", timeout=5.0):
+        self.host = host
+        self.porta = porta
+        self.codificacao = codificacao
+        self.timeout = timeout
+
+    def __str__(self):
+        return f"tcp://{self.host}:{self.porta}"
+
+    def enviar(self, impressos):
+        dados = b"".join(texto.encode(self.codificacao, "replace") + self.CORTE for _, texto in impressos)
+        with socket.create_connection((self.host, self.porta), timeout=self.timeout) as s:
+            s.sendall(dados)
+
+
+def destino(texto):
+    """'tcp://host[:porta]' -> DestinoTCP; qualquer outra coisa é uma pasta."""
+    if texto.startswith("tcp://"):
+        host, _, porta = texto[len("tcp://"):].rstrip("/").partition(":")
+        return DestinoTCP(host, int(porta or PORTA))
+    return DestinoPasta(texto)
+
+
+# -----------------------
+# Fila
+# -----------------------
+class FilaImpressao:
+    """Fila de impressão com a interface das réplicas do MotorCaixa
+    (`registrar_venda`/`excluir_venda`), que nunca bloqueia nem levanta exceção.
+
+    A fila em memória é limitada (`limite`): cheia, o que chega vai já montado
+    para o arquivo `arq_pendentes` (e o que vier depois também, para manter a
+    ordem) e volta de lá quando a fila esvazia. `fechar` guarda no mesmo
+    arquivo o que não deu tempo de imprimir, e a próxima FilaImpressao começa
+    por ele. Só se perde um impresso se nem o arquivo puder ser gravado; ele é
+    contado em `descartados`.
+    """
+
+    def __init__(self, destino, cupom=False, limite=200, lote=10, intervalo=0.5, espera_max=30.0,
+                 arq_pendentes=ARQ_PENDENTES):
+        self.destino = destino
+        self.cupom = cupom
+        self.limite = limite
+        self.lote = lote
+        self.intervalo = intervalo
+        self.espera_max = espera_max
+        self.arq_pendentes = arq_pendentes
+        self.impressos = 0
+        self.falhas = 0         # envios que falharam (cada nova tentativa conta)
+        self.descartados = 0    # perdidos: não couberam na fila nem no arquivo
+        self.erro = None        # última falha; None depois de um envio bem-sucedido
+        self.no_disco = self._contar_pendentes()    # esperando no arquivo (inclusive da última vez)
+        self._arq = None        # arquivo de pendentes aberto para acrescentar, enquanto a fila transborda
+        self._fila = deque()    # [tipo, venda ou id, (nome, texto) já montado ou None]
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = False
+        self._thread = threading.Thread(target=self._executar, daemon=True)
+        self._thread.start()
+
+    @property
+    def pendentes(self):
+        return len(self._fila) + self.no_disco
+
+    def _enfileirar(self, tipo, dado):
+        with self._lock:
+            if not self.no_disco and len(self._fila) < self.limite:
+                self._fila.append([tipo, dado, None])
+            else:
+                try: self._gravar_pendentes([self._montar([tipo, dado, None])])
+                except OSError as e:
+                    self.descartados += 1
+                    self.erro = e
+        self._acordar.set()
+
+    def registrar_venda(self, venda):
+        self._enfileirar("comanda", venda)
+        if self.cupom: self._enfileirar("cupom", venda)
+
+    def excluir_venda(self, venda_id):
+        self._enfileirar("cancelamento", venda_id)
+
+    # Arquivo de pendentes: uma linha JSON por impresso já montado. Só é mexido
+    # com o _lock; o .lendo de _recarregar é lido fora dele, só pela thread.
+
+    def _contar_pendentes(self):
+        # Uma queda no meio de _recarregar deixa o .lendo: ele vem antes do arquivo atual.
+        lendo = self.arq_pendentes + ".lendo"
+        if os.path.exists(lendo):
+            try:
+                with open(self.arq_pendentes, "r", encoding="utf-8") as f:
+                    depois = f.read()
+            except FileNotFoundError:
+                depois = ""
+            with open(lendo, "a", encoding="utf-8") as f:
+                f.write(depois)
+            os.replace(lendo, self.arq_pendentes)
+        try:
+            with open(self.arq_pendentes, "r", encoding="utf-8") as f:
+                return sum(1 for _ in f)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _linhas(impressos):
+        return "".join(json.dumps({"nome": nome, "texto": texto}, ensure_ascii=False) + "\n" for nome, texto in impressos)
+
+    def _gravar_pendentes(self, impressos):
+        if self._arq is None: self._arq = open(self.arq_pendentes, "a", encoding="utf-8")
+        self._arq.write(self._linhas(impressos))
+        self._arq.flush()
+        self.no_disco += len(impressos)
+
+    def _fechar_arquivo(self):
+        if self._arq is not None:
+            self._arq.close()
+            self._arq = None
+
+    def _recarregar(self):
+        # A fila esvaziou: o que esperava no arquivo volta para ela, na ordem.
+        # O arquivo é tirado do caminho e lido fora do _lock; o que chegar
+        # enquanto isso vai para um arquivo novo, atrás destes.
+        lendo = self.arq_pendentes + ".lendo"
+        with self._lock:
+            # Um .lendo que já existe sobrou de uma leitura que falhou: é lido antes.
+            if not os.path.exists(lendo):
+                try:
+                    self._fechar_arquivo()
+                    os.replace(self.arq_pendentes, lendo)
+                except OSError as e:
+                    self.erro = e
+                    return
+        try:
+            with open(lendo, "r", encoding="utf-8") as f:
+                linhas = f.readlines()
+        except OSError as e:
+            self.erro = e
+            return
+        trabalhos = []
+        for linha in linhas:
+            try: p = json.loads(linha)
+            except ValueError: continue     # última linha cortada por uma queda
+            trabalhos.append(["pendente", None, (p["nome"], p["texto"])])
+        with self._lock:
+            try: os.remove(lendo)
+            except OSError as e:
+                self.erro = e
+                return
+            self._fila.extend(trabalhos)
+            self.no_disco -= len(linhas)
+
+    def _guardar_fila(self):
+        # Ao fechar: o que está na fila vai para a frente do arquivo (é mais antigo que o que já está lá).
+        with self._lock:
+            self._fechar_arquivo()
+            if not self._fila: return
+            try:
+                with open(self.arq_pendentes, "r", encoding="utf-8") as f:
+                    depois = f.read()
+            except FileNotFoundError:
+                depois = ""
+            tmp = self.arq_pendentes + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(self._linhas(self._montar(t) for t in self._fila) + depois)
+            os.replace(tmp, self.arq_pendentes)
+            self.no_disco += len(self._fila)
+            self._fila.clear()
+
+    def _montar(self, trabalho):
+        # Só na primeira tentativa: um lote reenviado leva os mesmos nomes e textos.
+        tipo, dado, pronto = trabalho
+        if pronto is None:
+            vid = dado if tipo == "cancelamento" else dado.id
+            nome = f"{datetime.now():%Y%m%d-%H%M%S}_{next(self._seq):05d}_{tipo}_{vid}"
+            pronto = trabalho[2] = (nome, _TEXTOS[tipo](dado))
+        return pronto
+
+    def _executar(self):
+        espera = self.intervalo
+        while not self._parar:
+            self._acordar.wait(espera)
+            self._acordar.clear()
+            if not self._fila and self.no_disco: self._recarregar()
+            with self._lock:
+                lote = list(itertools.islice(self._fila, self.lote))
+            if not lote:
+                espera = self.intervalo
+                continue
+            try:
+                self.destino.enviar([self._montar(t) for t in lote])
+            except (OSError, ValueError) as e:
+                self.falhas += 1
+                self.erro = e
+                espera = min(self.espera_max, max(self.intervalo, espera * 2))
+                continue
+            with self._lock:
+                # Se `fechar` já guardou a fila no arquivo, não há o que tirar.
+                for t in lote:
+                    if self._fila and self._fila[0] is t: self._fila.popleft()
+                self.impressos += len(lote)
+            self.erro = None
+            # Ainda há fila: manda o próximo lote sem esperar.
+            espera = 0 if self.pendentes else self.intervalo
+
+    def sincronizar(self, timeout=10.0):
+        """Espera a fila esvaziar (ou o tempo acabar). Retorna True se tudo foi impresso."""
+        limite = time.monotonic() + timeout
+        while self.pendentes and time.monotonic() < limite:
+            self._acordar.set()
+            time.sleep(0.05)
+        return not self.pendentes
+
+    def fechar(self, timeout=3.0):
+        """Dá `timeout` segundos para a fila esvaziar e para a thread. O que
+        sobrou fica no arquivo de pendentes, para a próxima vez (um lote que
+        ainda estava sendo enviado pode sair de novo); devolve quantos são.
+        Levanta OSError se não conseguir gravá-los."""
+        self.sincronizar(timeout)
+        self._parar = True
+        self._acordar.set()
+        self._thread.join(timeout=1)
+        self._guardar_fila()
+        return self.pendentes
+
+
+# -----------------------
+# Impressora de mentira
+# -----------------------
+class _Servidor(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+    request_queue_size = 64
+
+
+def servidor_impressora(host="127.0.0.1", porta=PORTA, saida=None, atraso=0.0):
+    """Servidor TCP que faz o papel de uma impressora térmica: mostra (ou
+    grava em `saida`) o que recebe, levando `atraso` segundos por conexão."""
+    trava = threading.Lock()
+
+    class Tratador(socketserver.StreamRequestHandler):
+        def handle(self):
+            dados = self.rfile.read()
+            time.sleep(atraso)
+            texto = dados.replace(DestinoTCP.CORTE, b"\n--- corte ---\n").decode("cp850", "replace")
+            with trava:
+                if saida is None:
+                    print(texto, flush=True)
+                else:
+                    with open(saida, "a", encoding="utf-8") as f:
+                        f.write(texto)
+
+    return _Servidor((host, porta), Tratador)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="impressao.py", description="Impressão de comandas do caixa.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("impressora", help="impressora de mentira na rede, para testar sem papel")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--porta", type=int, default=PORTA)
+    p.add_argument("--saida", help="grava o que chega neste arquivo (padrão: mostra na tela)")
+    p.add_argument("--atraso", type=float, default=0.0, help="segundos por conexão, como uma impressora lenta")
+    args = parser.parse_args(argv)
+
+    servidor = servidor_impressora(args.host, args.porta, args.saida, args.atraso)
+    print(f"Impressora de mentira em tcp://{args.host}:{args.porta}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    servidor.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+# instrumentacao.py
+# Instrumentação opcional dos caminhos quentes do caixa. Quando ligada
+# (python main.py --diagnostico), os métodos escolhidos de uma instância são
+# trocados por versões que medem o tempo de cada chamada; as últimas amostras
+# de cada operação ficam numa janela em memória (p50/p95/p99) e chamadas acima
+# do limite vão para o log "caixa.lento". Desligada, não custa nada: nenhum
+# método é trocado.
+
+import json
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from functools import wraps
+
+log = logging.getLogger("caixa.lento")
+
+
+class Instrumentacao:
+    def __init__(self, janela=1000, limite_lento=50.0):
+        self.janela = janela
+        self.limite_lento = limite_lento    # ms
+        self.amostras = {}                  # operação -> últimas durações (ms)
+        self.chamadas = {}                  # operação -> nº de chamadas desde o início
+        self.lentas = deque(maxlen=200)     # (quando, operação, ms)
+
+    def registrar(self, nome, ms):
+        amostras = self.amostras.get(nome)
+        if amostras is None:
+            amostras = self.amostras[nome] = deque(maxlen=self.janela)
+        amostras.append(ms)
+        self.chamadas[nome] = self.chamadas.get(nome, 0) + 1
+        if ms >= self.limite_lento:
+            self.lentas.append((datetime.now().isoformat(timespec="seconds"), nome, ms))
+            log.warning("%s levou %.1f ms", nome, ms)
+
+    def envolver(self, nome, func):
+        @wraps(func)
+        def medido(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.registrar(nome, (time.perf_counter() - inicio) * 1000)
+        return medido
+
+    def instrumentar(self, obj, *metodos):
+        """Troca os `metodos` de `obj` (só nesta instância) por versões medidas.
+        Deve rodar antes de os métodos serem passados como callback a widgets."""
+        classe = type(obj).__name__
+        for metodo in metodos:
+            setattr(obj, metodo, self.envolver(f"{classe}.{metodo}", getattr(obj, metodo)))
+
+    def zerar(self):
+        self.amostras.clear()
+        self.chamadas.clear()
+        self.lentas.clear()
+
+    # Leitura
+
+    def percentis(self):
+        """{operação: {chamadas, n, p50, p95, p99, max}} sobre a janela atual (ms)."""
+        res = {}
+        for nome, amostras in self.amostras.items():
+            t = sorted(amostras)
+            p = lambda q: t[min(len(t) - 1, int(q * len(t)))]
+            res[nome] = {"chamadas": self.chamadas[nome], "n": len(t),
+                         "p50": p(0.50), "p95": p(0.95), "p99": p(0.99), "max": t[-1]}
+        return res
+
+    def texto(self):
+        linhas = [f"{'operação':<40} {'chamadas':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'máx':>8}  (ms)"]
+        for nome, r in sorted(self.percentis().items(), key=lambda kv: -kv[1]["p95"]):
+            linhas.append(f"{nome:<40} {r['chamadas']:>8} {r['p50']:8.2f} {r['p95']:8.2f} {r['p99']:8.2f} {r['max']:8.2f}")
+        if self.lentas:
+            linhas.append(f"\nChamadas acima de {self.limite_lento:g} ms (mais recentes primeiro):")
+            for quando, nome, ms in list(self.lentas)[::-1][:20]:
+                linhas.append(f"  {quando[11:]}  {nome}  {ms:.1f} ms")
+        return "\n".join(linhas)
+
+    def salvar(self, caminho, extras=None):
+        dados = {"data": datetime.now().isoformat(timespec="seconds"), "janela": self.janela,
+                 "limite_lento_ms": self.limite_lento, "operacoes": self.percentis(),
+                 "lentas": [{"quando": q, "operacao": n, "ms": ms} for q, n, ms in self.lentas]}
+        dados.update(extras or {})
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(dados, f, ensure_ascii=False, indent=2)
@@ -2,111 +2,243 @@
 # Requisitos: Python 3.8+ | pip install reportlab
 # Interface em PT-BR, com fontes maiores, salvamento de vendas e alerta ao sair.
 
-import json
-import os
+import argparse
+import bisect
+import logging
+import sqlite3
+import time
+from collections import deque
 from datetime import datetime
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog, filedialog
 from tkinter import font as tkfont
 
-# Tenta importar reportlab. Se não tiver, o app permite salvar TXT.
-try:
-    from reportlab.lib.pagesizes import A4
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.units import cm
-    REPORTLAB_OK = True
-except Exception:
-    REPORTLAB_OK = False
-
-ARQ_PRODUTOS = "produtos.json"
-
-# -----------------------
-# Camada de dados
-# -----------------------
-def carregar_produtos():
-    if os.path.exists(ARQ_PRODUTOS):
-        try:
-            with open(ARQ_PRODUTOS, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                if isinstance(data, list):
-                    return {p["nome"]: float(p["preco"]) for p in data if "nome" in p and "preco" in p}
-                elif isinstance(data, dict):
-                    return {str(k): float(v) for k, v in data.items()}
-        except Exception:
-            pass
-    return {
-        "Pastel": 10.0,
-        "Refrigerante": 6.0,
-        "Cerveja": 12.0
-    }
-
-def salvar_produtos(produtos: dict):
-    try:
-        with open(ARQ_PRODUTOS, "w", encoding="utf-8") as f:
-            json.dump(produtos, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        messagebox.showerror("Erro", f"Não foi possível salvar os produtos.\n{e}")
-
-
-# Lógica de vendas
-
-class CaixaSessao:
-    def __init__(self):
-        self.vendas = []
-    
-    @property
-    def total_por_produto(self):
-        tot = {}
-        for v in self.vendas:
-            for nome, qtd, preco in v["itens"]:
-                tot[nome] = tot.get(nome, 0) + qtd
-        return tot
+from caixa import (FORMAS_PAGAMENTO, REPORTLAB_OK, ArmazenamentoArquivos, ErroVenda, MotorCaixa, TarefaExportacao,
+                   TarefaRelatorio, dinheiro, formatar_centavos, parse_valor, texto_painel, texto_resumo)
+from diario import DiarioVendas
+from instrumentacao import Instrumentacao
+from serie import LARGURA_PADRAO, RETENCAO_PADRAO
 
-    @property
-    def total_por_pagamento(self):
-        tot = {"Dinheiro": 0.0, "Débito": 0.0, "Crédito": 0.0, "Pix": 0.0}
-        for v in self.vendas:
-            forma = v["pagamento"]
-            tot[forma] = tot.get(forma, 0.0) + v["total"]
-        return tot
 
-    @property
-    def total_geral(self):
-        return sum(v["total"] for v in self.vendas)
+# UI Helpers
 
-    @property
-    def numero_vendas(self):
-        return len(self.vendas)
+class AgendadorRedesenho:
+    """Junta pedidos de redesenho e redesenha cada componente sujo uma única vez
+    por ciclo ocioso do Tk (`after_idle`).
+
+    Componentes cuja função `visivel` retorna False (ex.: widgets de uma aba
+    escondida) continuam sujos até a próxima execução em que estejam visíveis.
+    """
+
+    def __init__(self, widget):
+        self.widget = widget
+        self._componentes = {}
+        self._sujos = set()
+        self._agendado = None
+        self.pedidos = 0
+        self.redesenhos = 0
+        self.adiados = 0
+
+    def registrar(self, nome, funcao, visivel=None):
+        self._componentes[nome] = (funcao, visivel)
+
+    def marcar(self, *nomes):
+        for nome in nomes:
+            self.pedidos += 1
+            self._sujos.add(nome)
+        if self._sujos and self._agendado is None:
+            self._agendado = self.widget.after_idle(self._executar)
+
+    def _executar(self):
+        self._agendado = None
+        for nome, (funcao, visivel) in self._componentes.items():
+            if nome not in self._sujos: continue
+            if visivel is not None and not visivel():
+                self.adiados += 1
+                continue
+            self._sujos.discard(nome)
+            self.redesenhos += 1
+            funcao()
 
     @property
-    def ticket_medio(self):
-        return (self.total_geral / self.numero_vendas) if self.numero_vendas > 0 else 0.0
+    def coalescidos(self):
+        return self.pedidos - self.redesenhos - len(self._sujos)
+
+    def estatisticas(self):
+        return {"pedidos": self.pedidos, "redesenhos": self.redesenhos,
+                "coalescidos": self.coalescidos, "adiados": self.adiados,
+                "pendentes": sorted(self._sujos)}
+
+
+class HistoricoVirtual:
+    """Histórico de vendas que só materializa as linhas visíveis.
+
+    A Treeview nunca recebe a sessão inteira: guarda apenas a janela que cabe
+    na tela e a barra de rolagem é desenhada sobre o total de vendas. Os dados
+    vêm da sessão sob demanda (`sessao()` devolve a CaixaSessao atual). Com
+    filtro ativo (forma de pagamento e/ou faixa de horário, em segundos do dia)
+    a janela percorre uma lista de posições na sessão, não de linhas prontas.
+    """
+
+    def __init__(self, tree, barra, rotulo, sessao, linha):
+        self.tree = tree
+        self.barra = barra
+        self.rotulo = rotulo
+        self._sessao = sessao
+        self._linha = linha
+        self.inicio = 0
+        self.visiveis = 15
+        self.seguir = True          # acompanha as vendas novas enquanto estiver no fim
+        self.forma = None
+        self.de = self.ate = None   # segundos do dia; de > ate atravessa a meia-noite
+        self._posicoes = None       # posições na sessão que passam no filtro (None = sem filtro)
+        self._valido = True
+        barra.configure(command=self.rolar)
+        tree.bind("<Configure>", self._redimensionar)
+        for seq in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            tree.bind(seq, self._roda)
+        tree.bind("<Prior>", lambda e: self._pagina(-1))
+        tree.bind("<Next>", lambda e: self._pagina(1))
+        tree.bind("<Control-Home>", lambda e: self._extremo(0))
+        tree.bind("<Control-End>", lambda e: self._extremo(self.total))
+        tree.bind("<Up>", lambda e: self._seta(-1))
+        tree.bind("<Down>", lambda e: self._seta(1))
+
+    # Filtro
 
+    @property
+    def filtrado(self):
+        return self.forma is not None or self.de is not None
+
+    def _passa(self, venda):
+        if self.forma is not None and venda.pagamento != self.forma: return False
+        if self.de is None: return True
+        s = venda.instante % 86400
+        if self.de <= self.ate: return self.de <= s < self.ate
+        return s >= self.de or s < self.ate
+
+    def filtrar(self, forma=None, de=None, ate=None):
+        """Troca o filtro; `de`/`ate` em segundos do dia (um só dos dois vale até o fim/desde o início do dia)."""
+        self.forma = forma
+        if de is None and ate is None: self.de = self.ate = None
+        else: self.de, self.ate = de or 0, 86400 if ate is None else ate
+        self.seguir = True
+        self.invalidar()
+        self.desenhar()
+
+    def invalidar(self):
+        """Sessão mudou de um jeito que desloca posições (exclusão, nova sessão, recuperação)."""
+        self._valido = False
+
+    def _validar(self):
+        if self._valido: return
+        vendas = self._sessao().vendas
+        self._posicoes = [i for i, v in enumerate(vendas) if self._passa(v)] if self.filtrado else None
+        self._valido = True
+
+    def venda_adicionada(self, venda):
+        """Chamado logo após a venda entrar no fim da sessão."""
+        if self._valido and self._posicoes is not None and self._passa(venda):
+            self._posicoes.append(len(self._sessao().vendas) - 1)
 
-# UI Helpers
-
-def dinheiro(v):
-    try:
-        return f"R$ {float(v):.2f}".replace(".", ",")
-    except:
-        return "R$ 0,00"
-
-def parse_valor(texto: str) -> float:
-    if texto is None:
-        return 0.0
-    txt = texto.strip().upper().replace("R$", "").strip()
-    txt = txt.replace(".", "").replace(",", ".") if txt.count(",") == 1 and txt.count(".") == 0 else txt
-    txt = txt.replace(" ", "")
-    try:
-        return float(txt)
-    except:
-        return 0.0
+    @property
+    def total(self):
+        self._validar()
+        return len(self._sessao().vendas) if self._posicoes is None else len(self._posicoes)
+
+    # Janela
+
+    def desenhar(self):
+        total = self.total
+        if self.seguir: self.inicio = total - self.visiveis
+        self.inicio = max(0, min(self.inicio, total - self.visiveis))
+        fim = min(total, self.inicio + self.visiveis)
+        vendas, posicoes = self._sessao().vendas, self._posicoes
+        tree = self.tree
+        selecao, foco = tree.selection(), tree.focus()
+        tree.delete(*tree.get_children())
+        for i in range(self.inicio, fim):
+            venda = vendas[i if posicoes is None else posicoes[i]]
+            tree.insert("", "end", iid=str(venda.id), values=self._linha(venda))
+        manter = [iid for iid in selecao if tree.exists(iid)]
+        if manter: tree.selection_set(manter)
+        if foco and tree.exists(foco): tree.focus(foco)
+        if total: self.barra.set(self.inicio / total, fim / total)
+        else: self.barra.set(0, 1)
+        filtro = " (filtrado)" if self.filtrado else ""
+        self.rotulo.config(text=f"{self.inicio + 1}–{fim} de {total}{filtro}" if total else f"Nenhuma venda{filtro}")
+
+    def ir_para(self, inicio):
+        total = self.total
+        self.inicio = max(0, min(inicio, total - self.visiveis))
+        self.seguir = self.inicio + self.visiveis >= total
+        self.desenhar()
+
+    def ir_para_venda(self, venda_id):
+        """Centraliza e seleciona a venda `venda_id`. Retorna False se ela não
+        existe ou não passa no filtro atual."""
+        try: i = self._sessao().indice_venda(venda_id)
+        except ValueError: return False
+        self._validar()
+        if self._posicoes is not None:
+            j = bisect.bisect_left(self._posicoes, i)
+            if j == len(self._posicoes) or self._posicoes[j] != i: return False
+            i = j
+        self.ir_para(i - self.visiveis // 2)
+        iid = str(venda_id)
+        self.tree.selection_set(iid)
+        self.tree.focus(iid)
+        return True
+
+    def rolar(self, acao, valor, unidade=None):
+        """Comando da barra de rolagem (mesmos argumentos de `yview`)."""
+        if acao == "moveto": self.ir_para(round(float(valor) * self.total))
+        else: self.ir_para(self.inicio + int(valor) * (max(1, self.visiveis - 1) if unidade == "pages" else 1))
+
+    def _redimensionar(self, event):
+        filhos = self.tree.get_children()
+        caixa = self.tree.bbox(filhos[0]) if filhos else None
+        cabecalho = caixa[1] if caixa else 35
+        altura = int(ttk.Style().lookup("Treeview", "rowheight") or 30)
+        visiveis = max(1, (event.height - cabecalho) // altura)
+        if visiveis != self.visiveis:
+            self.visiveis = visiveis
+            self.desenhar()
+
+    def _roda(self, event):
+        self.ir_para(self.inicio + (-3 if event.num == 4 or event.delta > 0 else 3))
+        return "break"
+
+    def _pagina(self, sentido):
+        self.rolar("scroll", sentido, "pages")
+        return "break"
+
+    def _extremo(self, inicio):
+        self.ir_para(inicio)
+        filhos = self.tree.get_children()
+        if filhos:
+            iid = filhos[0] if inicio == 0 else filhos[-1]
+            self.tree.selection_set(iid)
+            self.tree.focus(iid)
+        return "break"
+
+    def _seta(self, passo):
+        """Setas na borda da janela rolam uma linha em vez de parar."""
+        filhos = self.tree.get_children()
+        if not filhos or self.tree.focus() != (filhos[0] if passo < 0 else filhos[-1]): return None
+        self.ir_para(self.inicio + passo)
+        filhos = self.tree.get_children()
+        iid = filhos[0] if passo < 0 else filhos[-1]
+        self.tree.selection_set(iid)
+        self.tree.focus(iid)
+        return "break"
 
 
 # App Tkinter
 
 class App(tk.Tk):
-    def __init__(self):
+    def __init__(self, armazenamento=None, envio=None, instrumentacao=None,
+                 largura_serie=LARGURA_PADRAO, retencao_serie=RETENCAO_PADRAO, impressao=None):
         super().__init__()
         self.title("Caixa de Quermesse")
         self.geometry("1350x650")
@@ -117,13 +249,149 @@ class App(tk.Tk):
         self.font_total = tkfont.Font(family="Arial", size=16, weight="bold")
         self._configurar_estilo()
         
-        self.produtos = carregar_produtos()
-        self.sessao = CaixaSessao()
+        self.motor = MotorCaixa(armazenamento=armazenamento or ArmazenamentoArquivos(diario=DiarioVendas()),
+                                largura_serie=largura_serie, retencao_serie=retencao_serie)
+        self.motor.ao_falhar_gravacao = lambda e: messagebox.showerror("Erro", f"Falha ao gravar a venda.\n{e}")
+        self.envio = envio
+        self._envio_online = None
+        self._erro_catalogo = None
+        if envio is not None: self.motor.replicas.append(envio)
+        self.impressao = impressao     # impressao.FilaImpressao: comandas em segundo plano
+        self._estado_impressao = None
+        if impressao is not None: self.motor.replicas.append(impressao)
+        self._tarefa = None
+        self.historico = None     # HistoricoVirtual, criado com a aba Relatório
+        self._aviso_after = None
+        self._desfazer_after = None
+        self._alertas_estoque = {}    # nome -> disponível, avisados no próximo redesenho
+        self.venda_rapida = tk.BooleanVar(value=True)
+        self._instantes_vendas = deque()
+        self.redesenho = AgendadorRedesenho(self)
+        self.instrumentacao = instrumentacao
+        if instrumentacao is not None: self._instrumentar(instrumentacao)
+        self._recuperar_sessao()
 
         self._montar_menu()
         self._montar_abas()
+        self._registrar_componentes()
+        if self.sessao.numero_vendas: self._atualizar_dados()
+        self.motor.estoque.ao_baixar = self._estoque_baixo
+        for nome, disp in self.motor.estoque.baixos():
+            self._alertas_estoque[nome] = disp
+        if self._alertas_estoque: self.redesenho.marcar("estoque")
         
         self.protocol("WM_DELETE_WINDOW", self._ao_fechar)
+        self.after(1000, self._sincronizar)
+
+    # O estado vive no motor; o App só lê e desenha.
+    @property
+    def produtos(self):
+        return self.motor.produtos
+
+    @property
+    def sessao(self):
+        return self.motor.sessao
+
+    @property
+    def armazenamento(self):
+        return self.motor.armazenamento
+
+    @property
+    def venda_atual(self):
+        return self.motor.carrinho
+
+    def _recuperar_sessao(self):
+        try: self.motor.recuperar_sessao()
+        except Exception as e:
+            messagebox.showerror("Erro", f"Não foi possível recuperar a sessão anterior.\n{e}")
+
+    def _sincronizar(self):
+        # Cada passo com o seu try, e o próximo ciclo agendado no finally: um
+        # produtos.json editado errado ou o banco travado por outro caixa não
+        # podem parar o timer (e com ele o fsync do diário e os avisos).
+        passos = [(self.armazenamento.sincronizar, "Falha ao gravar"),
+                  (self._acompanhar_catalogo, "Falha ao reler o catálogo")]
+        if self.envio is not None: passos.append((self._acompanhar_envio, "Falha no envio ao agregador"))
+        if self.impressao is not None: passos.append((self._acompanhar_impressao, "Falha na impressão"))
+        try:
+            for passo, falha in passos:
+                try: passo()
+                except (OSError, sqlite3.Error, ValueError, TypeError) as e:
+                    self._notificar(f"{falha}: {e}", ms=15000, erro=True)
+        finally:
+            self.after(1000, self._sincronizar)
+
+    def _acompanhar_catalogo(self):
+        # Outro caixa pode ter mudado o catálogo em comum (produtos.json ou banco):
+        # só as linhas afetadas são mexidas, salvo se algum código mudou.
+        mudanca = self.motor.recarregar_produtos()
+        erro = getattr(self.armazenamento, "erro_catalogo", None)
+        if erro != self._erro_catalogo:
+            self._erro_catalogo = erro
+            if erro: self._notificar(f"Erro no produtos.json (o caixa segue com o catálogo que já tinha): {erro}", ms=30000, erro=True)
+        if mudanca is None: return
+        removidos, gravados, recodificado = mudanca
+        if recodificado:
+            self._atualiza_lista_produtos()
+            self._atualiza_tree_sel_prod()
+        else:
+            for nome in removidos:
+                self._produto_removido(nome)
+            for nome in gravados:
+                self._produto_gravado(nome)
+        self._notificar(f"Catálogo atualizado: {len(gravados)} produto(s) novo(s) ou alterado(s), {len(removidos)} removido(s).")
+
+    def _acompanhar_envio(self):
+        # O envio roda em outra thread; aqui só avisamos quando a conexão muda.
+        online = self.envio.online
+        if online == self._envio_online: return
+        self._envio_online = online
+        if online: self._notificar("Agregador conectado.")
+        elif online is False: self._notificar(f"Sem conexão com o agregador — {self.envio.pendentes} envio(s) na fila.", ms=15000)
+
+    def _acompanhar_impressao(self):
+        # A fila imprime em outra thread; aqui só mostramos o tamanho dela e as falhas.
+        imp = self.impressao
+        estado = (imp.pendentes, imp.no_disco, imp.impressos, imp.descartados, str(imp.erro) if imp.erro else None)
+        if estado == self._estado_impressao: return
+        anterior = self._estado_impressao or (0, 0, 0, 0, None)
+        self._estado_impressao = estado
+        pendentes, no_disco, impressos, descartados, erro = estado
+        texto = f"Impressão ({imp.destino}): {pendentes} na fila"
+        if no_disco: texto += f" ({no_disco} em disco)"
+        texto += f" | {impressos} impressa(s)"
+        if descartados: texto += f" | {descartados} PERDIDA(S)"
+        if erro: texto += f" | falha: {erro} — tentando de novo"
+        self.lbl_impressao.config(text=texto, foreground="#b00020" if erro or descartados else "")
+        if descartados > anterior[3]:
+            self._notificar(f"{descartados - anterior[3]} comanda(s) perdida(s): fila de impressão cheia e "
+                            f"{self.impressao.arq_pendentes} não pôde ser gravado.", ms=30000, erro=True)
+        elif erro is not None and anterior[4] is None:
+            self._notificar(f"Falha na impressão — {pendentes} comanda(s) na fila.", ms=15000, erro=True)
+
+    def _instrumentar(self, instr):
+        # Antes de montar as abas: os botões guardam o método já medido.
+        # Callbacks que sempre abrem diálogos modais ficam de fora (mediriam o
+        # operador); finalizar_venda só abre com a venda rápida desligada.
+        instr.instrumentar(self, "finalizar_venda", "adicionar_item_venda", "adicionar_por_codigo", "remover_item_carrinho",
+                           "limpar_carrinho", "alterar_qtd_carrinho", "adicionar_produto", "_atualiza_total", "_atualiza_carrinho",
+                           "_atualiza_estoque", "_atualiza_lista_produtos", "_atualiza_tree_sel_prod", "_filtrar_produtos",
+                           "_aplicar_historico", "_atualizar_resumo")
+        instr.instrumentar(self.motor, "finalizar_venda", "excluir_venda", "recuperar_sessao")
+        # A gravação do catálogo: nos arquivos ela fica para o sincronizar (o
+        # salvar_produtos só anota o que mudou); no SQLite é o próprio salvar_produtos.
+        gravar = "_gravar_produtos" if hasattr(self.armazenamento, "_gravar_produtos") else "salvar_produtos"
+        instr.instrumentar(self.armazenamento, gravar)
+        instr.instrumentar(self.redesenho, "_executar")
+
+    def _registrar_componentes(self):
+        relatorio_visivel = lambda: self.tabs.select() == str(self.aba_relatorio)
+        self.redesenho.registrar("carrinho", self._atualiza_carrinho)
+        self.redesenho.registrar("totais", self._atualiza_total)
+        self.redesenho.registrar("estoque", self._atualiza_estoque)
+        self.redesenho.registrar("resumo", self._atualizar_resumo, relatorio_visivel)
+        self.redesenho.registrar("historico", self._aplicar_historico, relatorio_visivel)
+        self.tabs.bind("<<NotebookTabChanged>>", lambda e: self._ao_trocar_aba())
 
     def _configurar_estilo(self):
         style = ttk.Style(self)
@@ -147,13 +415,23 @@ class App(tk.Tk):
 
         menu_arquivo.add_command(label="Salvar Vendas da Sessão", command=self.salvar_vendas_sessao)
         menu_arquivo.add_command(label="Gerar Relatório (PDF/TXT)", command=self.gerar_relatorio)
+        menu_arquivo.add_command(label="Nova Sessão", command=self.nova_sessao)
         menu_arquivo.add_separator()
-        menu_arquivo.add_command(label="Sair", command=self.destroy)
+        menu_arquivo.add_command(label="Sair", command=self._ao_fechar)
         menubar.add_cascade(label="Arquivo", menu=menu_arquivo)
+        menu_editar = tk.Menu(menubar, tearoff=0, font=self.font_normal)
+        menu_editar.add_command(label="Desfazer", accelerator="Ctrl+Z", command=self.desfazer)
+        menu_editar.add_command(label="Refazer", accelerator="Ctrl+Y", command=self.refazer)
+        menubar.add_cascade(label="Editar", menu=menu_editar)
+        self.bind_all("<Control-z>", lambda e: self.desfazer())
+        self.bind_all("<Control-y>", lambda e: self.refazer())
+        menu_opcoes = tk.Menu(menubar, tearoff=0, font=self.font_normal)
+        menu_opcoes.add_checkbutton(label="Venda rápida (sem janelas de confirmação)", variable=self.venda_rapida)
+        menubar.add_cascade(label="Opções", menu=menu_opcoes)
         self.config(menu=menubar)
 
     def _montar_abas(self):
-        tabs = ttk.Notebook(self)
+        tabs = self.tabs = ttk.Notebook(self)
         s = ttk.Style()
         s.configure('TNotebook.Tab', font=self.font_bold, padding=[10, 5])
         
@@ -166,19 +444,36 @@ class App(tk.Tk):
         tabs.add(self.aba_relatorio, text="Relatório")
         tabs.pack(expand=True, fill="both")
 
-        self._montar_aba_produtos()
+        # Só a aba Vendas é montada na abertura; Produtos e Relatório são
+        # montadas na primeira vez em que são abertas (ou usadas por um atalho).
+        self._abas_pendentes = {str(self.aba_produtos): self._montar_aba_produtos,
+                                str(self.aba_relatorio): self._montar_aba_relatorio}
         self._montar_aba_vendas()
-        self._montar_aba_relatorio()
+        tabs.select(self.aba_vendas)
+        self.bind_all("<F12>", lambda e: self.alternar_diagnostico())
+
+    def _construir_aba(self, aba):
+        montar = self._abas_pendentes.pop(str(aba), None)
+        if montar is not None: montar()
+
+    def _ao_trocar_aba(self):
+        self._construir_aba(self.tabs.select())
+        self.redesenho.marcar()
 
     def _montar_aba_produtos(self):
         container = self.aba_produtos
         
-        cols = ("Produto", "Preço")
+        cols = ("Cód", "Produto", "Preço", "Estoque")
         self.tree_produtos = ttk.Treeview(container, columns=cols, show="headings", height=12)
+        self.tree_produtos.heading("Cód", text="Cód")
         self.tree_produtos.heading("Produto", text="Produto")
         self.tree_produtos.heading("Preço", text="Preço")
+        self.tree_produtos.heading("Estoque", text="Estoque")
+        self.tree_produtos.column("Cód", width=50, anchor="center")
         self.tree_produtos.column("Produto", width=280)
         self.tree_produtos.column("Preço", width=120, anchor="e")
+        self.tree_produtos.column("Estoque", width=90, anchor="center")
+        self.tree_produtos.tag_configure("baixo", foreground="#b00020")
         self._atualiza_lista_produtos()
         
         yscroll = ttk.Scrollbar(container, orient="vertical", command=self.tree_produtos.yview)
@@ -203,53 +498,88 @@ class App(tk.Tk):
         ttk.Button(btns, text="Adicionar", command=self.adicionar_produto).pack(side="left", expand=True, padx=2)
         ttk.Button(btns, text="Editar", command=self.editar_produto).pack(side="left", expand=True, padx=2)
         ttk.Button(btns, text="Remover", command=self.remover_produto).pack(side="left", expand=True, padx=2)
+        ttk.Button(form, text="Ajustar estoque", command=self.ajustar_estoque).grid(row=5, column=0, sticky="ew")
         
         container.rowconfigure(0, weight=1)
         container.columnconfigure(0, weight=1)
 
+    # As duas listas de produtos usam o nome como iid e seguem a ordem do
+    # índice do catálogo: cadastro, edição e remoção mexem só na linha afetada.
+    # A coluna Estoque mostra o disponível (vazia sem controle), em vermelho no mínimo.
+    def _texto_estoque(self, nome):
+        disp = self.motor.estoque.disponivel(nome)
+        return "" if disp is None else disp
+
+    def _tags_produto(self, nome):
+        return ("baixo",) if self.motor.estoque.baixo(nome) else ()
+
+    def _linha_produto(self, nome):
+        return (self.motor.indice.codigo(nome), nome, dinheiro(self.produtos[nome]), self._texto_estoque(nome))
+
+    def _preencher_produtos(self, tree):
+        tree.delete(*tree.get_children())
+        for nome in self.motor.indice:
+            tree.insert("", "end", iid=nome, values=self._linha_produto(nome), tags=self._tags_produto(nome))
+
     def _atualiza_lista_produtos(self):
-        for i in self.tree_produtos.get_children(): self.tree_produtos.delete(i)
-        for nome, preco in sorted(self.produtos.items()):
-            self.tree_produtos.insert("", "end", values=(nome, dinheiro(preco)))
+        if not hasattr(self, "tree_produtos"): return
+        self._preencher_produtos(self.tree_produtos)
+
+    def _arvores_produtos(self):
+        return [getattr(self, nome) for nome in ("tree_produtos", "tree_sel_prod") if hasattr(self, nome)]
+
+    def _produto_gravado(self, nome, nome_antigo=None):
+        pos = self.motor.indice.posicao(nome)
+        for tree in self._arvores_produtos():
+            if nome_antigo is not None and nome_antigo != nome and tree.exists(nome_antigo): tree.delete(nome_antigo)
+            if tree.exists(nome):
+                tree.item(nome, values=self._linha_produto(nome), tags=self._tags_produto(nome))
+                tree.move(nome, "", pos)
+            else:
+                tree.insert("", pos, iid=nome, values=self._linha_produto(nome), tags=self._tags_produto(nome))
+        if hasattr(self, "busca_var") and self.busca_var.get().strip(): self._filtrar_produtos()
+
+    def _produto_removido(self, nome):
+        # Os outros produtos mantêm os códigos: só a linha removida sai.
+        for tree in self._arvores_produtos():
+            if tree.exists(nome): tree.delete(nome)
 
     def adicionar_produto(self):
         nome = self.ent_nome.get().strip()
-        preco = parse_valor(self.ent_preco.get())
-        if not nome or preco <= 0:
-            messagebox.showwarning("Atenção", "Informe um nome e um preço válido.")
+        try: self.motor.adicionar_produto(nome, parse_valor(self.ent_preco.get()))
+        except ErroVenda as e:
+            messagebox.showwarning("Atenção", str(e))
             return
-        self.produtos[nome] = preco
-        salvar_produtos(self.produtos)
-        self._atualiza_lista_produtos()
-        self._atualiza_tree_sel_prod()
+        except OSError as e:
+            messagebox.showerror("Erro", f"Não foi possível salvar os produtos.\n{e}")
+        self._produto_gravado(nome)
         self.ent_nome.delete(0, tk.END)
         self.ent_preco.delete(0, tk.END)
 
     def _produto_selecionado(self):
         sel = self.tree_produtos.selection()
-        if not sel: return None
-        vals = self.tree_produtos.item(sel[0], "values")
-        return vals[0] if vals else None
+        return sel[0] if sel else None
 
     def editar_produto(self):
         nome = self._produto_selecionado()
         if not nome:
             messagebox.showinfo("Info", "Selecione um produto na lista.")
             return
-        preco_atual = self.produtos.get(nome, 0.0)
+        preco_atual = self.produtos.get(nome, 0)
         novo_nome = simpledialog.askstring("Editar produto", "Novo nome:", initialvalue=nome, parent=self)
         if not novo_nome: return
-        novo_preco_txt = simpledialog.askstring("Editar produto", "Novo preço (R$):", initialvalue=f"{preco_atual:.2f}".replace(".", ","), parent=self)
+        novo_preco_txt = simpledialog.askstring("Editar produto", "Novo preço (R$):", initialvalue=formatar_centavos(preco_atual), parent=self)
         if novo_preco_txt is None: return
-        novo_preco = parse_valor(novo_preco_txt)
-        if novo_preco <= 0:
-            messagebox.showwarning("Atenção", "Preço inválido.")
+        try: self.motor.editar_produto(nome, novo_nome, parse_valor(novo_preco_txt))
+        except ErroVenda as e:
+            messagebox.showwarning("Atenção", str(e))
             return
-        if novo_nome != nome: self.produtos.pop(nome, None)
-        self.produtos[novo_nome] = novo_preco
-        salvar_produtos(self.produtos)
-        self._atualiza_lista_produtos()
-        self._atualiza_tree_sel_prod()
+        except OSError as e:
+            messagebox.showerror("Erro", f"Não foi possível salvar os produtos.\n{e}")
+        # Se `novo_nome` já existia, a linha dele fica com este produto (e o código deste).
+        self._produto_gravado(novo_nome, nome)
+        # Linhas do carrinho com o nome antigo foram renomeadas junto.
+        if novo_nome != nome: self.redesenho.marcar("carrinho", "estoque")
 
     def remover_produto(self):
         nome = self._produto_selecionado()
@@ -257,10 +587,57 @@ class App(tk.Tk):
             messagebox.showinfo("Info", "Selecione um produto na lista.")
             return
         if messagebox.askyesno("Confirmação", f"Remover '{nome}'?"):
-            self.produtos.pop(nome, None)
-            salvar_produtos(self.produtos)
-            self._atualiza_lista_produtos()
-            self._atualiza_tree_sel_prod()
+            try: self.motor.remover_produto(nome)
+            except OSError as e:
+                messagebox.showerror("Erro", f"Não foi possível salvar os produtos.\n{e}")
+            self._produto_removido(nome)
+
+    def ajustar_estoque(self):
+        nome = self._produto_selecionado()
+        if not nome:
+            messagebox.showinfo("Info", "Selecione um produto na lista.")
+            return
+        estoque = self.motor.estoque
+        atual = estoque.saldo(nome)
+        saldo_txt = simpledialog.askstring("Estoque", f"Quantidade de '{nome}' agora (vazio = sem controle):",
+                                           initialvalue="" if atual is None else str(atual), parent=self)
+        if saldo_txt is None: return
+        minimo_txt = "0"
+        if saldo_txt.strip():
+            minimo_txt = simpledialog.askstring("Estoque", "Avisar quando restarem (mínimo):",
+                                                initialvalue=str(estoque.minimo(nome) or 0), parent=self)
+            if minimo_txt is None: return
+        try:
+            saldo = int(saldo_txt) if saldo_txt.strip() else None
+            minimo = int(minimo_txt or 0)
+        except ValueError:
+            messagebox.showwarning("Atenção", "Informe números inteiros.")
+            return
+        try: self.motor.ajustar_estoque(nome, saldo, minimo)
+        except ErroVenda as e:
+            messagebox.showwarning("Atenção", str(e))
+            return
+        except OSError as e:
+            messagebox.showerror("Erro", f"Não foi possível salvar o estoque.\n{e}")
+        self.redesenho.marcar("estoque")
+
+    def _estoque_baixo(self, nome, disponivel):
+        # Chamado pelo motor no meio de uma operação: o aviso sai no próximo redesenho.
+        self._alertas_estoque[nome] = disponivel
+        self.redesenho.marcar("estoque")
+
+    def _atualiza_estoque(self):
+        nomes = self.motor.estoque.alteracoes()
+        for tree in self._arvores_produtos():
+            for nome in nomes:
+                if not tree.exists(nome): continue
+                tree.set(nome, "Estoque", self._texto_estoque(nome))
+                tree.item(nome, tags=self._tags_produto(nome))
+        if self._alertas_estoque:
+            avisos = [f"{nome} esgotado" if disp <= 0 else f"{nome}: restam {disp}"
+                      for nome, disp in self._alertas_estoque.items()]
+            self._alertas_estoque.clear()
+            self._notificar("Estoque baixo — " + "; ".join(avisos), ms=15000, erro=True)
 
     def _montar_aba_vendas(self):
         container = self.aba_vendas
@@ -268,20 +645,48 @@ class App(tk.Tk):
         frame_esq = ttk.LabelFrame(container, text="Produtos", padding=8)
         frame_esq.grid(row=0, column=0, sticky="nsew")
 
-        cols = ("Produto", "Preço")
+        # Busca: nome (sem acento), trecho ou código; Enter adiciona o primeiro
+        # resultado. "3*12" adiciona 3 unidades do código 12.
+        busca = ttk.Frame(frame_esq)
+        busca.grid(row=0, column=0, columnspan=2, pady=(0,6), sticky="we")
+        ttk.Label(busca, text="Buscar (nome ou código):").pack(side="left", padx=(0,5))
+        self.busca_var = tk.StringVar()
+        self.ent_busca = ttk.Entry(busca, textvariable=self.busca_var, font=self.font_normal)
+        self.ent_busca.pack(side="left", fill="x", expand=True)
+        self.busca_var.trace_add("write", lambda *a: self._filtrar_produtos())
+        self.ent_busca.bind("<Return>", lambda e: self._enter_busca())
+        self.ent_busca.bind("<Escape>", lambda e: self.busca_var.set(""))
+        self.ent_busca.bind("<Down>", lambda e: self._focar_resultados())
+
+        cols = ("Cód", "Produto", "Preço", "Estoque")
         self.tree_sel_prod = ttk.Treeview(frame_esq, columns=cols, show="headings", height=12)
+        self.tree_sel_prod.heading("Cód", text="Cód")
         self.tree_sel_prod.heading("Produto", text="Produto")
         self.tree_sel_prod.heading("Preço", text="Preço")
-        self.tree_sel_prod.column("Produto", width=260)
+        self.tree_sel_prod.heading("Estoque", text="Estoque")
+        self.tree_sel_prod.column("Cód", width=50, anchor="center")
+        self.tree_sel_prod.column("Produto", width=200)
         self.tree_sel_prod.column("Preço", width=90, anchor="e")
+        self.tree_sel_prod.column("Estoque", width=70, anchor="center")
+        self.tree_sel_prod.tag_configure("baixo", foreground="#b00020")
         yscroll = ttk.Scrollbar(frame_esq, orient="vertical", command=self.tree_sel_prod.yview)
         self.tree_sel_prod.configure(yscroll=yscroll.set)
-        self.tree_sel_prod.grid(row=0, column=0, sticky="nsew")
-        yscroll.grid(row=0, column=1, sticky="ns")
+        self.tree_sel_prod.grid(row=1, column=0, sticky="nsew")
+        yscroll.grid(row=1, column=1, sticky="ns")
+        self.tree_sel_prod.bind("<Return>", lambda e: self.adicionar_item_venda())
+        self.tree_sel_prod.bind("<Double-1>", lambda e: self.adicionar_item_venda())
         self._atualiza_tree_sel_prod()
+
+        # F1-F9: adiciona o produto de código 1-9 com uma tecla.
+        for n in range(1, 10):
+            self.bind_all(f"<F{n}>", lambda e, n=n: self.adicionar_por_codigo(n))
+        # Ctrl+1..4: forma de pagamento; Ctrl+Enter finaliza de qualquer campo.
+        for n, forma in enumerate(FORMAS_PAGAMENTO, start=1):
+            self.bind_all(f"<Control-Key-{n}>", lambda e, f=forma: self._escolher_pagamento(f))
+        self.bind_all("<Control-Return>", lambda e: self._finalizar_pelo_teclado())
         
         form = ttk.Frame(frame_esq)
-        form.grid(row=1, column=0, pady=(8,0), sticky="w")
+        form.grid(row=2, column=0, pady=(8,0), sticky="w")
         ttk.Label(form, text="Quantidade:").grid(row=0, column=0, sticky="w", padx=(0,5))
         btn_dec = ttk.Button(form, text="-", width=3, command=self._decrementar_qtd)
         btn_dec.grid(row=0, column=1)
@@ -292,7 +697,7 @@ class App(tk.Tk):
         btn_inc.grid(row=0, column=3)
         ttk.Button(form, text="Adicionar à venda", command=self.adicionar_item_venda).grid(row=0, column=4, padx=(10, 5))
         
-        frame_esq.rowconfigure(0, weight=1)
+        frame_esq.rowconfigure(1, weight=1)
         frame_esq.columnconfigure(0, weight=1)
         
         frame_meio = ttk.LabelFrame(container, text="Itens da venda atual", padding=8)
@@ -310,9 +715,15 @@ class App(tk.Tk):
         
         btns_carr = ttk.Frame(frame_meio)
         btns_carr.grid(row=1, column=0, pady=(8,0), sticky="we")
-        ttk.Button(btns_carr, text="Remover item", command=self.remover_item_carrinho).grid(row=0, column=0, padx=5, sticky="ew")
-        ttk.Button(btns_carr, text="Limpar venda", command=self.limpar_carrinho).grid(row=0, column=1, padx=5, sticky="ew")
-        btns_carr.columnconfigure((0,1), weight=1)
+        ttk.Button(btns_carr, text="−", width=3, command=lambda: self.alterar_qtd_carrinho(-1)).grid(row=0, column=0, padx=(5,2))
+        ttk.Button(btns_carr, text="+", width=3, command=lambda: self.alterar_qtd_carrinho(1)).grid(row=0, column=1, padx=(2,5))
+        ttk.Button(btns_carr, text="Remover item", command=self.remover_item_carrinho).grid(row=0, column=2, padx=5, sticky="ew")
+        ttk.Button(btns_carr, text="Limpar venda", command=self.limpar_carrinho).grid(row=0, column=3, padx=5, sticky="ew")
+        btns_carr.columnconfigure((2,3), weight=1)
+        # Com a lista em foco: +/− mudam a quantidade da linha, Delete a remove.
+        for tecla, delta in (("<plus>", 1), ("<KP_Add>", 1), ("<minus>", -1), ("<KP_Subtract>", -1)):
+            self.tree_carrinho.bind(tecla, lambda e, d=delta: self.alterar_qtd_carrinho(d))
+        self.tree_carrinho.bind("<Delete>", lambda e: self.remover_item_carrinho())
 
         frame_meio.rowconfigure(0, weight=1)
         frame_meio.columnconfigure(0, weight=1)
@@ -322,8 +733,7 @@ class App(tk.Tk):
 
         ttk.Label(frame_dir, text="Forma de pagamento:").grid(row=0, column=0, sticky="w")
         self.forma_var = tk.StringVar(value="Dinheiro")
-        formas = ["Dinheiro", "Débito", "Crédito", "Pix"]
-        self.combo_pag = ttk.Combobox(frame_dir, textvariable=self.forma_var, values=formas, state="readonly", width=15)
+        self.combo_pag = ttk.Combobox(frame_dir, textvariable=self.forma_var, values=FORMAS_PAGAMENTO, state="readonly", width=15)
         self.combo_pag.grid(row=1, column=0, sticky="we", pady=2)
         self.combo_pag.bind("<<ComboboxSelected>>", lambda e: self._on_muda_pagamento())
         
@@ -335,21 +745,30 @@ class App(tk.Tk):
         ttk.Label(self.frm_dinheiro, text="Valor recebido (R$):").grid(row=0, column=0, sticky="w")
         self.ent_recebido = ttk.Entry(self.frm_dinheiro, width=12, font=self.font_normal)
         self.ent_recebido.grid(row=1, column=0, pady=2, sticky="w")
+        self.ent_recebido.bind("<KeyRelease>", lambda e: self.calcular_troco())
+        self.ent_recebido.bind("<Return>", lambda e: self._finalizar_pelo_teclado())
         ttk.Button(self.frm_dinheiro, text="Calcular troco", command=self.calcular_troco).grid(row=1, column=1, padx=6)
         self.lbl_troco = ttk.Label(self.frm_dinheiro, text="Troco: R$ 0,00", font=self.font_bold)
         self.lbl_troco.grid(row=2, column=0, pady=(6,0), sticky="w")
         
         ttk.Button(frame_dir, text="Finalizar venda", command=self.finalizar_venda).grid(row=4, column=0, pady=10, sticky="we")
+        atalhos = "  ".join(f"Ctrl+{n} {forma}" for n, forma in enumerate(FORMAS_PAGAMENTO, start=1))
+        ttk.Label(frame_dir, text=f"Teclado: Enter na busca vai ao pagamento\n{atalhos}\nEnter no valor ou Ctrl+Enter finaliza",
+                  font=("Arial", 9), justify="left").grid(row=5, column=0, sticky="w")
         
         self.lbl_status = ttk.Label(container, text="0 vendas registradas | Total R$ 0,00")
-        self.lbl_status.grid(row=1, column=0, columnspan=3, sticky="w", pady=(8,0))
+        self.lbl_status.grid(row=1, column=0, columnspan=2, sticky="w", pady=(8,0))
+        self.lbl_aviso = ttk.Label(container, text="", font=self.font_total)
+        self.lbl_aviso.grid(row=1, column=2, sticky="e", pady=(8,0))
+        if self.impressao is not None:
+            self.lbl_impressao = ttk.Label(container, text=f"Impressão ({self.impressao.destino}): 0 na fila", font=("Arial", 10))
+            self.lbl_impressao.grid(row=2, column=0, columnspan=3, sticky="w")
 
         container.columnconfigure(0, weight=1)
         container.columnconfigure(1, weight=1)
         container.columnconfigure(2, weight=0)
         container.rowconfigure(0, weight=1)
 
-        self.venda_atual = []
         self._atualiza_total()
 
     def _decrementar_qtd(self):
@@ -367,58 +786,145 @@ class App(tk.Tk):
         self.ent_qtd.insert(0, str(novo_valor))
 
     def _atualiza_tree_sel_prod(self):
-        if hasattr(self, 'tree_sel_prod'):
-            for i in self.tree_sel_prod.get_children(): self.tree_sel_prod.delete(i)
-        else: return
-        for nome, preco in sorted(self.produtos.items()):
-            self.tree_sel_prod.insert("", "end", values=(nome, dinheiro(preco)))
+        if not hasattr(self, 'tree_sel_prod'): return
+        self._preencher_produtos(self.tree_sel_prod)
+        self._filtrar_produtos()
+
+    def _filtrar_produtos(self):
+        # Esconde (detach) o que não combina e reordena o resto; as linhas não são recriadas.
+        if not hasattr(self, 'tree_sel_prod'): return
+        tree = self.tree_sel_prod
+        texto = self.busca_var.get()
+        visiveis = self.motor.buscar_produtos(texto) if texto.strip() else list(self.motor.indice)
+        if tree.get_children(): tree.detach(*tree.get_children())
+        for i, nome in enumerate(visiveis):
+            tree.move(nome, "", i)
+        if visiveis and texto.strip(): tree.selection_set(visiveis[0])
+
+    def _focar_resultados(self):
+        filhos = self.tree_sel_prod.get_children()
+        if not filhos: return
+        self.tree_sel_prod.focus_set()
+        self.tree_sel_prod.focus(filhos[0])
+        self.tree_sel_prod.selection_set(filhos[0])
+
+    def _quantidade(self):
+        try: return int(self.ent_qtd.get())
+        except ValueError: return 0
+
+    def _item_adicionado(self):
+        self.redesenho.marcar("carrinho", "totais", "estoque")
+        self.ent_qtd.delete(0, tk.END)
+        self.ent_qtd.insert(0, "1")
 
     def adicionar_item_venda(self):
         sel = self.tree_sel_prod.selection()
         if not sel:
-            messagebox.showinfo("Info", "Selecione um produto para adicionar.")
+            self._avisar("Selecione um produto para adicionar.")
             return
-        nome = self.tree_sel_prod.item(sel[0], "values")[0]
-        try: qtd = int(self.ent_qtd.get())
-        except: qtd = 0
-        if qtd <= 0:
-            messagebox.showwarning("Atenção", "Quantidade deve ser um número inteiro maior que zero.")
+        try: self.motor.adicionar_item(sel[0], self._quantidade())
+        except ErroVenda as e:
+            self._avisar(str(e))
             return
-        preco = self.produtos.get(nome, 0.0)
-        self.venda_atual.append((nome, qtd, preco))
-        self._atualiza_carrinho()
-        self._atualiza_total()
-        self.ent_qtd.delete(0, tk.END)
-        self.ent_qtd.insert(0, "1")
+        self._item_adicionado()
+
+    def adicionar_por_codigo(self, codigo, qtd=None):
+        if self.tabs.select() != str(self.aba_vendas): return
+        try: nome = self.motor.adicionar_por_codigo(codigo, self._quantidade() if qtd is None else qtd)
+        except ErroVenda as e:
+            self._avisar(str(e))
+            return
+        self._item_adicionado()
+        self._notificar(f"+ {nome}", ms=3000)
+
+    def _adicionar_pela_busca(self):
+        texto = self.busca_var.get().strip()
+        qtd = None
+        if "*" in texto:
+            n, _, texto = texto.partition("*")
+            try: qtd = int(n)
+            except ValueError: qtd = 0
+            texto = texto.strip()
+        if texto.isdigit():
+            self.adicionar_por_codigo(int(texto), qtd)
+        else:
+            visiveis = self.tree_sel_prod.get_children()
+            if not visiveis: return
+            try: self.motor.adicionar_item(visiveis[0], self._quantidade() if qtd is None else qtd)
+            except ErroVenda as e:
+                self._avisar(str(e))
+                return
+            self._item_adicionado()
+            self._notificar(f"+ {visiveis[0]}", ms=3000)
+        self.busca_var.set("")
+
+    # Cada linha do carrinho tem iid "preço:nome" (a chave da linha no Carrinho);
+    # o redesenho só mexe nas linhas que o Carrinho anotou como alteradas.
+    @staticmethod
+    def _iid_linha(chave):
+        nome, preco = chave
+        return f"{preco}:{nome}"
+
+    @staticmethod
+    def _chave_linha(iid):
+        preco, _, nome = iid.partition(":")
+        return nome, int(preco)
 
     def _atualiza_carrinho(self):
-        for i in self.tree_carrinho.get_children(): self.tree_carrinho.delete(i)
-        for nome, qtd, preco in self.venda_atual:
-            subtotal = qtd * preco
-            self.tree_carrinho.insert("", "end", values=(nome, qtd, dinheiro(preco), dinheiro(subtotal)))
+        tree = self.tree_carrinho
+        limpou, chaves = self.venda_atual.alteracoes()
+        if limpou: tree.delete(*tree.get_children())
+        for chave in chaves:
+            iid = self._iid_linha(chave)
+            qtd = self.venda_atual.quantidade(chave)
+            if not qtd:
+                if tree.exists(iid): tree.delete(iid)
+                continue
+            nome, preco = chave
+            valores = (nome, qtd, dinheiro(preco), dinheiro(qtd * preco))
+            if tree.exists(iid): tree.item(iid, values=valores)
+            else: tree.insert("", "end", iid=iid, values=valores)
+
+    def _linha_selecionada(self):
+        sel = self.tree_carrinho.selection()
+        return self._chave_linha(sel[0]) if sel else None
 
     def remover_item_carrinho(self):
-        sel = self.tree_carrinho.selection()
-        if not sel: return
-        try: self.venda_atual.pop(self.tree_carrinho.index(sel[0]))
-        except IndexError: pass
-        self._atualiza_carrinho()
-        self._atualiza_total()
+        chave = self._linha_selecionada()
+        if chave is None: return
+        try: self.motor.remover_item(chave)
+        except KeyError: pass
+        self.redesenho.marcar("carrinho", "totais", "estoque")
+
+    def alterar_qtd_carrinho(self, delta):
+        chave = self._linha_selecionada()
+        if chave is None:
+            self._avisar("Selecione um item da venda.")
+            return "break"
+        try: self.motor.alterar_quantidade(chave, delta)
+        except ErroVenda as e: self._avisar(str(e))
+        self.redesenho.marcar("carrinho", "totais", "estoque")
+        return "break"
 
     def limpar_carrinho(self):
-        self.venda_atual.clear()
-        self._atualiza_carrinho()
-        self._atualiza_total()
+        self.motor.limpar_carrinho()
+        self.redesenho.marcar("carrinho", "totais", "estoque")
 
     def _total_venda_atual(self):
-        return sum(qtd * preco for _, qtd, preco in self.venda_atual)
+        return self.venda_atual.total
 
     def _atualiza_total(self):
         tot = self._total_venda_atual()
         self.lbl_total.config(text=f"Total: {dinheiro(tot)}")
-        self.lbl_status.config(text=f"{self.sessao.numero_vendas} vendas registradas | Total {dinheiro(self.sessao.total_geral)}")
-        if hasattr(self, 'lbl_resumo'): self._atualizar_resumo()
-        if hasattr(self, 'tree_historico_vendas'): self._atualizar_historico_vendas()
+        self.lbl_status.config(text=f"{self.sessao.numero_vendas} vendas registradas | Total {dinheiro(self.sessao.total_geral)}"
+                                    f" | Ritmo: {self.ritmo_vendas():.1f} vendas/min")
+
+    def ritmo_vendas(self, janela=600):
+        """Vendas por minuto neste caixa nos últimos `janela` segundos."""
+        agora = time.monotonic()
+        while self._instantes_vendas and agora - self._instantes_vendas[0] > janela:
+            self._instantes_vendas.popleft()
+        return len(self._instantes_vendas) * 60 / janela
 
     def _on_muda_pagamento(self):
         forma = self.forma_var.get()
@@ -426,37 +932,50 @@ class App(tk.Tk):
         else: self.frm_dinheiro.grid_remove()
 
     def calcular_troco(self):
-        if self.forma_var.get() != "Dinheiro":
-            self.lbl_troco.config(text="Troco: R$ 0,00")
-            return
-        total = self._total_venda_atual()
-        recebido = parse_valor(self.ent_recebido.get())
-        troco = max(0.0, recebido - total)
+        troco = self.motor.calcular_troco(self.forma_var.get(), parse_valor(self.ent_recebido.get()))
         self.lbl_troco.config(text=f"Troco: {dinheiro(troco)}")
 
+    def _escolher_pagamento(self, forma):
+        if self.tabs.select() != str(self.aba_vendas): return
+        self.forma_var.set(forma)
+        self._on_muda_pagamento()
+        if forma == "Dinheiro": self.ent_recebido.focus_set()
+
+    # Os atalhos de teclado devolvem "break" para que o Ctrl+Enter global não
+    # rode de novo sobre o Enter já tratado pelo campo.
+    def _enter_busca(self):
+        if self.busca_var.get().strip(): self._adicionar_pela_busca()
+        elif self.venda_atual:
+            # Busca vazia: dinheiro pede o valor recebido; o resto já finaliza.
+            if self.forma_var.get() == "Dinheiro": self.ent_recebido.focus_set()
+            else: self.finalizar_venda()
+        return "break"
+
+    def _finalizar_pelo_teclado(self):
+        if self.tabs.select() == str(self.aba_vendas): self.finalizar_venda()
+        return "break"
+
     def finalizar_venda(self):
         if not self.venda_atual:
-            messagebox.showinfo("Info", "Nenhum item na venda.")
+            self._avisar("Nenhum item na venda.")
             return
-        forma = self.forma_var.get()
-        total = self._total_venda_atual()
-        recebido, troco = 0.0, 0.0
-        if forma == "Dinheiro":
-            recebido = parse_valor(self.ent_recebido.get())
-            if recebido < total:
-                messagebox.showwarning("Atenção", "Valor recebido menor que o total.")
-                return
-            troco = max(0.0, recebido - total)
-
-        venda = {"itens": list(self.venda_atual), "pagamento": forma, "total": total, "recebido": recebido, "troco": troco, "datahora": datetime.now().isoformat(timespec="seconds")}
-        self.sessao.vendas.append(venda)
+        try: venda = self.motor.finalizar_venda(self.forma_var.get(), parse_valor(self.ent_recebido.get()))
+        except ErroVenda as e:
+            self._avisar(str(e))
+            return
+        self._historico_inserir(venda)
+        self._instantes_vendas.append(time.monotonic())
         
-        self.venda_atual.clear()
-        self._atualiza_carrinho()
-        self._atualiza_total()
+        self.redesenho.marcar("carrinho", "totais", "resumo")
         self.ent_recebido.delete(0, tk.END)
         self.lbl_troco.config(text="Troco: R$ 0,00")
-        messagebox.showinfo("Sucesso", "Venda registrada com sucesso!")
+        if not self.venda_rapida.get():
+            messagebox.showinfo("Sucesso", "Venda registrada com sucesso!")
+            return
+        # Próxima venda pronta: o resultado fica na faixa de aviso e o foco volta para a busca.
+        troco = f" | TROCO {dinheiro(venda.troco)}" if venda.troco else ""
+        self._notificar(f"Venda #{venda.id} OK — {dinheiro(venda.total)}{troco}", ms=10000 if troco else 4000)
+        self.ent_busca.focus_set()
 
     def _montar_aba_relatorio(self):
         container = self.aba_relatorio
@@ -471,15 +990,46 @@ class App(tk.Tk):
 
         self.lbl_resumo = ttk.Label(resumo, text="", justify="left")
         self.lbl_resumo.pack(anchor="w")
+
+        # Ritmo por intervalo (SerieVendas da sessão): atualizado junto com o resumo.
+        minutos = self.motor.largura_serie // 60
+        painel = ttk.LabelFrame(frame_esq, text=f"Ritmo de Vendas (a cada {minutos} min)", padding=8)
+        painel.pack(side="top", fill="x", pady=(8,0))
+        self.lbl_painel = ttk.Label(painel, text="", justify="left", font=("Courier", 10))
+        self.lbl_painel.pack(anchor="w")
         self._atualizar_resumo()
+        self.after(30000, self._tique_painel)
 
         botoes = ttk.Frame(frame_esq)
         botoes.pack(side="top", pady=12, fill="x")
         
         ttk.Button(botoes, text="Salvar Vendas", command=self.salvar_vendas_sessao).pack(fill="x")
         ttk.Button(botoes, text="Gerar Relatório (PDF/TXT)", command=self.gerar_relatorio).pack(fill="x", pady=(4,0))
-        ttk.Button(botoes, text="Atualizar Dados", command=self._atualiza_total).pack(fill="x", pady=(4,0))
+        ttk.Button(botoes, text="Atualizar Dados", command=self._atualizar_dados).pack(fill="x", pady=(4,0))
         ttk.Button(botoes, text="Excluir Venda Selecionada", command=self.excluir_venda).pack(fill="x", pady=(4,0))
+
+        # Aviso com "Desfazer" logo abaixo dos botões após uma exclusão (não há confirmação).
+        self.frm_desfazer = ttk.Frame(frame_esq)
+        self.lbl_desfazer = ttk.Label(self.frm_desfazer, text="", foreground="#1b5e20")
+        self.lbl_desfazer.pack(side="left")
+        self.btn_desfazer = ttk.Button(self.frm_desfazer, text="Desfazer")
+        self.btn_desfazer.pack(side="right")
+
+        self.frm_progresso = ttk.Frame(frame_esq)
+        self.lbl_progresso = ttk.Label(self.frm_progresso, text="Gerando relatório...")
+        self.lbl_progresso.pack(anchor="w")
+        self.barra_progresso = ttk.Progressbar(self.frm_progresso, mode="determinate")
+        self.barra_progresso.pack(fill="x", pady=(2,0))
+
+        # Painel de diagnóstico, escondido: F12 mostra/esconde.
+        self.frm_diagnostico = ttk.LabelFrame(frame_esq, text="Diagnóstico (F12)", padding=6)
+        self.txt_diagnostico = tk.Text(self.frm_diagnostico, width=60, height=16, font=("Courier", 9), wrap="none")
+        self.txt_diagnostico.pack(fill="both", expand=True)
+        botoes_diag = ttk.Frame(self.frm_diagnostico)
+        botoes_diag.pack(fill="x", pady=(4,0))
+        ttk.Button(botoes_diag, text="Salvar em arquivo", command=self.salvar_diagnostico).pack(side="left")
+        ttk.Button(botoes_diag, text="Zerar", command=self._zerar_diagnostico).pack(side="left", padx=(4,0))
+        self._diagnostico_after = None
         
         hist_frame = ttk.LabelFrame(container, text="Histórico de Vendas da Sessão", padding=8)
         hist_frame.grid(row=0, column=1, sticky="nsew")
@@ -501,18 +1051,103 @@ class App(tk.Tk):
         self.tree_historico_vendas.heading("Total", text="Total")
         self.tree_historico_vendas.column("Total", width=110, anchor="e")
 
-        yscroll = ttk.Scrollbar(hist_frame, orient="vertical", command=self.tree_historico_vendas.yview)
-        self.tree_historico_vendas.configure(yscroll=yscroll.set)
+        yscroll = ttk.Scrollbar(hist_frame, orient="vertical")
         yscroll.grid(row=0, column=1, sticky="ns")
 
-    def _atualizar_historico_vendas(self):
-        for i in self.tree_historico_vendas.get_children(): self.tree_historico_vendas.delete(i)
-        for i, venda in enumerate(self.sessao.vendas):
-            venda_id, hora = i + 1, "N/A"
-            try: hora = datetime.fromisoformat(venda["datahora"]).strftime("%H:%M:%S")
-            except: pass
-            itens_str = ", ".join([f"{nome} (x{qtd})" for nome, qtd, _ in venda["itens"]])
-            self.tree_historico_vendas.insert("", "end", values=(venda_id, hora, itens_str, venda["pagamento"], dinheiro(venda["total"])))
+        # Filtro, busca por número e paginação. A Treeview só guarda as linhas
+        # visíveis; a barra de rolagem é do HistoricoVirtual, não da Treeview.
+        filtros = ttk.Frame(hist_frame)
+        filtros.grid(row=1, column=0, columnspan=2, sticky="ew", pady=(6,0))
+        ttk.Label(filtros, text="Pagamento:").pack(side="left")
+        self.filtro_pag_var = tk.StringVar(value="Todas")
+        ttk.Combobox(filtros, textvariable=self.filtro_pag_var, values=("Todas",) + tuple(FORMAS_PAGAMENTO),
+                     state="readonly", width=10).pack(side="left", padx=(4,8))
+        ttk.Label(filtros, text="De").pack(side="left")
+        self.ent_filtro_de = ttk.Entry(filtros, width=6)
+        self.ent_filtro_de.pack(side="left", padx=(4,4))
+        ttk.Label(filtros, text="até").pack(side="left")
+        self.ent_filtro_ate = ttk.Entry(filtros, width=6)
+        self.ent_filtro_ate.pack(side="left", padx=(4,8))
+        ttk.Button(filtros, text="Filtrar", command=self.filtrar_historico).pack(side="left")
+        ttk.Button(filtros, text="Limpar", command=self.limpar_filtro_historico).pack(side="left", padx=(4,12))
+        ttk.Label(filtros, text="Ir para #").pack(side="left")
+        self.ent_ir_venda = ttk.Entry(filtros, width=7)
+        self.ent_ir_venda.pack(side="left", padx=(4,0))
+        self.ent_ir_venda.bind("<Return>", lambda e: self.ir_para_venda())
+        for ent in (self.ent_filtro_de, self.ent_filtro_ate):
+            ent.bind("<Return>", lambda e: self.filtrar_historico())
+
+        paginas = ttk.Frame(hist_frame)
+        paginas.grid(row=2, column=0, columnspan=2, sticky="ew", pady=(4,0))
+        ttk.Button(paginas, text="◀ Página", command=lambda: self.historico.rolar("scroll", -1, "pages")).pack(side="left")
+        ttk.Button(paginas, text="Página ▶", command=lambda: self.historico.rolar("scroll", 1, "pages")).pack(side="left", padx=(4,0))
+        lbl_posicao = ttk.Label(paginas, text="")
+        lbl_posicao.pack(side="right")
+
+        self.historico = HistoricoVirtual(self.tree_historico_vendas, yscroll, lbl_posicao,
+                                          lambda: self.sessao, self._linha_historico)
+        self.redesenho.marcar("historico")
+
+    # O histórico é uma janela sobre a sessão (HistoricoVirtual): finalizar só
+    # avisa a janela da venda nova; excluir, recuperar e nova sessão invalidam
+    # as posições filtradas. Redesenhar custa só as linhas visíveis.
+    def _linha_historico(self, venda):
+        hora = venda.datahora[11:19]
+        itens_str = ", ".join([f"{nome} (x{qtd})" for nome, qtd, _ in venda.itens])
+        return (venda.id, hora, itens_str, venda.pagamento, dinheiro(venda.total))
+
+    def _historico_inserir(self, venda):
+        if self.historico is not None: self.historico.venda_adicionada(venda)
+        self.redesenho.marcar("historico")
+
+    def _historico_remover(self, venda_id):
+        self._invalidar_historico()
+        self.redesenho.marcar("historico")
+
+    def _invalidar_historico(self):
+        # Antes da aba Relatório existir não há janela para invalidar: ela
+        # nasce já com a sessão atual.
+        if self.historico is not None: self.historico.invalidar()
+
+    def _aplicar_historico(self):
+        self.historico.desenhar()
+
+    def _atualizar_dados(self):
+        self._invalidar_historico()
+        self.redesenho.marcar("carrinho", "totais", "resumo", "historico", "estoque")
+
+    @staticmethod
+    def _ler_hora(texto):
+        """'HH:MM' -> segundos do dia; vazio -> None."""
+        texto = texto.strip()
+        if not texto: return None
+        h = datetime.strptime(texto, "%H:%M")
+        return h.hour * 3600 + h.minute * 60
+
+    def filtrar_historico(self):
+        try: de, ate = self._ler_hora(self.ent_filtro_de.get()), self._ler_hora(self.ent_filtro_ate.get())
+        except ValueError:
+            messagebox.showwarning("Filtro", "Informe os horários no formato HH:MM (ex.: 19:30).")
+            return
+        forma = self.filtro_pag_var.get()
+        self.historico.filtrar(None if forma == "Todas" else forma, de, ate)
+
+    def limpar_filtro_historico(self):
+        self.filtro_pag_var.set("Todas")
+        self.ent_filtro_de.delete(0, tk.END)
+        self.ent_filtro_ate.delete(0, tk.END)
+        self.historico.filtrar()
+
+    def ir_para_venda(self):
+        texto = self.ent_ir_venda.get().strip().lstrip("#")
+        if not texto.isdigit():
+            messagebox.showwarning("Histórico", "Digite o número da venda.")
+            return
+        if not self.historico.ir_para_venda(int(texto)):
+            filtro = " com o filtro atual" if self.historico.filtrado else ""
+            messagebox.showinfo("Histórico", f"Venda #{texto} não encontrada{filtro}.")
+            return
+        self.tree_historico_vendas.focus_set()
 
     def excluir_venda(self):
         sel = self.tree_historico_vendas.selection()
@@ -520,41 +1155,174 @@ class App(tk.Tk):
             messagebox.showinfo("Info", "Selecione uma venda na lista de histórico para excluir.")
             return
         
-        dados_venda = self.tree_historico_vendas.item(sel[0], "values")
-        venda_id = int(dados_venda[0])
-        venda_idx = venda_id - 1
+        venda_id = int(sel[0])
         
-        if messagebox.askyesno("Confirmação", f"Tem certeza que deseja excluir a Venda #{venda_id}?\n\nEsta ação não pode ser desfeita."):
-            try:
-                self.sessao.vendas.pop(venda_idx)
-                self._atualiza_total()
-                messagebox.showinfo("Sucesso", f"Venda #{venda_id} foi excluída.")
-            except IndexError:
-                messagebox.showerror("Erro", "Não foi possível encontrar a venda para excluir. Tente atualizar os dados.")
+        # Sem confirmação: a exclusão é desfeita pelo aviso ou por Ctrl+Z.
+        try:
+            self.motor.excluir_venda(venda_id)
+        except (IndexError, ValueError):
+            messagebox.showerror("Erro", "Não foi possível encontrar a venda para excluir. Tente atualizar os dados.")
+            return
+        self._historico_remover(venda_id)
+        self.redesenho.marcar("totais", "resumo", "estoque")
+        self._notificar(f"Venda #{venda_id} excluída. Ctrl+Z desfaz.")
+        self._oferecer_desfazer(f"Venda #{venda_id} excluída.")
+
+    def _oferecer_desfazer(self, texto):
+        # O botão só desfaz a operação que acabou de ser feita; depois dela, é o Ctrl+Z.
+        op = self.motor.a_desfazer
+        def desfazer():
+            self._esconder_desfazer()
+            if self.motor.a_desfazer is op: self.desfazer()
+            else: self._avisar("Outra operação foi feita depois; use Editar > Desfazer.")
+        if self._desfazer_after is not None: self.after_cancel(self._desfazer_after)
+        self.lbl_desfazer.config(text=texto)
+        self.btn_desfazer.config(command=desfazer)
+        self.frm_desfazer.pack(side="top", fill="x", pady=(0,8))
+        self._desfazer_after = self.after(15000, self._esconder_desfazer)
+
+    def _esconder_desfazer(self):
+        # Sem aviso à mostra (ou sem a aba Relatório montada), não há o que esconder.
+        if self._desfazer_after is None: return
+        self.after_cancel(self._desfazer_after)
+        self._desfazer_after = None
+        self.frm_desfazer.pack_forget()
+
+    # Desfazer / refazer: vendas finalizadas e exclusões, sem confirmação; uma desfaz a outra.
+    def _descrever_operacao(self, tipo, venda, desfazendo):
+        rotulo = f"Venda #{venda.id} ({dinheiro(venda.total)})"
+        if (tipo == "venda") == desfazendo: return f"cancelar a {rotulo}"
+        return f"restaurar a {rotulo}" if desfazendo else f"registrar de novo a {rotulo}"
+
+    def _inverter_operacao(self, desfazendo):
+        op = self.motor.a_desfazer if desfazendo else self.motor.a_refazer
+        if op is None:
+            self._avisar("Nada para desfazer." if desfazendo else "Nada para refazer.")
+            return
+        acao = self._descrever_operacao(*op, desfazendo)
+        try: self.motor.desfazer() if desfazendo else self.motor.refazer()
+        except ValueError as e:
+            messagebox.showerror("Erro", f"Não foi possível {acao}.\n{e}")
+            return
+        self._esconder_desfazer()
+        self._invalidar_historico()
+        self.redesenho.marcar("totais", "resumo", "historico", "estoque")
+        self._notificar(f"Feito: {acao}. " + ("Ctrl+Y refaz." if desfazendo else "Ctrl+Z desfaz."))
+
+    def desfazer(self):
+        self._inverter_operacao(desfazendo=True)
+
+    def refazer(self):
+        self._inverter_operacao(desfazendo=False)
 
     def _texto_resumo(self):
-        linhas = [
-            f"Vendas: {self.sessao.numero_vendas}",
-            f"Total arrecadado: {dinheiro(self.sessao.total_geral)}",
-            f"Ticket médio: {dinheiro(self.sessao.ticket_medio)}",
-            "", "Vendido por produto:"
-        ]
-        tpp = self.sessao.total_por_produto
-        if not tpp:
-            linhas.append("  (nenhuma venda ainda)")
-        else:
-            linhas.extend([f"  - {nome}: {int(qtd)} un." for nome, qtd in sorted(tpp.items())])
-        
-        linhas.extend(["", "Por forma de pagamento:"])
-        tpg = self.sessao.total_por_pagamento
-        linhas.extend([f"  - {k}: {dinheiro(tpg.get(k,0.0))}" for k in ["Dinheiro","Débito","Crédito","Pix"]])
-        
-        return "\n".join(linhas)
+        return texto_resumo(self.sessao.modelo_relatorio())
 
     def _atualizar_resumo(self):
         self.lbl_resumo.config(text=self._texto_resumo())
+        self.lbl_painel.config(text=texto_painel(self.sessao.serie))
+
+    def _tique_painel(self):
+        # O intervalo atual avança com o relógio mesmo sem vendas novas.
+        self.redesenho.marcar("resumo")
+        self.after(30000, self._tique_painel)
+
+    # Diagnóstico
+
+    def alternar_diagnostico(self):
+        self._construir_aba(self.aba_relatorio)
+        if self._diagnostico_after is not None:
+            self.after_cancel(self._diagnostico_after)
+            self._diagnostico_after = None
+            self.frm_diagnostico.pack_forget()
+            return
+        self.frm_diagnostico.pack(side="top", fill="both", expand=True, pady=(12,0))
+        self.tabs.select(self.aba_relatorio)
+        self._atualizar_diagnostico()
+
+    def _texto_diagnostico(self):
+        partes = []
+        if self.instrumentacao is None:
+            partes.append("Instrumentação desligada. Abra o caixa com --diagnostico para medir as operações.")
+        else:
+            partes.append(self.instrumentacao.texto())
+        partes.append(f"\nRedesenho: {self.redesenho.estatisticas()}")
+        partes.append(f"Vendas na sessão: {self.sessao.numero_vendas} | Ritmo: {self.ritmo_vendas():.1f} vendas/min (10 min)")
+        return "\n".join(partes)
+
+    def _atualizar_diagnostico(self):
+        self.txt_diagnostico.delete("1.0", tk.END)
+        self.txt_diagnostico.insert("1.0", self._texto_diagnostico())
+        self._diagnostico_after = self.after(2000, self._atualizar_diagnostico)
+
+    def _zerar_diagnostico(self):
+        if self.instrumentacao is not None: self.instrumentacao.zerar()
+
+    def salvar_diagnostico(self):
+        if self.instrumentacao is None:
+            messagebox.showinfo("Diagnóstico", "Instrumentação desligada. Abra o caixa com --diagnostico.")
+            return
+        nome_sugestao = f"diagnostico_{datetime.now().strftime('%Y-%m-%d_%H-%M')}.json"
+        caminho = filedialog.asksaveasfilename(title="Salvar diagnóstico", defaultextension=".json",
+                                               filetypes=[("JSON", "*.json")], initialfile=nome_sugestao)
+        if not caminho: return
+        try:
+            self.instrumentacao.salvar(caminho, {"redesenho": self.redesenho.estatisticas(),
+                                                 "vendas": self.sessao.numero_vendas})
+        except OSError as e:
+            messagebox.showerror("Erro", f"Falha ao salvar o diagnóstico.\n{e}")
+            return
+        self._notificar(f"Diagnóstico salvo em {caminho}")
+
+    def _avisar(self, texto):
+        # Problemas no fluxo da venda: faixa vermelha na venda rápida, janela modal fora dela.
+        if self.venda_rapida.get():
+            self.bell()
+            self._notificar(texto, erro=True)
+        else:
+            messagebox.showwarning("Atenção", texto)
+
+    def _notificar(self, texto, ms=8000, erro=False):
+        # Aviso não modal na barra de status da aba Vendas.
+        if self._aviso_after is not None: self.after_cancel(self._aviso_after)
+        self.lbl_aviso.config(text=texto, foreground="#b00020" if erro else "#1b5e20")
+        self._aviso_after = self.after(ms, lambda: self.lbl_aviso.config(text=""))
+
+    # Relatório e exportação rodam em outra thread sobre uma cópia da sessão;
+    # o caixa continua vendendo e a barra de progresso é atualizada por polling.
+    # Só uma tarefa de arquivo por vez.
+    def _tarefa_ocupada(self):
+        if self._tarefa is None: return False
+        messagebox.showinfo("Aguarde", "Já há um relatório ou exportação em andamento. Aguarde terminar.")
+        return True
+
+    def _iniciar_tarefa(self, tarefa, descricao, msg_ok, msg_erro):
+        self._tarefa = tarefa.iniciar()
+        self._tarefa_textos = (descricao, msg_ok, msg_erro)
+        self._construir_aba(self.aba_relatorio)
+        self.barra_progresso.config(maximum=max(1, tarefa.total), value=0)
+        self.frm_progresso.pack(side="top", fill="x")
+        self.after(100, self._acompanhar_tarefa)
+
+    def _acompanhar_tarefa(self):
+        tarefa = self._tarefa
+        descricao, msg_ok, msg_erro = self._tarefa_textos
+        self.barra_progresso.config(value=tarefa.feito)
+        self.lbl_progresso.config(text=f"{descricao}... {tarefa.feito}/{tarefa.total} vendas")
+        if not tarefa.concluida:
+            self.after(100, self._acompanhar_tarefa)
+            return
+        self._tarefa = None
+        self.frm_progresso.pack_forget()
+        if self.instrumentacao is not None and tarefa.duracao is not None:
+            self.instrumentacao.registrar(type(tarefa).__name__, tarefa.duracao * 1000)
+        if tarefa.erro is not None:
+            messagebox.showerror("Erro", f"{msg_erro}\n{tarefa.erro}")
+        else:
+            self._notificar(f"{msg_ok} {tarefa.caminho}")
 
     def gerar_relatorio(self):
+        if self._tarefa_ocupada(): return
         if self.sessao.numero_vendas == 0:
             if not messagebox.askyesno("Relatório", "Nenhuma venda registrada. Deseja gerar mesmo assim?"):
                 return
@@ -564,21 +1332,19 @@ class App(tk.Tk):
         caminho = filedialog.asksaveasfilename(title="Salvar relatório", defaultextension=tipos[0][1].replace("*",""), filetypes=tipos, initialfile=nome_sugestao)
         if not caminho: return
 
-        try:
-            if REPORTLAB_OK and caminho.lower().endswith(".pdf"): self._gerar_pdf(caminho)
-            else: self._gerar_txt(caminho)
-            messagebox.showinfo("Sucesso", f"Relatório salvo em:\n{caminho}")
-        except Exception as e:
-            messagebox.showerror("Erro", f"Falha ao gerar relatório.\n{e}")
+        pdf = REPORTLAB_OK and caminho.lower().endswith(".pdf")
+        self._iniciar_tarefa(TarefaRelatorio(self.sessao, caminho, pdf), "Gerando relatório",
+                             "Relatório salvo em", "Falha ao gerar relatório.")
     
     def salvar_vendas_sessao(self):
+        if self._tarefa_ocupada(): return
         if self.sessao.numero_vendas == 0:
             messagebox.showinfo("Info", "Nenhuma venda para salvar.")
             return
 
         data_str = datetime.now().strftime("%Y-%m-%d_%H-%M")
         nome_sugestao = f"vendas_{data_str}.json"
-        tipos = [("JSON", "*.json")]
+        tipos = [("JSON", "*.json"), ("NDJSON (uma venda por linha)", "*.ndjson")]
         
         caminho = filedialog.asksaveasfilename(
             title="Salvar vendas da sessão",
@@ -588,101 +1354,69 @@ class App(tk.Tk):
         )
         if not caminho: return
 
-        try:
-            with open(caminho, "w", encoding="utf-8") as f:
-                json.dump(self.sessao.vendas, f, ensure_ascii=False, indent=4)
-            messagebox.showinfo("Sucesso", f"Vendas salvas em:\n{caminho}")
-        except Exception as e:
-            messagebox.showerror("Erro", f"Falha ao salvar as vendas.\n{e}")
+        self._iniciar_tarefa(TarefaExportacao(self.sessao, caminho), "Salvando vendas",
+                             "Vendas salvas em", "Falha ao salvar as vendas.")
+
+    def nova_sessao(self):
+        if not messagebox.askyesno("Nova Sessão", "Encerrar a sessão atual e começar uma nova?\nAs vendas não salvas em arquivo serão descartadas."):
+            return
+        self.motor.nova_sessao()
+        self._atualizar_dados()
 
     def _ao_fechar(self):
-        if messagebox.askyesno("Sair", "Deseja realmente sair?\nAs vendas não salvas serão perdidas."):
+        if messagebox.askyesno("Sair", "Deseja realmente sair?\nAs vendas da sessão ficam guardadas e serão recuperadas ao abrir o caixa novamente."):
+            self.armazenamento.fechar()
+            if self.envio is not None: self.envio.fechar()
+            if self.impressao is not None: self._fechar_impressao()
             self.destroy()
 
-    def _gerar_pdf(self, caminho_pdf: str):
-        c = canvas.Canvas(caminho_pdf, pagesize=A4)
-        _, altura = A4
-        x_margin = 2 * cm
-        y = altura - 2 * cm
-
-        def linha(txt, bold=False, jump=14):
-            nonlocal y
-            c.setFont("Helvetica-Bold" if bold else "Helvetica", 11)
-            c.drawString(x_margin, y, txt)
-            y -= jump
-
-        linha("Relatório de Vendas - Quermesse", bold=True, jump=18)
-        linha("Gerado em: " + datetime.now().strftime("%d/%m/%Y %H:%M"))
-        linha(f"Vendas: {self.sessao.numero_vendas}")
-        linha(f"Total arrecadado: {dinheiro(self.sessao.total_geral)}")
-        linha(f"Ticket médio: {dinheiro(self.sessao.ticket_medio)}")
-        y -= 8
-
-        linha("Vendido por produto:", bold=True, jump=16)
-        tpp = self.sessao.total_por_produto
-        if not tpp:
-            linha("  (nenhuma venda)", jump=16)
-        else:
-            for nome, qtd in sorted(tpp.items()):
-                linha(f"  - {nome}: {int(qtd)} un.")
-        y -= 8
-
-        linha("Por forma de pagamento:", bold=True, jump=16)
-        tpg = self.sessao.total_por_pagamento
-        for k in ["Dinheiro","Débito","Crédito","Pix"]:
-            linha(f"  - {k}: {dinheiro(tpg.get(k,0.0))}")
-        y -= 8
-
-        linha("Vendas detalhadas:", bold=True, jump=16)
-        if not self.sessao.vendas:
-            linha("  (nenhuma venda)")
-        else:
-            for i, v in enumerate(self.sessao.vendas, start=1):
-                if y < 4 * cm:
-                    c.showPage()
-                    y = altura - 2 * cm
-                linha(f"Venda #{i} - {v['datahora']} - {v['pagamento']} - Total {dinheiro(v['total'])}", bold=True)
-                for nome, qtd, preco in v["itens"]:
-                    if y < 3 * cm:
-                        c.showPage()
-                        y = altura - 2 * cm
-                    linha(f"   • {nome} x{qtd} @ {dinheiro(preco)} = {dinheiro(qtd*preco)}", bold=False)
-                if v["pagamento"] == "Dinheiro":
-                    linha(f"     Recebido: {dinheiro(v['recebido'])} | Troco: {dinheiro(v['troco'])}")
-                y -= 6
-        c.save()
-
-    def _gerar_txt(self, caminho_txt: str):
-        with open(caminho_txt, "w", encoding="utf-8") as f:
-            f.write("Relatório de Vendas - Quermesse\n")
-            f.write(f"Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}\n")
-            f.write(f"Vendas: {self.sessao.numero_vendas}\n")
-            f.write(f"Total arrecadado: {dinheiro(self.sessao.total_geral)}\n")
-            f.write(f"Ticket médio: {dinheiro(self.sessao.ticket_medio)}\n")
-            f.write("\nVendido por produto:\n")
-            tpp = self.sessao.total_por_produto
-            if not tpp:
-                f.write("  (nenhuma venda)\n")
-            else:
-                for nome, qtd in sorted(tpp.items()):
-                    f.write(f"  - {nome}: {int(qtd)} un.\n")
-            f.write("\nPor forma de pagamento:\n")
-            tpg = self.sessao.total_por_pagamento
-            for k in ["Dinheiro","Débito","Crédito","Pix"]:
-                f.write(f"  - {k}: {dinheiro(tpg.get(k,0.0))}\n")
-            f.write("\nVendas detalhadas:\n")
-            if not self.sessao.vendas:
-                f.write("  (nenhuma venda)\n")
-            else:
-                for i, v in enumerate(self.sessao.vendas, start=1):
-                    f.write(f"Venda #{i} - {v['datahora']} - {v['pagamento']} - Total {dinheiro(v['total'])}\n")
-                    for nome, qtd, preco in v["itens"]:
-                        f.write(f"   • {nome} x{qtd} @ {dinheiro(preco)} = {dinheiro(qtd*preco)}\n")
-                    if v["pagamento"] == "Dinheiro":
-                        f.write(f"     Recebido: {dinheiro(v['recebido'])} | Troco: {dinheiro(v['troco'])}\n")
-                    f.write("\n")
+    def _fechar_impressao(self):
+        # Espera a fila esvaziar; o que sobrar fica em disco e é impresso ao abrir o caixa de novo.
+        try: restantes = self.impressao.fechar()
+        except OSError as e:
+            messagebox.showerror("Impressão", f"Não foi possível guardar as comandas ainda não impressas.\n{e}")
+            return
+        if restantes:
+            messagebox.showinfo("Impressão", f"{restantes} comanda(s) ainda não impressa(s) ficaram guardadas em "
+                                f"{self.impressao.arq_pendentes} e serão impressas ao abrir o caixa novamente.")
 
 
 if __name__ == "__main__":
-    app = App()
+    parser = argparse.ArgumentParser(description="Caixa de Quermesse")
+    parser.add_argument("--banco", help="grava catálogo e vendas num banco SQLite (ex.: caixa.db)")
+    parser.add_argument("--evento", help="nome do evento no banco (padrão: o último aberto no caixa; no primeiro uso, a data de hoje)")
+    parser.add_argument("--agregador", help="URL do agregador do modo multi-terminal (ex.: http://192.168.0.10:8765)")
+    parser.add_argument("--terminal", help="identificação deste caixa no agregador")
+    parser.add_argument("--impressora", help="imprime comandas da cozinha: pasta ou tcp://IP:9100 (impressora térmica)")
+    parser.add_argument("--cupom", action="store_true", help="com --impressora, imprime também o cupom do cliente")
+    parser.add_argument("--diagnostico", action="store_true", help="mede as operações do caixa (painel F12 na aba Relatório)")
+    parser.add_argument("--lento", type=float, default=50.0, help="chamadas acima deste tempo (ms) vão para caixa_lento.log")
+    parser.add_argument("--intervalo", type=int, default=LARGURA_PADRAO // 60, help="minutos por intervalo no painel de ritmo")
+    parser.add_argument("--retencao", type=float, default=24.0, help="horas de intervalos guardadas pelo painel de ritmo")
+    args = parser.parse_args()
+    if args.agregador and not args.terminal: parser.error("--agregador exige --terminal")
+    if args.cupom and not args.impressora: parser.error("--cupom exige --impressora")
+    if args.intervalo <= 0 or args.retencao <= 0: parser.error("--intervalo e --retencao precisam ser positivos")
+    armazenamento = None
+    if args.banco:
+        from armazenamento import ArmazenamentoSQLite
+        armazenamento = ArmazenamentoSQLite(args.banco)
+        # Sem --evento, continua no evento atual (o de uma Nova Sessão, inclusive).
+        armazenamento.usar_evento(args.evento or armazenamento.evento_atual() or datetime.now().strftime("%Y-%m-%d"))
+    envio = None
+    if args.agregador:
+        from rede import EnvioTerminal
+        envio = EnvioTerminal(args.agregador, args.terminal)
+    impressao = None
+    if args.impressora:
+        from impressao import FilaImpressao, destino
+        impressao = FilaImpressao(destino(args.impressora), cupom=args.cupom)
+    instrumentacao = None
+    if args.diagnostico:
+        log_lento = logging.FileHandler("caixa_lento.log", encoding="utf-8")
+        log_lento.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logging.getLogger("caixa.lento").addHandler(log_lento)
+        instrumentacao = Instrumentacao(limite_lento=args.lento)
+    largura = args.intervalo * 60
+    app = App(armazenamento, envio, instrumentacao, largura, max(1, int(args.retencao * 3600 // largura)), impressao)
     app.mainloop()
\ No newline at end of file
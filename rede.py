@@ -0,0 +1,304 @@
+# rede.py
+# Modo multi-terminal: vários caixas enviam as vendas para um agregador na
+# rede local (HTTP + JSON). Cada terminal numera suas operações (venda ou
+# exclusão) com um `seq` crescente e as guarda numa fila em disco antes de
+# enviar; sem rede, o caixa continua vendendo e a fila é enviada em lote
+# quando o agregador voltar. O agregador descarta (terminal, seq) repetidos,
+# então reenviar é sempre seguro.
+#   python rede.py agregador --porta 8765
+#   python main.py --agregador http://192.168.0.10:8765 --terminal caixa1
+#   python rede.py terminal http://127.0.0.1:8765 --terminal t1 vendas_*.json
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from caixa import CaixaSessao, MotorCaixa, Venda, dinheiro, iterar_vendas, texto_resumo
+
+PORTA = 8765
+
+
+# -----------------------
+# Terminal
+# -----------------------
+class EnvioTerminal:
+    """Fila de envio de um terminal. `registrar_venda`/`excluir_venda` só
+    gravam na fila (nunca bloqueiam o caixa); uma thread envia os pendentes em
+    lotes e tenta de novo, com espera crescente, enquanto o agregador não responde.
+
+    A fila fica em `caminho` (NDJSON) e o último seq confirmado em `caminho.ack`,
+    para que o que não foi enviado sobreviva a um fechamento do programa.
+    """
+
+    def __init__(self, url, terminal, caminho=None, lote=200, intervalo=1.0, espera_max=30.0):
+        self.url = url.rstrip("/")
+        self.terminal = terminal
+        self.caminho = caminho or f"fila_envio_{terminal}.ndjson"
+        self.lote = lote
+        self.intervalo = intervalo
+        self.espera_max = espera_max
+        self.online = None
+        self.erro = None
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = False
+        self._confirmado = self._ler_ack()
+        self._pendentes = [r for r in self._ler_fila() if r["seq"] > self._confirmado]
+        self._seq = max([self._confirmado] + [r["seq"] for r in self._pendentes])
+        self._arq = open(self.caminho, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._executar, daemon=True)
+        self._thread.start()
+
+    @property
+    def pendentes(self):
+        return len(self._pendentes)
+
+    # Fila em disco
+
+    def _ler_ack(self):
+        try:
+            with open(self.caminho + ".ack", "r", encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _ler_fila(self):
+        if not os.path.exists(self.caminho): return []
+        registros = []
+        with open(self.caminho, "r", encoding="utf-8") as f:
+            for linha in f:
+                try: registros.append(json.loads(linha))
+                except ValueError: continue  # última linha truncada
+        return registros
+
+    def _enfileirar(self, registro):
+        with self._lock:
+            self._seq += 1
+            registro["seq"] = self._seq
+            self._arq.write(json.dumps(registro, ensure_ascii=False, separators=(",", ":")) + "\n")
+            self._arq.flush()
+            self._pendentes.append(registro)
+        self._acordar.set()
+
+    def registrar_venda(self, venda):
+        self._enfileirar({"op": "+", "venda": venda.para_dict()})
+
+    def excluir_venda(self, venda_id):
+        self._enfileirar({"op": "-", "id": venda_id})
+
+    def _confirmar(self, seq):
+        with self._lock:
+            self._pendentes = [r for r in self._pendentes if r["seq"] > seq]
+            self._confirmado = seq
+            tmp = self.caminho + ".ack.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(str(seq))
+            os.replace(tmp, self.caminho + ".ack")
+            if not self._pendentes:
+                # Tudo confirmado: a fila pode recomeçar vazia.
+                self._arq.close()
+                self._arq = open(self.caminho, "w", encoding="utf-8")
+
+    # Envio
+
+    def _enviar(self, registros):
+        corpo = json.dumps({"terminal": self.terminal, "operacoes": registros}, ensure_ascii=False).encode("utf-8")
+        req = urllib.request.Request(self.url + "/operacoes", corpo, {"Content-Type": "application/json"})
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return json.load(resp)["confirmado"]
+
+    def _executar(self):
+        espera = self.intervalo
+        while not self._parar:
+            self._acordar.wait(espera)
+            self._acordar.clear()
+            with self._lock:
+                lote = self._pendentes[:self.lote]
+            if not lote:
+                espera = self.intervalo
+                continue
+            try:
+                self._confirmar(self._enviar(lote))
+                self.online, self.erro = True, None
+                # Ainda há fila: manda o próximo lote sem esperar.
+                espera = 0 if self._pendentes else self.intervalo
+            except (OSError, ValueError, KeyError) as e:
+                self.online, self.erro = False, e
+                espera = min(self.espera_max, max(self.intervalo, espera * 2))
+
+    def sincronizar(self, timeout=10.0):
+        """Espera a fila esvaziar (ou o tempo acabar). Retorna True se tudo foi confirmado."""
+        limite = time.monotonic() + timeout
+        while self._pendentes and time.monotonic() < limite:
+            self._acordar.set()
+            time.sleep(0.05)
+        return not self._pendentes
+
+    def fechar(self):
+        self._parar = True
+        self._acordar.set()
+        self._thread.join(timeout=6)
+        with self._lock:
+            self._arq.close()
+
+
+# -----------------------
+# Agregador
+# -----------------------
+class Agregador:
+    """Soma as vendas de todos os terminais numa única CaixaSessao.
+
+    Cada operação recebida é gravada em `caminho` (NDJSON) antes de ser
+    aplicada, e o arquivo é reaplicado ao iniciar, então os totais e a
+    deduplicação sobrevivem a um reinício do agregador.
+    """
+
+    def __init__(self, caminho="agregador.ndjson"):
+        self.caminho = caminho
+        self.sessao = CaixaSessao()
+        self.ultimo_seq = {}       # terminal -> maior seq aplicado
+        self._ids = {}             # (terminal, id da venda no terminal) -> id no agregador
+        self.por_terminal = {}     # terminal -> [nº de vendas, total em centavos]
+        self._lock = threading.Lock()
+        if os.path.exists(caminho):
+            with open(caminho, "r", encoding="utf-8") as f:
+                for linha in f:
+                    try: reg = json.loads(linha)
+                    except ValueError: continue
+                    self._aplicar(reg["terminal"], reg)
+        self._arq = open(caminho, "a", encoding="utf-8")
+
+    def _aplicar(self, terminal, reg):
+        if reg["seq"] <= self.ultimo_seq.get(terminal, 0): return False
+        self.ultimo_seq[terminal] = reg["seq"]
+        conta = self.por_terminal.setdefault(terminal, [0, 0])
+        if reg["op"] == "+":
+            dados = dict(reg["venda"], id=None)
+            venda = self.sessao.adicionar_venda(Venda.de_dict(dados))
+            self._ids[terminal, reg["venda"].get("id")] = venda.id
+            conta[0] += 1
+            conta[1] += venda.total
+        else:
+            vid = self._ids.pop((terminal, reg["id"]), None)
+            if vid is not None:
+                venda = self.sessao.remover_venda(vid)
+                conta[0] -= 1
+                conta[1] -= venda.total
+        return True
+
+    def receber(self, terminal, operacoes):
+        """Aplica as operações novas (em ordem de seq) e devolve o último seq do terminal."""
+        with self._lock:
+            novas = []
+            for reg in sorted(operacoes, key=lambda r: r["seq"]):
+                reg = dict(reg, terminal=terminal)
+                if self._aplicar(terminal, reg): novas.append(reg)
+            if novas:
+                self._arq.write("".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in novas))
+                self._arq.flush()
+                os.fsync(self._arq.fileno())
+            return self.ultimo_seq.get(terminal, 0)
+
+    def totais(self):
+        with self._lock:
+            s = self.sessao
+            return {"numero_vendas": s.numero_vendas, "total_geral": s.total_geral,
+                    "por_produto": s.total_por_produto, "por_pagamento": s.total_por_pagamento,
+                    "por_terminal": {t: {"vendas": n, "total": v, "seq": self.ultimo_seq.get(t, 0)}
+                                     for t, (n, v) in self.por_terminal.items()}}
+
+    def fechar(self):
+        with self._lock:
+            self._arq.close()
+
+
+def _tratador(agregador):
+    class Tratador(BaseHTTPRequestHandler):
+        def _responder(self, codigo, dados):
+            corpo = json.dumps(dados, ensure_ascii=False).encode("utf-8")
+            self.send_response(codigo)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def do_POST(self):
+            if self.path != "/operacoes": return self._responder(404, {"erro": "caminho desconhecido"})
+            try:
+                dados = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                confirmado = agregador.receber(str(dados["terminal"]), dados["operacoes"])
+            except (ValueError, KeyError, TypeError) as e:
+                return self._responder(400, {"erro": str(e)})
+            self._responder(200, {"confirmado": confirmado})
+
+        def do_GET(self):
+            if self.path == "/totais": return self._responder(200, agregador.totais())
+            if self.path == "/resumo":
+                with agregador._lock: texto = texto_resumo(agregador.sessao.modelo_relatorio())
+                corpo = texto.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; charset=utf-8")
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                return self.wfile.write(corpo)
+            self._responder(404, {"erro": "caminho desconhecido"})
+
+        def log_message(self, formato, *args):
+            pass
+
+    return Tratador
+
+
+def servidor_agregador(agregador, host="0.0.0.0", porta=PORTA):
+    return ThreadingHTTPServer((host, porta), _tratador(agregador))
+
+
+# -----------------------
+# Linha de comando
+# -----------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="rede.py", description="Modo multi-terminal do caixa.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    p = sub.add_parser("agregador", help="recebe e soma as vendas dos terminais")
+    p.add_argument("--host", default="0.0.0.0")
+    p.add_argument("--porta", type=int, default=PORTA)
+    p.add_argument("--arquivo", default="agregador.ndjson")
+    p = sub.add_parser("terminal", help="envia as vendas de arquivos como se fosse um caixa")
+    p.add_argument("url")
+    p.add_argument("vendas", nargs="+")
+    p.add_argument("--terminal", required=True)
+    args = parser.parse_args(argv)
+
+    if args.comando == "agregador":
+        agregador = Agregador(args.arquivo)
+        servidor = servidor_agregador(agregador, args.host, args.porta)
+        print(f"Agregador em http://{args.host}:{args.porta} (GET /totais, GET /resumo)")
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        servidor.server_close()
+        agregador.fechar()
+        t = agregador.totais()
+        print(f"{t['numero_vendas']} vendas | Total {dinheiro(t['total_geral'])}")
+    elif args.comando == "terminal":
+        envio = EnvioTerminal(args.url, args.terminal)
+        motor = MotorCaixa(produtos={})
+        motor.replicas.append(envio)
+        for caminho in args.vendas:
+            motor.reproduzir(iterar_vendas(caminho))
+        ok = envio.sincronizar(timeout=60)
+        print(f"{motor.sessao.numero_vendas} vendas | {envio.pendentes} pendentes"
+              + ("" if ok else f" (agregador indisponível: {envio.erro})"))
+        envio.fechar()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+# serie.py
+# Série temporal das vendas da sessão: contadores por intervalo de tempo
+# ("balde" de 15 minutos por padrão) com nº de vendas, faturamento e
+# quantidade por produto. Cada venda só mexe no balde dela, então o painel de
+# ritmo não precisa varrer as vendas. Só os baldes mais recentes ficam em
+# memória (`retencao`); os totais da sessão inteira continuam na CaixaSessao.
+
+LARGURA_PADRAO = 15 * 60
+RETENCAO_PADRAO = 96        # 24 h em baldes de 15 min
+
+
+class SerieVendas:
+    def __init__(self, largura=LARGURA_PADRAO, retencao=RETENCAO_PADRAO):
+        if largura <= 0 or retencao <= 0:
+            raise ValueError("largura e retenção precisam ser positivas")
+        self.largura = largura
+        self.retencao = retencao
+        self._baldes = {}       # início do balde (s) -> [vendas, total, {id_produto: qtd}]
+        self.ultimo = None      # início do balde mais recente
+
+    def __len__(self):
+        return len(self._baldes)
+
+    def inicio_balde(self, t):
+        return t // self.largura * self.largura
+
+    def _balde(self, t, criar):
+        inicio = self.inicio_balde(t)
+        balde = self._baldes.get(inicio)
+        if balde is not None or not criar: return balde
+        if self.ultimo is not None and inicio <= self.ultimo - self.retencao * self.largura:
+            return None     # mais antigo que a retenção
+        balde = self._baldes[inicio] = [0, 0, {}]
+        if self.ultimo is None or inicio > self.ultimo:
+            self.ultimo = inicio
+            # Só ao abrir um balde novo (uma vez por intervalo): descarta os vencidos.
+            limite = inicio - self.retencao * self.largura
+            for velho in [k for k in self._baldes if k <= limite]:
+                del self._baldes[velho]
+        return balde
+
+    def registrar(self, venda, sinal=1):
+        """Soma (sinal=1) ou desconta (sinal=-1) a venda do balde dela."""
+        balde = self._balde(venda.instante, sinal > 0)
+        if balde is None: return
+        balde[0] += sinal
+        balde[1] += sinal * venda.total
+        produtos = balde[2]
+        for pid, qtd, _ in venda.itens_por_id():
+            novo = produtos.get(pid, 0) + sinal * qtd
+            if novo: produtos[pid] = novo
+            else: produtos.pop(pid, None)
+
+    def baldes(self, ate=None, n=None):
+        """[(início, vendas, total, {id_produto: qtd})] dos `n` baldes terminando no
+        que contém `ate` (padrão: o mais recente), do mais novo ao mais antigo.
+        Intervalos sem venda aparecem zerados."""
+        if ate is None:
+            if self.ultimo is None: return []
+            fim = self.ultimo
+        else:
+            fim = self.inicio_balde(ate)
+        n = self.retencao if n is None else min(n, self.retencao)
+        res = []
+        for i in range(n):
+            inicio = fim - i * self.largura
+            vendas, total, produtos = self._baldes.get(inicio, (0, 0, {}))
+            res.append((inicio, vendas, total, dict(produtos)))
+        return res
+
+    def mais_vendidos(self, baldes, k=3):
+        """[(id_produto, qtd)] dos `k` produtos mais vendidos nos `baldes` dados."""
+        soma = {}
+        for _, _, _, produtos in baldes:
+            for pid, qtd in produtos.items():
+                soma[pid] = soma.get(pid, 0) + qtd
+        return sorted(soma.items(), key=lambda kv: -kv[1])[:k]